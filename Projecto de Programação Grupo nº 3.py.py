@@ -1,13 +1,41 @@
+import queue
+import threading
 import tkinter as tk
-from tkinter import ttk, messagebox
-import json
-import os
-from datetime import datetime, timedelta
+from tkinter import ttk, messagebox, filedialog
 from collections import Counter
 
+from biblioteca import (
+    COLECOES,
+    BuscaIncremental,
+    ErroPersistencia,
+    GravadorAssincrono,
+    RegrasMulta,
+    RepositorioRemoto,
+    abrir_repositorio,
+    calcular_multas,
+    ordinal_hoje,
+)
+from biblioteca import exportacao, importacao, operacoes, relatorios
+from biblioteca.datas import DEVOLUCAO, EMPRESTIMO
+from biblioteca.registros import ordinal_data, texto_data
+from biblioteca.tabelas import ListaVirtual, sincronizar_linhas
+
 class BibliotecaApp:
     """Classe principal da aplicação Biblioteca ISCAT - VERSÃO FINAL COMPLETA"""
     
+    # Intervalo de consulta ao gravador em segundo plano
+    INTERVALO_GRAVACAO_MS = 200
+    # Intervalo de consulta à carga inicial dos dados
+    INTERVALO_CARGA_MS = 100
+    # Intervalo de verificação de empréstimos que entraram em atraso
+    INTERVALO_ATRASOS_MS = 60000
+    # Intervalo de consulta à importação em massa
+    INTERVALO_IMPORTACAO_MS = 200
+    # Intervalo de consulta ao servidor (ou à pasta partilhada) por alterações de outros balcões
+    INTERVALO_SINCRONIZACAO_MS = 2000
+    # Nome de cada coleção nas mensagens
+    NOMES_COLECOES = {'livros': "Livros", 'usuarios': "Usuários", 'emprestimos': "Empréstimos"}
+    
     def __init__(self, root):
         self.root = root
         self.root.title("Biblioteca ISCAT - Sistema de Gestão Completo")
@@ -16,17 +44,20 @@ class BibliotecaApp:
         # Configurar ícone e tema
         self.root.configure(bg='#f0f0f0')
         
-        # Configurar dados
-        self.arquivo_livros = "biblioteca_livros.json"
-        self.arquivo_usuarios = "biblioteca_usuarios.json"
-        self.arquivo_emprestimos = "biblioteca_emprestimos.json"
-        
-        self.livros = self.carregar_dados(self.arquivo_livros)
-        self.usuarios = self.carregar_dados(self.arquivo_usuarios)
-        self.emprestimos = self.carregar_dados(self.arquivo_emprestimos)
-        
-        # Configurar menu principal
-        self.criar_menu()
+        # Os dados são carregados numa thread; a janela aparece logo
+        self.repositorio = None
+        # Importação em massa em curso (os índices só ficam prontos no fim)
+        self.importando = False
+        # Exportações a correr em segundo plano
+        self.exportacoes = 0
+        # Com o backend remoto: respostas do servidor e fim da thread que as busca
+        self.fila_servidor = queue.Queue()
+        self.parar_sincronizacao = threading.Event()
+        self.erro_gravacao = None
+        self.estado_gravacao = None
+        # Valor por dia e tolerância, ver BIBLIOTECA_MULTA_DIA e BIBLIOTECA_TOLERANCIA
+        self.regras_multa = RegrasMulta.do_ambiente()
+        self.root.protocol("WM_DELETE_WINDOW", self.sair)
         
         # Frame principal
         self.frame_principal = ttk.Frame(self.root, padding="10")
@@ -38,8 +69,137 @@ class BibliotecaApp:
         self.frame_principal.columnconfigure(0, weight=1)
         self.frame_principal.rowconfigure(0, weight=1)
         
+        # Indicador de gravação no rodapé
+        self.label_gravacao = ttk.Label(self.root, text="⏳ Carregando dados...",
+                                        foreground="#7f8c8d", padding=(10, 2))
+        self.label_gravacao.grid(row=1, column=0, sticky=tk.E)
+        
+        self.iniciar_carga()
+    
+    def iniciar_carga(self):
+        """Mostra a tela de carregamento e lê os dados em segundo plano"""
+        frame_carga = ttk.Frame(self.frame_principal)
+        frame_carga.grid(row=0, column=0)
+        
+        ttk.Label(frame_carga, text="📚 Biblioteca ISCAT", font=("Arial", 24, "bold"),
+                 foreground="#2c3e50").grid(row=0, column=0, pady=(0, 20))
+        self.label_carga = ttk.Label(frame_carga, text="Carregando dados...", font=("Arial", 11))
+        self.label_carga.grid(row=1, column=0, pady=(0, 10))
+        barra = ttk.Progressbar(frame_carga, mode="indeterminate", length=300)
+        barra.grid(row=2, column=0)
+        barra.start(15)
+        
+        self.fila_carga = queue.Queue()
+        
+        def carregar():
+            # Backend JSON, SQLite ou remoto, ver BIBLIOTECA_BACKEND
+            progresso = lambda etapa, registros: self.fila_carga.put(('progresso', etapa, registros))
+            try:
+                self.fila_carga.put(('pronto', abrir_repositorio(progresso=progresso)))
+            except ErroPersistencia as e:
+                self.fila_carga.put(('erro', e))
+        
+        threading.Thread(target=carregar, name="carga", daemon=True).start()
+        self.verificar_carga()
+    
+    def verificar_carga(self):
+        """Acompanha a carga dos dados e abre a tela inicial ao terminar"""
+        nomes = {'livros': "livros", 'usuarios': "usuários", 'emprestimos': "empréstimos"}
+        while True:
+            try:
+                mensagem = self.fila_carga.get_nowait()
+            except queue.Empty:
+                break
+            
+            if mensagem[0] == 'progresso':
+                _, etapa, registros = mensagem
+                if etapa == 'indices':
+                    self.label_carga.config(text=f"Preparando índices de {registros} registros...")
+                else:
+                    self.label_carga.config(text=f"Carregando {nomes[etapa]}... {registros} registros")
+            elif mensagem[0] == 'pronto':
+                self.concluir_carga(mensagem[1])
+                return
+            else:
+                # Não abrir com dados vazios: qualquer gravação apagaria o acervo
+                messagebox.showerror(
+                    "Erro",
+                    f"Não foi possível carregar os dados!\n{mensagem[1]}\n\n"
+                    "Nenhum arquivo foi alterado. Restaure uma cópia de segurança e tente de novo."
+                )
+                self.root.destroy()
+                return
+        
+        self.root.after(self.INTERVALO_CARGA_MS, self.verificar_carga)
+    
+    def concluir_carga(self, repositorio):
+        """Liga a interface ao repositório carregado"""
+        self.repositorio = repositorio
+        self.livros = self.repositorio.livros
+        self.usuarios = self.repositorio.usuarios
+        self.emprestimos = self.repositorio.emprestimos
+        self.indice_emprestimos = self.repositorio.indice_emprestimos
+        self.busca_livros = BuscaIncremental(self.repositorio)
+        
+        # Gravar em disco numa thread própria para não travar a interface;
+        # no backend remoto (e numa pasta partilhada) cada transação espera a confirmação
+        if self.repositorio.GRAVACAO_LOCAL:
+            self.repositorio.gravador = GravadorAssincrono(self.repositorio)
+        
+        # Configurar menu principal
+        self.criar_menu()
+        
+        tempos = self.repositorio.tempos_carga
+        registros = sum(len(self.repositorio.colecao(nome)) for nome in COLECOES)
+        
+        self.label_gravacao.config(text=f"✅ {registros} registros carregados em {tempos['total']:.2f} s")
+        self.estado_gravacao = ("✅ Dados salvos", "#7f8c8d")
+        self.verificar_gravacao()
+        if isinstance(self.repositorio, RepositorioRemoto):
+            self.iniciar_sincronizacao()
+        elif getattr(self.repositorio, 'partilhado', False):
+            self.estado_gravacao = ("📂 Pasta partilhada", "#7f8c8d")
+            self.root.after(self.INTERVALO_SINCRONIZACAO_MS, self.sincronizar_pasta)
+        
         # Tela inicial
         self.criar_tela_inicial()
+        
+        # Avisos de atraso: os já atrasados agora, os novos quando vencerem
+        self.root.after_idle(self.verificar_atrasos)
+    
+    def verificar_atrasos(self):
+        """Avisa dos empréstimos que entraram em atraso desde a última verificação"""
+        # Só o topo da fila de vencimentos é consultado, não todos os empréstimos
+        self.root.after(self.INTERVALO_ATRASOS_MS, self.verificar_atrasos)
+        if self.importando:
+            return
+        avisos = self.repositorio.vencimentos.avisos()
+        if avisos:
+            self.avisar_atrasos(avisos)
+    
+    def avisar_atrasos(self, atrasados, limite=10):
+        """Mostra um aviso com os empréstimos (ordinal previsto, emp_id) em atraso"""
+        hoje = ordinal_hoje()
+        if len(atrasados) == 1:
+            aviso = "⏰ 1 empréstimo entrou em atraso:\n\n"
+        else:
+            aviso = f"⏰ {len(atrasados)} empréstimos em atraso:\n\n"
+        for prevista, emp_id in atrasados[:limite]:
+            aviso += self.descrever_atraso(emp_id, prevista, hoje) + "\n"
+        if len(atrasados) > limite:
+            aviso += f"... e mais {len(atrasados) - limite}\n"
+        aviso += "\nVeja Relatórios > Empréstimos em Atraso."
+        messagebox.showwarning("Empréstimos em Atraso", aviso)
+    
+    def descrever_atraso(self, emp_id, prevista, hoje):
+        """Linha de texto de um empréstimo em atraso"""
+        emprestimo = self.emprestimos.get(emp_id, {})
+        usuario = self.usuarios.get(emprestimo.get('id_usuario', ''), {})
+        livro = self.livros.get(emprestimo.get('isbn_livro', ''), {})
+        dias = hoje - prevista
+        return (f"{emp_id} | {usuario.get('nome', 'Desconhecido')[:25]} | "
+                f"{livro.get('título', 'Desconhecido')[:30]} | {texto_data(prevista)} "
+                f"({dias} dias, {self.regras_multa.multa(dias):.2f} Kz)")
     
     def criar_menu(self):
         """Cria o menu principal da aplicação"""
@@ -49,9 +209,13 @@ class BibliotecaApp:
         # Menu Arquivo
         menu_arquivo = tk.Menu(menubar, tearoff=0)
         menubar.add_cascade(label="Arquivo", menu=menu_arquivo)
+        for colecao, nome in self.NOMES_COLECOES.items():
+            menu_arquivo.add_command(label=f"Importar {nome}...",
+                                     command=lambda colecao=colecao: self.importar_arquivo(colecao))
+        menu_arquivo.add_separator()
         menu_arquivo.add_command(label="Exportar Dados", command=self.exportar_dados)
         menu_arquivo.add_separator()
-        menu_arquivo.add_command(label="Sair", command=self.root.quit)
+        menu_arquivo.add_command(label="Sair", command=self.sair)
         
         # Menu Cadastros
         menu_cadastros = tk.Menu(menubar, tearoff=0)
@@ -80,6 +244,8 @@ class BibliotecaApp:
         menu_relatorios.add_command(label="Livros Mais Emprestados", command=self.relatorio_livros_mais_emprestados)
         menu_relatorios.add_command(label="Histórico de Movimentação", command=self.abrir_historico_movimentacao)
         menu_relatorios.add_command(label="Situação do Acervo", command=self.relatorio_situacao_acervo)
+        menu_relatorios.add_command(label="Multas Pendentes", command=self.relatorio_multas)
+        menu_relatorios.add_command(label="Empréstimos em Atraso", command=self.relatorio_atrasos)
         menu_relatorios.add_separator()
         menu_relatorios.add_command(label="Relatório Completo", command=self.relatorio_completo)
         
@@ -125,19 +291,13 @@ class BibliotecaApp:
         )
         frame_stats.grid(row=1, column=0, sticky=(tk.W, tk.E), pady=(0, 20))
         
-        # Calcular estatísticas
-        total_livros = sum(livro.get('quantidade', 0) for livro in self.livros.values())
-        livros_unicos = len(self.livros)
-        total_usuarios = len(self.usuarios)
-        
-        # Empréstimos ativos
-        emprestimos_ativos = sum(1 for emp in self.emprestimos.values() if emp.get('status') == 'ativo')
-        
-        # Livros disponíveis
-        livros_disponiveis = sum(
-            1 for livro in self.livros.values() 
-            if livro.get('quantidade', 0) > 0
-        )
+        # Estatísticas mantidas pelo repositório a cada alteração
+        resumo = self.repositorio.estatisticas.resumo()
+        total_livros = resumo['unidades']
+        livros_unicos = resumo['titulos']
+        total_usuarios = resumo['usuarios']
+        emprestimos_ativos = resumo['emprestimos_ativos']
+        livros_disponiveis = resumo['titulos_disponiveis']
         
         # Exibir estatísticas em grid
         stats_data = [
@@ -207,13 +367,8 @@ class BibliotecaApp:
         atividades = []
         
         # Adicionar últimos empréstimos
-        emprestimos_recentes = sorted(
-            self.emprestimos.items(),
-            key=lambda x: x[1].get('data_emprestimo', ''),
-            reverse=True
-        )[:limite]
-        
-        for emp_id, emprestimo in emprestimos_recentes:
+        for emp_id in self.repositorio.estatisticas.emprestimos_recentes(limite):
+            emprestimo = self.emprestimos[emp_id]
             usuario = self.usuarios.get(emprestimo.get('id_usuario', ''), {})
             livro = self.livros.get(emprestimo.get('isbn_livro', ''), {})
             
@@ -282,138 +437,211 @@ class BibliotecaApp:
             widget.destroy()
         TelaRelatorios(self.frame_principal, self)
     
-    def carregar_dados(self, arquivo):
-        """Carrega os dados de um arquivo JSON"""
-        if os.path.exists(arquivo):
-            try:
-                with open(arquivo, 'r', encoding='utf-8') as f:
-                    dados = json.load(f)
-                    # Garantir que todos os usuários tenham histórico
-                    if "usuarios" in arquivo:
-                        for user_id, usuario in dados.items():
-                            if 'historico' not in usuario:
-                                usuario['historico'] = []
-                    return dados
-            except (json.JSONDecodeError, FileNotFoundError):
-                return {}
-        return {}
-    
-    def salvar_dados(self, dados, arquivo):
-        """Salva os dados em um arquivo JSON"""
+    def salvar_registro(self, colecao, chave, registro):
+        """Grava um registro no repositório"""
+        try:
+            self.repositorio.gravar(colecao, chave, registro)
+            return True
+        except ErroPersistencia as e:
+            messagebox.showerror("Erro", str(e))
+            return False
+    
+    def remover_registro(self, colecao, chave):
+        """Remove um registro do repositório"""
         try:
-            with open(arquivo, 'w', encoding='utf-8') as f:
-                json.dump(dados, f, indent=4, ensure_ascii=False)
+            self.repositorio.remover(colecao, chave)
             return True
-        except Exception as e:
-            messagebox.showerror("Erro", f"Erro ao salvar dados em {arquivo}: {str(e)}")
+        except ErroPersistencia as e:
+            messagebox.showerror("Erro", str(e))
             return False
     
     def salvar_todos_dados(self):
         """Salva todos os dados do sistema"""
-        success = True
-        success = self.salvar_dados(self.livros, self.arquivo_livros) and success
-        success = self.salvar_dados(self.usuarios, self.arquivo_usuarios) and success
-        success = self.salvar_dados(self.emprestimos, self.arquivo_emprestimos) and success
-        return success
+        try:
+            self.repositorio.salvar_tudo()
+            return True
+        except ErroPersistencia as e:
+            messagebox.showerror("Erro", str(e))
+            return False
+    
+    def verificar_gravacao(self):
+        """Atualiza o indicador de gravação e avisa sobre falhas"""
+        gravador = self.repositorio.gravador
+        if gravador is None:
+            return
+        self.root.after(self.INTERVALO_GRAVACAO_MS, self.verificar_gravacao)
+        
+        erro_novo = None
+        while True:
+            try:
+                resultado = gravador.resultados.get_nowait()
+            except queue.Empty:
+                break
+            self.erro_gravacao = resultado
+            if resultado is not None:
+                erro_novo = resultado
+        
+        if gravador.ocupado():
+            estado = ("💾 Salvando...", "#2980b9")
+        elif self.erro_gravacao is not None:
+            estado = ("⚠️ Erro ao salvar", "#c0392b")
+        else:
+            estado = ("✅ Dados salvos", "#7f8c8d")
+        # Só mexer no rótulo quando o estado muda (mantém o tempo de carga visível)
+        if estado != self.estado_gravacao:
+            self.estado_gravacao = estado
+            self.label_gravacao.config(text=estado[0], foreground=estado[1])
+        
+        if erro_novo is not None:
+            messagebox.showerror(
+                "Erro",
+                f"Não foi possível salvar!\n{erro_novo}\n\n"
+                "As alterações continuam em memória e serão gravadas na próxima tentativa."
+            )
+    
+    def iniciar_sincronizacao(self):
+        """Busca numa thread as alterações dos outros balcões, a cada intervalo"""
+        repositorio = self.repositorio
+        intervalo = self.INTERVALO_SINCRONIZACAO_MS / 1000
+        
+        def buscar():
+            while not self.parar_sincronizacao.wait(intervalo):
+                try:
+                    self.fila_servidor.put(repositorio.buscar_alteracoes())
+                except ErroPersistencia as e:
+                    self.fila_servidor.put(e)
+        
+        threading.Thread(target=buscar, name="sincronizacao", daemon=True).start()
+        self.estado_gravacao = (f"🌐 Ligado a {repositorio.url}", "#7f8c8d")
+        self.label_gravacao.config(text=self.estado_gravacao[0], foreground=self.estado_gravacao[1])
+        self.verificar_servidor()
+    
+    def verificar_servidor(self):
+        """Aplica as alterações recebidas do servidor e mostra se ele responde"""
+        self.root.after(self.INTERVALO_GRAVACAO_MS, self.verificar_servidor)
+        if self.importando:
+            # Os lotes da importação têm a trava: as respostas esperam na fila
+            return
+        estado = None
+        while True:
+            try:
+                resposta = self.fila_servidor.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(resposta, ErroPersistencia):
+                estado = ("⚠️ Servidor indisponível", "#c0392b")
+                continue
+            try:
+                self.repositorio.aplicar_alteracoes(resposta)
+            except ErroPersistencia:
+                # Recarga completa falhou: os dados locais ficam como estavam
+                estado = ("⚠️ Servidor indisponível", "#c0392b")
+            else:
+                estado = (f"🌐 Ligado a {self.repositorio.url}", "#7f8c8d")
+        
+        if estado is not None and estado != self.estado_gravacao:
+            self.estado_gravacao = estado
+            self.label_gravacao.config(text=estado[0], foreground=estado[1])
+    
+    def sincronizar_pasta(self):
+        """Junta as transações que outros processos gravaram na mesma pasta de dados"""
+        self.root.after(self.INTERVALO_SINCRONIZACAO_MS, self.sincronizar_pasta)
+        if self.importando:
+            return
+        try:
+            # Se outro processo estiver a gravar, fica para a próxima vez
+            self.repositorio.sincronizar(esperar=False)
+        except ErroPersistencia:
+            estado = ("⚠️ Erro ao ler a pasta partilhada", "#c0392b")
+        else:
+            estado = ("📂 Pasta partilhada", "#7f8c8d")
+        if estado != self.estado_gravacao:
+            self.estado_gravacao = estado
+            self.label_gravacao.config(text=estado[0], foreground=estado[1])
+    
+    def sair(self):
+        """Grava o que estiver pendente, fecha o repositório e encerra"""
+        if self.repositorio is None:
+            # Ainda carregando: nada foi alterado
+            self.root.destroy()
+            return
+        if self.importando:
+            messagebox.showwarning("Atenção", "Aguarde o fim da importação para sair.")
+            return
+        if self.exportacoes and not messagebox.askyesno(
+            "Exportação em Andamento",
+            "Há uma exportação em andamento; o arquivo não será criado.\n\nSair mesmo assim?"
+        ):
+            return
+        self.label_gravacao.config(text="💾 Salvando...", foreground="#2980b9")
+        self.root.update_idletasks()
+        try:
+            self.repositorio.fechar()
+        except ErroPersistencia as e:
+            self.label_gravacao.config(text="⚠️ Erro ao salvar", foreground="#c0392b")
+            if not messagebox.askyesno(
+                "Erro",
+                f"Não foi possível salvar os dados!\n{e}\n\nSair mesmo assim?"
+            ):
+                return
+        self.parar_sincronizacao.set()
+        self.root.destroy()
     
     def gerar_id_unico(self, prefixo):
         """Gera um ID único baseado em um prefixo"""
-        contador = 1
-        while f"{prefixo}{contador:04d}" in self.emprestimos:
-            contador += 1
-        return f"{prefixo}{contador:04d}"
+        return self.repositorio.proximo_id(prefixo)
     
     def calcular_multa(self, data_devolucao_prevista):
-        """Calcula multa por atraso (500 Kz por dia de atraso)"""
-        try:
-            hoje = datetime.now().date()
-            data_prevista = datetime.strptime(data_devolucao_prevista, "%Y-%m-%d").date()
-            
-            if hoje > data_prevista:
-                dias_atraso = (hoje - data_prevista).days
-                return dias_atraso * 500.00
-            return 0.00
-        except (ValueError, TypeError):
+        """Calcula multa por atraso (500 Kz por dia de atraso, ver regras_multa)"""
+        # Aceita o texto 'AAAA-MM-DD' (conversão em cache) ou o ordinal
+        data_prevista = ordinal_data(data_devolucao_prevista)
+        if type(data_prevista) is not int:
             return 0.00
-    
-    def buscar_livros(self, termo):
-        """Busca livros por título ou autor"""
-        resultados = []
-        termo_lower = termo.lower()
-        
-        for isbn, livro in self.livros.items():
-            if (termo_lower in livro.get('título', '').lower() or 
-                termo_lower in livro.get('autor', '').lower() or
-                termo_lower in isbn.lower()):
-                resultados.append((isbn, livro))
         
-        return resultados
+        return self.regras_multa.multa(ordinal_hoje() - data_prevista)
+    
+    def calcular_multas_pendentes(self):
+        """Multas de todos os empréstimos ativos, calculadas de uma vez"""
+        return calcular_multas(self.repositorio.colunas_emprestimos, self.regras_multa)
+    
+    def buscar_livros(self, termo, campos=None):
+        """Busca livros pelo índice (título, autor, gênero ou ISBN), por relevância"""
+        return [
+            (isbn, self.livros[isbn])
+            for isbn in self.busca_livros.buscar(termo, campos)
+        ]
     
     def calcular_livros_mais_emprestados(self, limite=10):
         """Calcula os livros mais emprestados"""
-        contagem = Counter()
-        
-        for emprestimo in self.emprestimos.values():
-            isbn = emprestimo.get('isbn_livro')
-            if isbn:
-                contagem[isbn] += 1
-        
-        # Ordenar por frequência
-        mais_emprestados = contagem.most_common(limite)
-        
-        # Adicionar informações dos livros
-        resultado = []
-        for isbn, count in mais_emprestados:
-            livro = self.livros.get(isbn, {})
-            resultado.append({
-                'isbn': isbn,
-                'título': livro.get('título', 'Desconhecido'),
-                'autor': livro.get('autor', 'Desconhecido'),
-                'emprestimos': count
-            })
-        
-        return resultado
+        return relatorios.mais_emprestados(self.repositorio, limite)
     
     def obter_movimentacao(self, limite_dias=30):
-        """Obtém a movimentação dos últimos dias"""
-        hoje = datetime.now()
-        data_limite = hoje - timedelta(days=limite_dias)
-        
-        movimentacao = []
-        
-        for emp_id, emprestimo in self.emprestimos.items():
-            try:
-                data_emp = datetime.strptime(emprestimo.get('data_emprestimo', ''), "%Y-%m-%d")
-                
-                if data_emp >= data_limite:
-                    usuario = self.usuarios.get(emprestimo.get('id_usuario', ''), {})
-                    livro = self.livros.get(emprestimo.get('isbn_livro', ''), {})
-                    
-                    movimentacao.append({
-                        'data': emprestimo.get('data_emprestimo'),
-                        'tipo': 'EMPRÉSTIMO',
-                        'usuario': usuario.get('nome', 'Desconhecido'),
-                        'livro': livro.get('título', 'Desconhecido'),
-                        'status': '🔄' if emprestimo.get('status') == 'ativo' else '✅'
-                    })
-                    
-                    if emprestimo.get('status') == 'devolvido':
-                        data_dev = emprestimo.get('data_devolucao_real', '')
-                        if data_dev:
-                            movimentacao.append({
-                                'data': data_dev,
-                                'tipo': 'DEVOLUÇÃO',
-                                'usuario': usuario.get('nome', 'Desconhecido'),
-                                'livro': livro.get('título', 'Desconhecido'),
-                                'status': '✅'
-                            })
-            except (ValueError, TypeError):
-                continue
-        
-        # Ordenar por data
-        movimentacao.sort(key=lambda x: x['data'], reverse=True)
+        """Obtém a movimentação dos últimos dias (todo o histórico com limite_dias=None)"""
+        # Eventos com data > hoje - limite_dias: busca binária e fatia da
+        # linha do tempo, já ordenada; do mais recente ao mais antigo
+        primeiro_dia = None if limite_dias is None else ordinal_hoje() - limite_dias + 1
+        return self.repositorio.indice_datas.eventos.recentes(primeiro_dia)
+    
+    def descrever_movimento(self, evento):
+        """Dados de exibição de um evento (data, emp_id, tipo) da movimentação"""
+        data, emp_id, tipo = evento
+        emprestimo = self.emprestimos.get(emp_id, {})
+        usuario = self.usuarios.get(emprestimo.get('id_usuario', ''), {})
+        livro = self.livros.get(emprestimo.get('isbn_livro', ''), {})
+        
+        if tipo == DEVOLUCAO:
+            tipo, status = 'DEVOLUÇÃO', '✅'
+        else:
+            tipo = 'EMPRÉSTIMO'
+            status = '🔄' if emprestimo.get('status') == 'ativo' else '✅'
         
-        return movimentacao
+        return {
+            'data': texto_data(data),
+            'tipo': tipo,
+            'usuario': usuario.get('nome', 'Desconhecido'),
+            'livro': livro.get('título', 'Desconhecido'),
+            'status': status
+        }
     
     def relatorio_livros_mais_emprestados(self):
         """Exibe relatório dos livros mais emprestados"""
@@ -474,7 +702,7 @@ class BibliotecaApp:
         
         # Empréstimos totais
         total_emprestimos = len(self.emprestimos)
-        emprestimos_ativos = sum(1 for emp in self.emprestimos.values() if emp.get('status') == 'ativo')
+        emprestimos_ativos = self.repositorio.colunas_emprestimos.contar_status()['ativo']
         emprestimos_devolvidos = total_emprestimos - emprestimos_ativos
         
         # Usuários por tipo
@@ -507,15 +735,8 @@ class BibliotecaApp:
     
     def relatorio_usuarios_ativos(self):
         """Exibe relatório de usuários ativos (com empréstimos)"""
-        usuarios_ativos = {}
-        
-        for emp in self.emprestimos.values():
-            if emp.get('status') == 'ativo':
-                usuario_id = emp.get('id_usuario', '')
-                if usuario_id:
-                    if usuario_id not in usuarios_ativos:
-                        usuarios_ativos[usuario_id] = 0
-                    usuarios_ativos[usuario_id] += 1
+        usuarios_ativos = self.repositorio.colunas_emprestimos.ativos_por_usuario()
+        usuarios_ativos.pop('', None)
         
         if not usuarios_ativos:
             messagebox.showinfo("Usuários Ativos", "Não há usuários com empréstimos ativos.")
@@ -531,6 +752,55 @@ class BibliotecaApp:
         
         messagebox.showinfo("Relatório - Usuários Ativos", relatorio)
     
+    def relatorio_multas(self):
+        """Exibe relatório das multas pendentes dos empréstimos ativos"""
+        resumo = self.calcular_multas_pendentes()
+        
+        if not resumo.atrasados:
+            messagebox.showinfo("Multas Pendentes", "Não há empréstimos em atraso.")
+            return
+        
+        relatorio = "💰 MULTAS PENDENTES\n\n"
+        relatorio += f"Regras: {resumo.regras.descricao()}\n"
+        relatorio += f"Empréstimos em atraso: {len(resumo.atrasados)}\n"
+        relatorio += f"Total a receber: {resumo.total:.2f} Kz\n\n"
+        
+        relatorio += "📅 POR TEMPO DE ATRASO\n"
+        for faixa, (quantidade, total) in resumo.faixas.items():
+            relatorio += f"  {faixa}: {quantidade} empréstimos, {total:.2f} Kz\n"
+        
+        devedores = resumo.maiores_devedores(10)
+        if devedores:
+            relatorio += "\n👥 MAIORES DEVEDORES\n"
+            for usuario_id, total in devedores:
+                usuario = self.usuarios.get(usuario_id, {})
+                relatorio += f"  {usuario.get('nome', 'Desconhecido')[:30]:30} {total:10.2f} Kz\n"
+        
+        messagebox.showinfo("Relatório - Multas Pendentes", relatorio)
+    
+    def relatorio_atrasos(self, limite=50):
+        """Exibe os empréstimos em atraso, do mais antigo, e o próximo vencimento"""
+        hoje = ordinal_hoje()
+        vencimentos = self.repositorio.vencimentos
+        atrasados = vencimentos.atrasados(hoje)
+        proximo = vencimentos.proximo(hoje)
+        
+        relatorio = "⏰ EMPRÉSTIMOS EM ATRASO\n\n"
+        if atrasados:
+            relatorio += f"Total em atraso: {len(atrasados)}\n\n"
+            for prevista, emp_id in atrasados[:limite]:
+                relatorio += self.descrever_atraso(emp_id, prevista, hoje) + "\n"
+            if len(atrasados) > limite:
+                relatorio += f"... e mais {len(atrasados) - limite}\n"
+        else:
+            relatorio += "Não há empréstimos em atraso.\n"
+        
+        if proximo is not None:
+            prevista, emp_id = proximo
+            relatorio += f"\nPróximo vencimento: {texto_data(prevista)} ({emp_id})\n"
+        
+        messagebox.showinfo("Relatório - Empréstimos em Atraso", relatorio)
+    
     def relatorio_livros_emprestados(self):
         """Exibe relatório de livros emprestados"""
         emprestimos_ativos = [emp for emp in self.emprestimos.values() if emp.get('status') == 'ativo']
@@ -552,56 +822,114 @@ class BibliotecaApp:
         
         messagebox.showinfo("Relatório - Livros Emprestados", relatorio)
     
-    def exportar_dados(self):
-        """Exporta dados para arquivo de texto"""
-        try:
-            with open("biblioteca_exportacao.txt", "w", encoding='utf-8') as f:
-                f.write("EXPORTAÇÃO DE DADOS - BIBLIOTECA ISCAT\n")
-                f.write("=" * 50 + "\n\n")
-                
-                f.write("LIVROS CADASTRADOS:\n")
-                f.write("-" * 40 + "\n")
-                for isbn, livro in self.livros.items():
-                    f.write(f"ISBN: {isbn}\n")
-                    f.write(f"Título: {livro.get('título', '')}\n")
-                    f.write(f"Autor: {livro.get('autor', '')}\n")
-                    f.write(f"Gênero: {livro.get('gênero', '')}\n")
-                    f.write(f"Quantidade: {livro.get('quantidade', 0)}\n")
-                    f.write("-" * 40 + "\n")
-                
-                f.write("\n\nUSUÁRIOS CADASTRADOS:\n")
-                f.write("-" * 40 + "\n")
-                for user_id, usuario in self.usuarios.items():
-                    f.write(f"ID: {user_id}\n")
-                    f.write(f"Nome: {usuario.get('nome', '')}\n")
-                    f.write(f"Tipo: {usuario.get('tipo', '')}\n")
-                    f.write(f"Data Cadastro: {usuario.get('data_cadastro', '')}\n")
-                    f.write("-" * 40 + "\n")
-                
-                f.write("\n\nEMPREÉSTIMOS ATIVOS:\n")
-                f.write("-" * 40 + "\n")
-                for emp_id, emprestimo in self.emprestimos.items():
-                    if emprestimo.get('status') == 'ativo':
-                        f.write(f"ID Empréstimo: {emp_id}\n")
-                        f.write(f"Usuário: {emprestimo.get('id_usuario', '')}\n")
-                        f.write(f"Livro: {emprestimo.get('isbn_livro', '')}\n")
-                        f.write(f"Data Empréstimo: {emprestimo.get('data_emprestimo', '')}\n")
-                        f.write(f"Data Devolução Prevista: {emprestimo.get('data_devolucao_prevista', '')}\n")
-                        f.write("-" * 40 + "\n")
+    def importar_arquivo(self, colecao):
+        """Importa livros, usuários ou empréstimos de um arquivo CSV ou JSON lines"""
+        nome = self.NOMES_COLECOES[colecao]
+        caminho = filedialog.askopenfilename(
+            title=f"Importar {nome}",
+            filetypes=[("CSV ou JSON lines", "*.csv *.jsonl *.ndjson"), ("Todos os arquivos", "*.*")]
+        )
+        if not caminho:
+            return
+        
+        # Janela modal: nada é alterado pela interface enquanto a importação corre
+        janela = tk.Toplevel(self.root)
+        janela.title(f"Importar {nome}")
+        janela.transient(self.root)
+        janela.resizable(False, False)
+        janela.protocol("WM_DELETE_WINDOW", lambda: None)
+        label = ttk.Label(janela, text=f"Importando {caminho}...", padding=(20, 15, 20, 5))
+        label.grid(row=0, column=0)
+        barra = ttk.Progressbar(janela, mode="indeterminate", length=300)
+        barra.grid(row=1, column=0, padx=20, pady=(0, 15))
+        barra.start(15)
+        janela.grab_set()
+        
+        fila = queue.Queue()
+        
+        def importar():
+            progresso = lambda relatorio: fila.put(('progresso', relatorio.lidas, relatorio.rejeitadas))
+            try:
+                fila.put(('pronto', importacao.importar(self.repositorio, colecao, caminho, progresso=progresso)))
+            except operacoes.ErroOperacao as e:
+                fila.put(('aviso', e))
+            except ErroPersistencia as e:
+                fila.put(('erro', e))
+            except Exception as e:
+                # Sem mensagem na fila a janela modal ficaria aberta para sempre
+                fila.put(('falha', e))
+        
+        self.importando = True
+        threading.Thread(target=importar, name="importacao", daemon=True).start()
+        self.verificar_importacao(fila, janela, label)
+    
+    def verificar_importacao(self, fila, janela, label):
+        """Acompanha a importação em massa e mostra o resumo ao terminar"""
+        while True:
+            try:
+                mensagem = fila.get_nowait()
+            except queue.Empty:
+                break
             
-            messagebox.showinfo("Exportação", "Dados exportados com sucesso para 'biblioteca_exportacao.txt'")
-        except Exception as e:
-            messagebox.showerror("Erro", f"Erro ao exportar dados: {str(e)}")
+            if mensagem[0] == 'progresso':
+                _, lidas, rejeitadas = mensagem
+                label.config(text=f"{lidas} linhas importadas, {rejeitadas} rejeitadas...")
+                continue
+            
+            self.importando = False
+            janela.grab_release()
+            janela.destroy()
+            if mensagem[0] == 'pronto':
+                self.mostrar_importacao(mensagem[1])
+            elif mensagem[0] == 'aviso':
+                messagebox.showwarning("Atenção", str(mensagem[1]))
+            elif mensagem[0] == 'falha':
+                messagebox.showerror(
+                    "Erro",
+                    f"Erro inesperado na importação: {mensagem[1]}\n\nOs lotes anteriores ao erro foram gravados."
+                )
+            else:
+                messagebox.showerror(
+                    "Erro",
+                    f"Não foi possível salvar! {mensagem[1]}\n\nOs lotes anteriores ao erro foram gravados."
+                )
+            return
+        
+        self.root.after(self.INTERVALO_IMPORTACAO_MS, self.verificar_importacao, fila, janela, label)
+    
+    def mostrar_importacao(self, relatorio, limite=10):
+        """Resumo de uma importação: gravados, rejeitados e velocidade"""
+        resumo = f"📥 IMPORTAÇÃO DE {self.NOMES_COLECOES[relatorio.colecao].upper()}\n\n"
+        resumo += f"Linhas lidas: {relatorio.lidas}\n"
+        resumo += f"Novos registros: {relatorio.novos}\n"
+        if relatorio.colecao == 'livros':
+            resumo += f"Somados ao estoque (ISBN repetido): {relatorio.somados}\n"
+        resumo += f"Linhas rejeitadas: {relatorio.rejeitadas}\n"
+        resumo += f"Tempo: {relatorio.segundos:.2f} s ({relatorio.linhas_por_segundo:.0f} linhas por segundo)\n"
+        if relatorio.rejeicoes:
+            resumo += "\nRejeitadas:\n"
+            for linha, motivo in relatorio.rejeicoes[:limite]:
+                resumo += f"Linha {linha}: {motivo}\n"
+            if relatorio.rejeitadas > limite:
+                resumo += f"... e mais {relatorio.rejeitadas - limite}\n"
+        messagebox.showinfo("Importação", resumo)
+        # Contagens da tela inicial e listas abertas mudaram
+        self.criar_tela_inicial()
+    
+    def exportar_dados(self):
+        """Abre a janela de exportação (coleções ou movimentação, em CSV, JSON lines ou colunas)"""
+        JanelaExportacao(self)
     
     def mostrar_guia_rapido(self):
         """Exibe guia rápido do sistema"""
-        guia = """
+        guia = f"""
         📖 GUIA RÁPIDO - BIBLIOTECA ISCAT
         
         1. 📚 CADASTRO DE LIVROS
            • Adicione novos livros com título, autor, ISBN, gênero e quantidade
            • Edite ou exclua livros existentes
            • Verifique se um livro já existe
+           • Importe catálogos inteiros de CSV ou JSON lines (Arquivo > Importar)
         
         2. 👥 CONTROLE DE USUÁRIOS
            • Cadastre usuários (Aluno, Professor, Funcionário, Visitante)
@@ -610,7 +938,7 @@ class BibliotecaApp:
         3. 🔄 SISTEMA DE EMPRÉSTIMOS
            • Realize novos empréstimos
            • Registre devoluções
-           • Controle prazos e multas (500 Kz/dia de atraso)
+           • Controle prazos e multas ({self.regras_multa.descricao()})
         
         4. 🔍 CONSULTAS E ESTOQUE
            • Consulte todos os livros cadastrados
@@ -623,6 +951,10 @@ class BibliotecaApp:
            • Situação atual do acervo
         
         💡 DICA: Use o menu superior para navegar entre as telas.
+        
+        🌐 VÁRIOS BALCÕES: num computador, "python -m biblioteca servir";
+        nos balcões, BIBLIOTECA_BACKEND=remoto e BIBLIOTECA_SERVIDOR=http://...
+        Ou, com os dados numa pasta de rede, BIBLIOTECA_PARTILHADO=1 em todos.
         """
         
         messagebox.showinfo("Guia Rápido", guia)
@@ -667,15 +999,9 @@ class TelaLivros:
         Valida a entrada do ISBN:
         - Permite apagar (texto vazio)
         - Apenas números
-        - Máximo 5 caracteres
+        - Máximo 13 caracteres
         """
-        if texto_novo == "":
-            return True
-        if not texto_novo.isdigit():
-            return False
-        if len(texto_novo) > 13:
-            return False
-        return True
+        return texto_novo == "" or operacoes.isbn_valido(texto_novo)
     
     def criar_widgets(self):
         """Cria a interface da tela de livros"""
@@ -726,7 +1052,8 @@ class TelaLivros:
         frame_lista.grid(row=2, column=0, columnspan=3, sticky=(tk.W, tk.E, tk.N, tk.S), pady=(0, 10))
         
         colunas = ("título", "autor", "isbn", "gênero", "quantidade")
-        self.treeview = ttk.Treeview(frame_lista, columns=colunas, show="headings", height=15)
+        self.lista = ListaVirtual(frame_lista, colunas, self.linha_livro, altura=15)
+        self.treeview = self.lista.treeview
         
         self.treeview.heading("título", text="Título")
         self.treeview.heading("autor", text="Autor")
@@ -740,11 +1067,7 @@ class TelaLivros:
         self.treeview.column("gênero", width=100)
         self.treeview.column("quantidade", width=80)
         
-        scrollbar = ttk.Scrollbar(frame_lista, orient=tk.VERTICAL, command=self.treeview.yview)
-        self.treeview.configure(yscrollcommand=scrollbar.set)
-        
-        self.treeview.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
-        scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
+        self.lista.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
         
         frame_lista.columnconfigure(0, weight=1)
         frame_lista.rowconfigure(0, weight=1)
@@ -765,55 +1088,42 @@ class TelaLivros:
         """Adiciona um novo livro"""
         dados = self.obter_dados_formulario()
         
-        if not dados['título'] or not dados['isbn']:
-            messagebox.showwarning("Atenção", "Título e ISBN são obrigatórios!")
-            return
-        
-        try:
-            quantidade = int(dados['quantidade'])
-            if quantidade < 0:
-                messagebox.showwarning("Atenção", "Quantidade não pode ser negativa!")
-                return
-        except ValueError:
-            messagebox.showwarning("Atenção", "Quantidade deve ser um número!")
-            return
-        
         isbn = dados['isbn']
-        if isbn in self.app.livros:
-            resposta = messagebox.askyesno(
+        somar = False
+        if dados['título'] and isbn in self.app.livros:
+            somar = messagebox.askyesno(
                 "Livro Existente",
-                f"Já existe livro com ISBN {isbn}.\nDeseja adicionar {quantidade} unidades ao estoque?"
+                f"Já existe livro com ISBN {isbn}.\nDeseja adicionar {dados['quantidade']} unidades ao estoque?"
             )
-            if resposta:
-                self.app.livros[isbn]['quantidade'] += quantidade
-                self.app.salvar_dados(self.app.livros, self.app.arquivo_livros)
-                self.atualizar_lista_livros()
-                self.limpar_campos()
-                messagebox.showinfo("Sucesso", f"Quantidade atualizada: {self.app.livros[isbn]['quantidade']}")
-            return
+            if not somar:
+                return
         
-        self.app.livros[isbn] = {
-            'título': dados['título'],
-            'autor': dados['autor'],
-            'gênero': dados['gênero'],
-            'quantidade': quantidade
-        }
+        try:
+            livro = operacoes.cadastrar_livro(
+                self.app.repositorio, isbn, dados['título'], dados['autor'], dados['gênero'],
+                dados['quantidade'], somar=somar
+            )
+        except operacoes.ErroOperacao as e:
+            messagebox.showwarning("Atenção", str(e))
+            return
+        except ErroPersistencia as e:
+            messagebox.showerror("Erro", str(e))
+            return
         
-        self.app.salvar_dados(self.app.livros, self.app.arquivo_livros)
         self.atualizar_lista_livros()
         self.limpar_campos()
-        messagebox.showinfo("Sucesso", "Livro adicionado!")
+        if somar:
+            messagebox.showinfo("Sucesso", f"Quantidade atualizada: {livro['quantidade']}")
+        else:
+            messagebox.showinfo("Sucesso", "Livro adicionado!")
     
     def editar_livro(self):
         """Edita um livro existente"""
-        selecionado = self.treeview.selection()
-        if not selecionado:
+        isbn_atual = self.lista.chave_selecionada()
+        if isbn_atual is None or isbn_atual not in self.app.livros:
             messagebox.showwarning("Atenção", "Selecione um livro!")
             return
         
-        item = self.treeview.item(selecionado[0])
-        # Converter para string para garantir compatibilidade
-        isbn_atual = str(item['values'][2])
         dados = self.obter_dados_formulario()
         novo_isbn = dados['isbn']
         
@@ -834,44 +1144,43 @@ class TelaLivros:
             messagebox.showwarning("Atenção", f"Já existe livro com ISBN {novo_isbn}!")
             return
         
-        if novo_isbn != isbn_atual:
-            livro_antigo = self.app.livros.pop(isbn_atual)
-            livro_antigo.update({
-                'título': dados['título'],
-                'autor': dados['autor'],
-                'gênero': dados['gênero'],
-                'quantidade': quantidade
-            })
-            self.app.livros[novo_isbn] = livro_antigo
-        else:
-            self.app.livros[isbn_atual] = {
-                'título': dados['título'],
-                'autor': dados['autor'],
-                'gênero': dados['gênero'],
-                'quantidade': quantidade
-            }
-        
-        self.app.salvar_dados(self.app.livros, self.app.arquivo_livros)
+        try:
+            with self.app.repositorio.transacao():
+                if novo_isbn != isbn_atual:
+                    livro = dict(self.app.livros[isbn_atual])
+                    livro.update({
+                        'título': dados['título'],
+                        'autor': dados['autor'],
+                        'gênero': dados['gênero'],
+                        'quantidade': quantidade
+                    })
+                    self.app.repositorio.remover('livros', isbn_atual)
+                    self.app.repositorio.gravar('livros', novo_isbn, livro)
+                else:
+                    self.app.repositorio.gravar('livros', isbn_atual, {
+                        'título': dados['título'],
+                        'autor': dados['autor'],
+                        'gênero': dados['gênero'],
+                        'quantidade': quantidade
+                    })
+        except ErroPersistencia as e:
+            messagebox.showerror("Erro", str(e))
+            return
+        
         self.atualizar_lista_livros()
         self.limpar_campos()
         messagebox.showinfo("Sucesso", "Livro editado!")
     
     def excluir_livro(self):
         """Exclui um livro"""
-        selecionado = self.treeview.selection()
-        if not selecionado:
+        isbn = self.lista.chave_selecionada()
+        if isbn is None:
             messagebox.showwarning("Atenção", "Selecione um livro!")
             return
         
-        item = self.treeview.item(selecionado[0])
-        titulo = item['values'][0]
-        # Converter explicitamente para string para evitar erro de chave (int vs str)
-        isbn = str(item['values'][2])
+        titulo = self.app.livros.get(isbn, {}).get('título', '')
         
-        livro_emprestado = any(
-            emp.get('isbn_livro') == isbn and emp.get('status') == 'ativo'
-            for emp in self.app.emprestimos.values()
-        )
+        livro_emprestado = self.app.indice_emprestimos.ativos_do_livro(isbn) > 0
         
         if livro_emprestado:
             messagebox.showwarning("Atenção", f"O livro '{titulo}' está emprestado!")
@@ -884,8 +1193,9 @@ class TelaLivros:
         
         if resposta:
             if isbn in self.app.livros:
-                del self.app.livros[isbn]
-                self.app.salvar_dados(self.app.livros, self.app.arquivo_livros)
+                if not self.app.remover_registro('livros', isbn):
+                    return
+                self.lista.limpar_selecao()
                 self.atualizar_lista_livros()
                 self.limpar_campos()
                 messagebox.showinfo("Sucesso", "Livro excluído!")
@@ -902,10 +1212,7 @@ class TelaLivros:
         
         if isbn in self.app.livros:
             livro = self.app.livros[isbn]
-            emprestado = any(
-                emp.get('isbn_livro') == isbn and emp.get('status') == 'ativo'
-                for emp in self.app.emprestimos.values()
-            )
+            emprestado = self.app.indice_emprestimos.ativos_do_livro(isbn) > 0
             
             status = "Disponível" if not emprestado else "Emprestado"
             messagebox.showinfo(
@@ -923,12 +1230,11 @@ class TelaLivros:
     
     def selecionar_livro(self, event):
         """Preenche formulário com livro selecionado"""
-        selecionado = self.treeview.selection()
-        if not selecionado:
+        isbn = self.lista.chave_selecionada()
+        if isbn is None or isbn not in self.app.livros:
             return
         
-        item = self.treeview.item(selecionado[0])
-        valores = item['values']
+        valores = self.linha_livro(isbn)
         
         self.entries['título'].delete(0, tk.END)
         self.entries['título'].insert(0, valores[0])
@@ -962,22 +1268,23 @@ class TelaLivros:
     
     def atualizar_lista_livros(self):
         """Atualiza a lista de livros"""
-        for item in self.treeview.get_children():
-            self.treeview.delete(item)
-        
+        livros = self.app.livros
         livros_ordenados = sorted(
-            self.app.livros.items(),
-            key=lambda x: x[1].get('título', '').lower()
+            livros,
+            key=lambda isbn: livros[isbn].get('título', '').lower()
+        )
+        self.lista.definir_chaves(livros_ordenados)
+    
+    def linha_livro(self, isbn):
+        """Valores da linha de um livro na tabela"""
+        livro = self.app.livros.get(isbn, {})
+        return (
+            livro.get('título', ''),
+            livro.get('autor', ''),
+            isbn,
+            livro.get('gênero', ''),
+            livro.get('quantidade', 0)
         )
-        
-        for isbn, livro in livros_ordenados:
-            self.treeview.insert("", tk.END, values=(
-                livro.get('título', ''),
-                livro.get('autor', ''),
-                isbn,
-                livro.get('gênero', ''),
-                livro.get('quantidade', 0)
-            ))
 
 
 class TelaUsuarios:
@@ -1038,7 +1345,8 @@ class TelaUsuarios:
         frame_lista.grid(row=2, column=0, columnspan=3, sticky=(tk.W, tk.E, tk.N, tk.S), pady=(0, 10))
         
         colunas = ("id", "nome", "tipo", "emprestimos_ativos")
-        self.treeview = ttk.Treeview(frame_lista, columns=colunas, show="headings", height=15)
+        self.lista = ListaVirtual(frame_lista, colunas, self.linha_usuario, altura=15)
+        self.treeview = self.lista.treeview
         
         self.treeview.heading("id", text="ID")
         self.treeview.heading("nome", text="Nome")
@@ -1050,11 +1358,7 @@ class TelaUsuarios:
         self.treeview.column("tipo", width=120)
         self.treeview.column("emprestimos_ativos", width=120)
         
-        scrollbar = ttk.Scrollbar(frame_lista, orient=tk.VERTICAL, command=self.treeview.yview)
-        self.treeview.configure(yscrollcommand=scrollbar.set)
-        
-        self.treeview.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
-        scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
+        self.lista.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
         
         frame_lista.columnconfigure(0, weight=1)
         frame_lista.rowconfigure(0, weight=1)
@@ -1077,37 +1381,26 @@ class TelaUsuarios:
         id_usuario = self.entries['id'].get().strip()
         tipo = self.combo_tipo.get()
         
-        if not nome or not id_usuario:
-            messagebox.showwarning("Atenção", "Nome e ID são obrigatórios!")
+        try:
+            operacoes.cadastrar_usuario(self.app.repositorio, id_usuario, nome, tipo)
+        except operacoes.ErroOperacao as e:
+            messagebox.showwarning("Atenção", str(e))
             return
-        
-        if id_usuario in self.app.usuarios:
-            messagebox.showwarning("Atenção", f"Já existe usuário com ID {id_usuario}!")
+        except ErroPersistencia as e:
+            messagebox.showerror("Erro", str(e))
             return
         
-        self.app.usuarios[id_usuario] = {
-            'nome': nome,
-            'tipo': tipo,
-            'data_cadastro': datetime.now().strftime("%Y-%m-%d"),
-            'historico': []
-        }
-        
-        self.app.salvar_dados(self.app.usuarios, self.app.arquivo_usuarios)
         self.atualizar_lista_usuarios()
         self.limpar_campos()
         messagebox.showinfo("Sucesso", f"Usuário '{nome}' cadastrado!")
     
     def editar_usuario(self):
         """Edita usuário existente"""
-        selecionado = self.treeview.selection()
-        if not selecionado:
+        id_atual = self.lista.chave_selecionada()
+        if id_atual is None or id_atual not in self.app.usuarios:
             messagebox.showwarning("Atenção", "Selecione um usuário!")
             return
         
-        item = self.treeview.item(selecionado[0])
-        # Converter ID para string para evitar problemas de compatibilidade
-        id_atual = str(item['values'][0])
-        
         nome = self.entries['nome'].get().strip()
         novo_id = self.entries['id'].get().strip()
         tipo = self.combo_tipo.get()
@@ -1120,39 +1413,38 @@ class TelaUsuarios:
             messagebox.showwarning("Atenção", f"Já existe usuário com ID {novo_id}!")
             return
         
-        if novo_id != id_atual:
-            usuario_data = self.app.usuarios.pop(id_atual)
-            usuario_data.update({'nome': nome, 'tipo': tipo})
-            self.app.usuarios[novo_id] = usuario_data
-            
-            for emp in self.app.emprestimos.values():
-                if str(emp.get('id_usuario')) == id_atual:
-                    emp['id_usuario'] = novo_id
-            self.app.salvar_dados(self.app.emprestimos, self.app.arquivo_emprestimos)
-        else:
-            self.app.usuarios[id_atual].update({'nome': nome, 'tipo': tipo})
+        repositorio = self.app.repositorio
+        try:
+            with repositorio.transacao():
+                if novo_id != id_atual:
+                    usuario_data = dict(self.app.usuarios[id_atual])
+                    usuario_data.update({'nome': nome, 'tipo': tipo})
+                    repositorio.remover('usuarios', id_atual)
+                    repositorio.gravar('usuarios', novo_id, usuario_data)
+                    
+                    emprestimos_usuario = self.app.indice_emprestimos.emprestimos_do_usuario(id_atual)
+                    for emp_id in emprestimos_usuario:
+                        repositorio.atualizar('emprestimos', emp_id, id_usuario=novo_id)
+                else:
+                    repositorio.atualizar('usuarios', id_atual, nome=nome, tipo=tipo)
+        except ErroPersistencia as e:
+            messagebox.showerror("Erro", str(e))
+            return
         
-        self.app.salvar_dados(self.app.usuarios, self.app.arquivo_usuarios)
         self.atualizar_lista_usuarios()
         self.limpar_campos()
         messagebox.showinfo("Sucesso", "Usuário editado!")
     
     def excluir_usuario(self):
         """Exclui usuário"""
-        selecionado = self.treeview.selection()
-        if not selecionado:
+        id_usuario = self.lista.chave_selecionada()
+        if id_usuario is None:
             messagebox.showwarning("Atenção", "Selecione um usuário!")
             return
         
-        item = self.treeview.item(selecionado[0])
-        # Converter explicitamente para string para evitar erro de chave (int vs str)
-        id_usuario = str(item['values'][0])
-        nome = item['values'][1]
+        nome = self.app.usuarios.get(id_usuario, {}).get('nome', '')
         
-        emprestimos_ativos = any(
-            str(emp.get('id_usuario')) == id_usuario and emp.get('status') == 'ativo'
-            for emp in self.app.emprestimos.values()
-        )
+        emprestimos_ativos = self.app.indice_emprestimos.ativos_do_usuario(id_usuario) > 0
         
         if emprestimos_ativos:
             messagebox.showwarning("Atenção", f"Usuário '{nome}' tem empréstimos ativos!")
@@ -1165,8 +1457,9 @@ class TelaUsuarios:
         
         if resposta:
             if id_usuario in self.app.usuarios:
-                del self.app.usuarios[id_usuario]
-                self.app.salvar_dados(self.app.usuarios, self.app.arquivo_usuarios)
+                if not self.app.remover_registro('usuarios', id_usuario):
+                    return
+                self.lista.limpar_selecao()
                 self.atualizar_lista_usuarios()
                 self.limpar_campos()
                 messagebox.showinfo("Sucesso", "Usuário excluído!")
@@ -1175,18 +1468,16 @@ class TelaUsuarios:
     
     def ver_historico(self):
         """Exibe histórico do usuário"""
-        selecionado = self.treeview.selection()
-        if not selecionado:
+        id_usuario = self.lista.chave_selecionada()
+        if id_usuario is None:
             messagebox.showwarning("Atenção", "Selecione um usuário!")
             return
         
-        item = self.treeview.item(selecionado[0])
-        id_usuario = str(item['values'][0])
-        nome = item['values'][1]
+        nome = self.app.usuarios.get(id_usuario, {}).get('nome', '')
         
         emprestimos_usuario = [
-            emp for emp in self.app.emprestimos.values()
-            if str(emp.get('id_usuario')) == id_usuario
+            self.app.emprestimos[emp_id]
+            for emp_id in self.app.indice_emprestimos.emprestimos_do_usuario(id_usuario)
         ]
         
         if not emprestimos_usuario:
@@ -1207,12 +1498,11 @@ class TelaUsuarios:
     
     def selecionar_usuario(self, event):
         """Preenche formulário com usuário selecionado"""
-        selecionado = self.treeview.selection()
-        if not selecionado:
+        id_usuario = self.lista.chave_selecionada()
+        if id_usuario is None or id_usuario not in self.app.usuarios:
             return
         
-        item = self.treeview.item(selecionado[0])
-        valores = item['values']
+        valores = self.linha_usuario(id_usuario)
         
         self.entries['nome'].delete(0, tk.END)
         self.entries['nome'].insert(0, valores[1])
@@ -1230,29 +1520,22 @@ class TelaUsuarios:
     
     def atualizar_lista_usuarios(self):
         """Atualiza lista de usuários"""
-        for item in self.treeview.get_children():
-            self.treeview.delete(item)
-        
-        emprestimos_ativos = {}
-        for emp in self.app.emprestimos.values():
-            if emp.get('status') == 'ativo':
-                usuario_id = str(emp.get('id_usuario', ''))
-                if usuario_id:
-                    emprestimos_ativos[usuario_id] = emprestimos_ativos.get(usuario_id, 0) + 1
-        
+        usuarios = self.app.usuarios
         usuarios_ordenados = sorted(
-            self.app.usuarios.items(),
-            key=lambda x: x[1].get('nome', '').lower()
+            usuarios,
+            key=lambda usuario_id: usuarios[usuario_id].get('nome', '').lower()
+        )
+        self.lista.definir_chaves(usuarios_ordenados)
+    
+    def linha_usuario(self, usuario_id):
+        """Valores da linha de um usuário na tabela"""
+        usuario = self.app.usuarios.get(usuario_id, {})
+        return (
+            usuario_id,
+            usuario.get('nome', ''),
+            usuario.get('tipo', ''),
+            self.app.indice_emprestimos.ativos_do_usuario(usuario_id)
         )
-        
-        for usuario_id, usuario in usuarios_ordenados:
-            qtd_ativos = emprestimos_ativos.get(str(usuario_id), 0)
-            self.treeview.insert("", tk.END, values=(
-                usuario_id,
-                usuario.get('nome', ''),
-                usuario.get('tipo', ''),
-                qtd_ativos
-            ))
 
 
 class TelaNovoEmprestimo:
@@ -1420,59 +1703,16 @@ class TelaNovoEmprestimo:
             messagebox.showwarning("Atenção", "Selecione um livro válido!")
             return
         
+        # Validações e gravação em biblioteca.operacoes, as mesmas da linha de comando
         try:
-            prazo_dias = int(self.entry_prazo.get())
-            if prazo_dias <= 0:
-                messagebox.showwarning("Atenção", "Prazo deve ser maior que zero!")
-                return
-        except ValueError:
-            messagebox.showwarning("Atenção", "Prazo deve ser um número!")
-            return
-        
-        if user_id not in self.app.usuarios:
-            messagebox.showwarning("Atenção", "Usuário não encontrado!")
-            return
-        
-        if isbn not in self.app.livros:
-            messagebox.showwarning("Atenção", "Livro não encontrado!")
-            return
-        
-        livro = self.app.livros[isbn]
-        if livro.get('quantidade', 0) <= 0:
-            messagebox.showwarning("Atenção", "Livro não disponível!")
+            emprestimo_id, emprestimo = operacoes.emprestar(
+                self.app.repositorio, user_id, isbn, self.entry_prazo.get()
+            )
+        except operacoes.ErroOperacao as e:
+            messagebox.showwarning("Atenção", str(e))
             return
-        
-        emprestimos_ativos = sum(
-            1 for emp in self.app.emprestimos.values()
-            if emp.get('id_usuario') == user_id and emp.get('status') == 'ativo'
-        )
-        
-        if emprestimos_ativos >= 3:
-            messagebox.showwarning("Atenção", 
-                f"Usuário já tem {emprestimos_ativos} empréstimos ativos!")
-            return
-        
-        emprestimo_id = self.app.gerar_id_unico("EMP")
-        data_emprestimo = datetime.now().strftime("%Y-%m-%d")
-        data_devolucao = (datetime.now() + timedelta(days=prazo_dias)).strftime("%Y-%m-%d")
-        
-        self.app.emprestimos[emprestimo_id] = {
-            'id_usuario': user_id,
-            'isbn_livro': isbn,
-            'data_emprestimo': data_emprestimo,
-            'data_devolucao_prevista': data_devolucao,
-            'status': 'ativo',
-            'multa': 0.00
-        }
-        
-        self.app.livros[isbn]['quantidade'] -= 1
-        
-        if 'historico' not in self.app.usuarios[user_id]:
-            self.app.usuarios[user_id]['historico'] = []
-        self.app.usuarios[user_id]['historico'].append(emprestimo_id)
-        
-        if not self.app.salvar_todos_dados():
-            messagebox.showerror("Erro", "Não foi possível salvar!")
+        except ErroPersistencia as e:
+            messagebox.showerror("Erro", f"Não foi possível salvar!\n{e}")
             return
         
         self.limpar_campos()
@@ -1481,7 +1721,7 @@ class TelaNovoEmprestimo:
         messagebox.showinfo("Sucesso", 
             f"Empréstimo realizado!\n\n"
             f"Código: {emprestimo_id}\n"
-            f"Data Devolução: {data_devolucao}")
+            f"Data Devolução: {emprestimo['data_devolucao_prevista']}")
     
     def limpar_campos(self):
         """Limpa os campos"""
@@ -1542,7 +1782,8 @@ class TelaGerenciarEmprestimos:
         frame_lista.grid(row=2, column=0, columnspan=4, sticky=(tk.W, tk.E, tk.N, tk.S), pady=(0, 10))
         
         colunas = ("id", "usuario", "livro", "data_emp", "data_dev", "status", "multa")
-        self.treeview = ttk.Treeview(frame_lista, columns=colunas, show="headings", height=15)
+        self.lista = ListaVirtual(frame_lista, colunas, self.linha_emprestimo, altura=15)
+        self.treeview = self.lista.treeview
         
         self.treeview.heading("id", text="ID Empréstimo")
         self.treeview.heading("usuario", text="Usuário")
@@ -1560,11 +1801,7 @@ class TelaGerenciarEmprestimos:
         self.treeview.column("status", width=80)
         self.treeview.column("multa", width=80)
         
-        scrollbar = ttk.Scrollbar(frame_lista, orient=tk.VERTICAL, command=self.treeview.yview)
-        self.treeview.configure(yscrollcommand=scrollbar.set)
-        
-        self.treeview.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
-        scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
+        self.lista.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
         
         frame_lista.columnconfigure(0, weight=1)
         frame_lista.rowconfigure(0, weight=1)
@@ -1591,32 +1828,35 @@ class TelaGerenciarEmprestimos:
     
     def atualizar_lista_emprestimos(self):
         """Atualiza lista de empréstimos"""
-        for item in self.treeview.get_children():
-            self.treeview.delete(item)
-        
         filtro = self.combo_filtro.get()
         
-        for emp_id, emprestimo in self.app.emprestimos.items():
-            if filtro == "Ativos" and emprestimo.get('status') != 'ativo':
-                continue
-            elif filtro == "Devolvidos" and emprestimo.get('status') != 'devolvido':
-                continue
-            
-            usuario = self.app.usuarios.get(emprestimo.get('id_usuario', ''), {})
-            livro = self.app.livros.get(emprestimo.get('isbn_livro', ''), {})
-            
-            status = "🔄 Ativo" if emprestimo.get('status') == 'ativo' else "✅ Devolvido"
-            multa = f"{emprestimo.get('multa', 0.00):.2f}"
-            
-            self.treeview.insert("", tk.END, values=(
-                emp_id,
-                usuario.get('nome', 'Desconhecido'),
-                livro.get('título', 'Desconhecido'),
-                emprestimo.get('data_emprestimo', ''),
-                emprestimo.get('data_devolucao_prevista', ''),
-                status,
-                multa
-            ))
+        if filtro == "Ativos":
+            chaves = self.app.indice_emprestimos.com_status('ativo')
+        elif filtro == "Devolvidos":
+            chaves = self.app.indice_emprestimos.com_status('devolvido')
+        else:
+            chaves = list(self.app.emprestimos)
+        
+        self.lista.definir_chaves(chaves)
+    
+    def linha_emprestimo(self, emp_id):
+        """Valores da linha de um empréstimo na tabela"""
+        emprestimo = self.app.emprestimos.get(emp_id, {})
+        usuario = self.app.usuarios.get(emprestimo.get('id_usuario', ''), {})
+        livro = self.app.livros.get(emprestimo.get('isbn_livro', ''), {})
+        
+        status = "🔄 Ativo" if emprestimo.get('status') == 'ativo' else "✅ Devolvido"
+        multa = f"{emprestimo.get('multa', 0.00):.2f}"
+        
+        return (
+            emp_id,
+            usuario.get('nome', 'Desconhecido'),
+            livro.get('título', 'Desconhecido'),
+            emprestimo.get('data_emprestimo', ''),
+            emprestimo.get('data_devolucao_prevista', ''),
+            status,
+            multa
+        )
     
     def limpar_filtro(self):
         """Limpa filtro"""
@@ -1625,36 +1865,22 @@ class TelaGerenciarEmprestimos:
     
     def registrar_devolucao(self):
         """Registra devolução"""
-        selecionado = self.treeview.selection()
-        if not selecionado:
+        emp_id = self.lista.chave_selecionada()
+        if emp_id is None:
             messagebox.showwarning("Atenção", "Selecione um empréstimo!")
             return
         
-        item = self.treeview.item(selecionado[0])
-        emp_id = item['values'][0]
-        
         if emp_id not in self.app.emprestimos:
             messagebox.showerror("Erro", "Empréstimo não encontrado!")
             return
         
-        emprestimo = self.app.emprestimos[emp_id]
-        
-        if emprestimo.get('status') == 'devolvido':
-            messagebox.showwarning("Atenção", "Este empréstimo já foi devolvido!")
+        try:
+            multa = operacoes.devolver(self.app.repositorio, emp_id, self.app.regras_multa)
+        except operacoes.ErroOperacao as e:
+            messagebox.showwarning("Atenção", str(e))
             return
-        
-        multa = self.app.calcular_multa(emprestimo.get('data_devolucao_prevista', ''))
-        
-        emprestimo['status'] = 'devolvido'
-        emprestimo['data_devolucao_real'] = datetime.now().strftime("%Y-%m-%d")
-        emprestimo['multa'] = multa
-        
-        isbn = emprestimo.get('isbn_livro', '')
-        if isbn in self.app.livros:
-            self.app.livros[isbn]['quantidade'] += 1
-        
-        if not self.app.salvar_todos_dados():
-            messagebox.showerror("Erro", "Não foi possível salvar!")
+        except ErroPersistencia as e:
+            messagebox.showerror("Erro", f"Não foi possível salvar!\n{e}")
             return
         
         self.atualizar_lista_emprestimos()
@@ -1667,14 +1893,11 @@ class TelaGerenciarEmprestimos:
     
     def calcular_multa(self):
         """Calcula multa"""
-        selecionado = self.treeview.selection()
-        if not selecionado:
+        emp_id = self.lista.chave_selecionada()
+        if emp_id is None:
             messagebox.showwarning("Atenção", "Selecione um empréstimo!")
             return
         
-        item = self.treeview.item(selecionado[0])
-        emp_id = item['values'][0]
-        
         if emp_id not in self.app.emprestimos:
             messagebox.showerror("Erro", "Empréstimo não encontrado!")
             return
@@ -1688,20 +1911,17 @@ class TelaGerenciarEmprestimos:
             multa = self.app.calcular_multa(emprestimo.get('data_devolucao_prevista', ''))
             if multa > 0:
                 messagebox.showwarning("Multa Pendente", 
-                    f"Multa a pagar: {multa:.2f} Kz\n500 Kz por dia de atraso")
+                    f"Multa a pagar: {multa:.2f} Kz\n{self.app.regras_multa.descricao()}")
             else:
                 messagebox.showinfo("Sem Multa", "Não há multa pendente.")
     
     def ver_detalhes(self):
         """Exibe detalhes do empréstimo"""
-        selecionado = self.treeview.selection()
-        if not selecionado:
+        emp_id = self.lista.chave_selecionada()
+        if emp_id is None:
             messagebox.showwarning("Atenção", "Selecione um empréstimo!")
             return
         
-        item = self.treeview.item(selecionado[0])
-        emp_id = item['values'][0]
-        
         if emp_id not in self.app.emprestimos:
             messagebox.showerror("Erro", "Empréstimo não encontrado!")
             return
@@ -1789,6 +2009,7 @@ class TelaConsultaEstoque:
         frame_lista.grid(row=2, column=0, columnspan=3, sticky=(tk.W, tk.E, tk.N, tk.S), pady=(0, 10))
         
         colunas = ("título", "autor", "isbn", "gênero", "quantidade", "disponivel", "status")
+        self.linhas_mostradas = {}
         self.treeview = ttk.Treeview(frame_lista, columns=colunas, show="headings", height=20)
         
         self.treeview.heading("título", text="Título")
@@ -1842,25 +2063,23 @@ class TelaConsultaEstoque:
     
     def atualizar_lista_livros(self):
         """Atualiza a lista de livros com filtros aplicados"""
-        for item in self.treeview.get_children():
-            self.treeview.delete(item)
-        
         filtro_disp = self.filtro_disponibilidade.get()
         filtro_gen = self.filtro_genero.get()
         
         total = 0
         disponiveis = 0
         emprestados = 0
+        linhas = []
+        
+        # Contador mantido pelo índice: uma única passagem pelo catálogo
+        ativos_por_livro = self.app.indice_emprestimos.ativos_por_livro
         
         for isbn, livro in self.app.livros.items():
             if filtro_gen != "Todos" and livro.get('gênero', '') != filtro_gen:
                 continue
             
             qtd_total = livro.get('quantidade', 0)
-            qtd_emprestada = sum(
-                1 for emp in self.app.emprestimos.values()
-                if emp.get('isbn_livro') == isbn and emp.get('status') == 'ativo'
-            )
+            qtd_emprestada = ativos_por_livro.get(isbn, 0)
             qtd_disponivel = qtd_total - qtd_emprestada
             
             if filtro_disp == "Disponíveis" and qtd_disponivel <= 0:
@@ -1881,7 +2100,7 @@ class TelaConsultaEstoque:
             else:
                 status = f"⚠️ {qtd_disponivel}/{qtd_total} disp."
             
-            self.treeview.insert("", tk.END, values=(
+            linhas.append((isbn, (
                 livro.get('título', ''),
                 livro.get('autor', ''),
                 isbn,
@@ -1889,7 +2108,9 @@ class TelaConsultaEstoque:
                 qtd_total,
                 qtd_disponivel,
                 status
-            ))
+            )))
+        
+        sincronizar_linhas(self.treeview, linhas, self.linhas_mostradas)
         
         self.label_total.config(text=f"Total: {total} livros")
         self.label_disponiveis.config(text=f"Disponíveis: {disponiveis}")
@@ -1902,28 +2123,15 @@ class TelaConsultaEstoque:
         self.atualizar_lista_livros()
     
     def exportar_lista(self):
-        """Exporta a lista de livros para arquivo de texto"""
-        try:
-            with open("catalogo_livros.txt", "w", encoding='utf-8') as f:
-                f.write("CATÁLOGO DE LIVROS - BIBLIOTECA ISCAT\n")
-                f.write("=" * 60 + "\n\n")
-                
-                for item in self.treeview.get_children():
-                    valores = self.treeview.item(item)['values']
-                    f.write(f"Título: {valores[0]}\n")
-                    f.write(f"Autor: {valores[1]}\n")
-                    f.write(f"ISBN: {valores[2]}\n")
-                    f.write(f"Gênero: {valores[3]}\n")
-                    f.write(f"Quantidade Total: {valores[4]}\n")
-                    f.write(f"Disponível: {valores[5]}\n")
-                    f.write(f"Status: {valores[6]}\n")
-                    f.write("-" * 60 + "\n")
-                
-                f.write(f"\nTotal de livros listados: {len(self.treeview.get_children())}\n")
-            
-            messagebox.showinfo("Exportação", "Catálogo exportado para 'catalogo_livros.txt'")
-        except Exception as e:
-            messagebox.showerror("Erro", f"Erro ao exportar: {str(e)}")
+        """Exporta o catálogo com os filtros aplicados"""
+        filtro_disp = self.filtro_disponibilidade.get()
+        filtro_gen = self.filtro_genero.get()
+        filtros = {
+            'genero': None if filtro_gen == "Todos" else filtro_gen,
+            'disponiveis': {"Disponíveis": True, "Indisponíveis": False}.get(filtro_disp),
+        }
+        JanelaExportacao(self.app, 'livros', filtros,
+                         f"Catálogo - Disponibilidade: {filtro_disp}, Gênero: {filtro_gen}")
 
 
 class TelaEstoque:
@@ -1966,10 +2174,7 @@ class TelaEstoque:
         
         for isbn, livro in self.app.livros.items():
             qtd_total = livro.get('quantidade', 0)
-            qtd_emprestada = sum(
-                1 for emp in self.app.emprestimos.values()
-                if emp.get('isbn_livro') == isbn and emp.get('status') == 'ativo'
-            )
+            qtd_emprestada = self.app.indice_emprestimos.ativos_do_livro(isbn)
             disponiveis_total += (qtd_total - qtd_emprestada)
             emprestados_total += qtd_emprestada
         
@@ -2096,9 +2301,13 @@ class TelaEstoque:
 class TelaBuscaLivros:
     """Classe para tela de busca de livros"""
     
+    # Espera após a última tecla antes de buscar (ms)
+    ATRASO_BUSCA_MS = 250
+    
     def __init__(self, parent, app):
         self.parent = parent
         self.app = app
+        self.busca_agendada = None
         
         self.frame = ttk.Frame(parent)
         self.frame.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
@@ -2125,6 +2334,8 @@ class TelaBuscaLivros:
         ttk.Label(frame_busca, text="Termo de busca:").grid(row=0, column=0, sticky=tk.W, padx=(0, 10))
         self.entry_busca = ttk.Entry(frame_busca, width=40)
         self.entry_busca.grid(row=0, column=1, sticky=(tk.W, tk.E), padx=(0, 20))
+        self.entry_busca.bind("<KeyRelease>", self.agendar_busca)
+        self.entry_busca.bind("<Return>", lambda event: self.realizar_busca())
         
         ttk.Label(frame_busca, text="Buscar por:").grid(row=0, column=2, sticky=tk.W, padx=(0, 10))
         self.tipo_busca = ttk.Combobox(frame_busca, 
@@ -2132,6 +2343,7 @@ class TelaBuscaLivros:
                                       width=15, state="readonly")
         self.tipo_busca.grid(row=0, column=3, sticky=tk.W)
         self.tipo_busca.set("Todos os Campos")
+        self.tipo_busca.bind("<<ComboboxSelected>>", self.agendar_busca)
         
         ttk.Button(frame_busca, text="🔍 Buscar", 
                   command=self.realizar_busca, width=15).grid(row=0, column=4, padx=(20, 0))
@@ -2140,6 +2352,7 @@ class TelaBuscaLivros:
         frame_resultados.grid(row=2, column=0, columnspan=3, sticky=(tk.W, tk.E, tk.N, tk.S), pady=(0, 10))
         
         colunas = ("título", "autor", "isbn", "gênero", "quantidade", "disponivel", "status")
+        self.linhas_mostradas = {}
         self.treeview = ttk.Treeview(frame_resultados, columns=colunas, show="headings", height=15)
         
         self.treeview.heading("título", text="Título")
@@ -2181,46 +2394,60 @@ class TelaBuscaLivros:
         ttk.Button(frame_navegacao, text="📋 Ver Estoque Completo", 
                   command=self.app.abrir_estoque, width=20).grid(row=0, column=1, padx=5)
     
+    def agendar_busca(self, event=None):
+        """Agenda a busca para quando o usuário parar de digitar"""
+        if event is not None and event.keysym == "Return":
+            return
+        if self.busca_agendada is not None:
+            self.frame.after_cancel(self.busca_agendada)
+        self.busca_agendada = self.frame.after(self.ATRASO_BUSCA_MS, self.busca_incremental)
+    
+    def busca_incremental(self):
+        """Busca enquanto o usuário digita, sem avisos para termo vazio"""
+        self.busca_agendada = None
+        if not self.frame.winfo_exists():
+            return
+        
+        if not self.entry_busca.get().strip():
+            sincronizar_linhas(self.treeview, [], self.linhas_mostradas)
+            self.label_resultados.config(text="Digite um termo para buscar...")
+            return
+        
+        self.mostrar_resultados()
+    
     def realizar_busca(self):
         """Realiza a busca de livros"""
         termo = self.entry_busca.get().strip()
-        tipo = self.tipo_busca.get()
         
         if not termo:
             messagebox.showwarning("Atenção", "Digite um termo para buscar!")
             return
         
-        for item in self.treeview.get_children():
-            self.treeview.delete(item)
-        
-        resultados = []
-        termo_lower = termo.lower()
+        self.mostrar_resultados()
+    
+    def mostrar_resultados(self):
+        """Preenche a tabela com os livros que casam com o termo atual"""
+        termo = self.entry_busca.get().strip()
+        tipo = self.tipo_busca.get()
         
-        for isbn, livro in self.app.livros.items():
-            titulo = livro.get('título', '').lower()
-            autor = livro.get('autor', '').lower()
-            
-            if tipo == "Título" and termo_lower in titulo:
-                resultados.append((isbn, livro))
-            elif tipo == "Autor" and termo_lower in autor:
-                resultados.append((isbn, livro))
-            elif tipo == "ISBN" and termo_lower in isbn.lower():
-                resultados.append((isbn, livro))
-            elif tipo == "Todos os Campos" and (termo_lower in titulo or termo_lower in autor or termo_lower in isbn.lower()):
-                resultados.append((isbn, livro))
+        campos = {
+            "Título": ('título',),
+            "Autor": ('autor',),
+            "ISBN": ('isbn',),
+        }.get(tipo)
+        resultados = self.app.buscar_livros(termo, campos)
+        linhas = []
         
         if resultados:
+            ativos_por_livro = self.app.indice_emprestimos.ativos_por_livro
             for isbn, livro in resultados:
                 qtd_total = livro.get('quantidade', 0)
-                qtd_emprestada = sum(
-                    1 for emp in self.app.emprestimos.values()
-                    if emp.get('isbn_livro') == isbn and emp.get('status') == 'ativo'
-                )
+                qtd_emprestada = ativos_por_livro.get(isbn, 0)
                 qtd_disponivel = qtd_total - qtd_emprestada
                 
                 status = "✅ Disponível" if qtd_disponivel > 0 else "❌ Indisponível"
                 
-                self.treeview.insert("", tk.END, values=(
+                linhas.append((isbn, (
                     livro.get('título', ''),
                     livro.get('autor', ''),
                     isbn,
@@ -2228,7 +2455,7 @@ class TelaBuscaLivros:
                     qtd_total,
                     qtd_disponivel,
                     status
-                ))
+                )))
             
             self.label_resultados.config(
                 text=f"✅ Encontrados {len(resultados)} livro(s) para '{termo}'"
@@ -2237,11 +2464,16 @@ class TelaBuscaLivros:
             self.label_resultados.config(
                 text=f"❌ Nenhum livro encontrado para '{termo}'"
             )
+        
+        sincronizar_linhas(self.treeview, linhas, self.linhas_mostradas)
 
 
 class TelaHistoricoMovimentacao:
     """Classe para tela de histórico de movimentação"""
     
+    # Período -> dias; "Todos" não tem limite
+    PERIODOS = {"7 dias": 7, "15 dias": 15, "30 dias": 30, "60 dias": 60, "Todos": None}
+    
     def __init__(self, parent, app):
         self.parent = parent
         self.app = app
@@ -2271,7 +2503,7 @@ class TelaHistoricoMovimentacao:
         
         ttk.Label(frame_controles, text="Mostrar últimos:").grid(row=0, column=0, sticky=tk.W, padx=(0, 10))
         self.periodo = ttk.Combobox(frame_controles, 
-                                   values=["7 dias", "15 dias", "30 dias", "60 dias", "Todos"], 
+                                   values=list(self.PERIODOS), 
                                    width=10, state="readonly")
         self.periodo.grid(row=0, column=1, sticky=tk.W, padx=(0, 20))
         self.periodo.set("30 dias")
@@ -2285,7 +2517,10 @@ class TelaHistoricoMovimentacao:
         frame_lista.grid(row=2, column=0, columnspan=4, sticky=(tk.W, tk.E, tk.N, tk.S), pady=(0, 10))
         
         colunas = ("data", "tipo", "usuario", "livro", "status")
-        self.treeview = ttk.Treeview(frame_lista, columns=colunas, show="headings", height=20)
+        self.movimentacao = []
+        self.lista = ListaVirtual(frame_lista, colunas, self.linha_movimentacao,
+                                  altura=20, horizontal=True)
+        self.treeview = self.lista.treeview
         
         self.treeview.heading("data", text="Data")
         self.treeview.heading("tipo", text="Tipo")
@@ -2299,13 +2534,7 @@ class TelaHistoricoMovimentacao:
         self.treeview.column("livro", width=250)
         self.treeview.column("status", width=80)
         
-        vsb = ttk.Scrollbar(frame_lista, orient="vertical", command=self.treeview.yview)
-        hsb = ttk.Scrollbar(frame_lista, orient="horizontal", command=self.treeview.xview)
-        self.treeview.configure(yscrollcommand=vsb.set, xscrollcommand=hsb.set)
-        
-        self.treeview.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
-        vsb.grid(row=0, column=1, sticky=(tk.N, tk.S))
-        hsb.grid(row=1, column=0, sticky=(tk.W, tk.E))
+        self.lista.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
         
         frame_lista.columnconfigure(0, weight=1)
         frame_lista.rowconfigure(0, weight=1)
@@ -2333,62 +2562,32 @@ class TelaHistoricoMovimentacao:
     
     def carregar_movimentacao(self):
         """Carrega a movimentação conforme período selecionado"""
-        for item in self.treeview.get_children():
-            self.treeview.delete(item)
-        
-        periodo = self.periodo.get()
-        if periodo == "7 dias":
-            limite_dias = 7
-        elif periodo == "15 dias":
-            limite_dias = 15
-        elif periodo == "60 dias":
-            limite_dias = 60
-        elif periodo == "Todos":
-            limite_dias = 3650
-        else:
-            limite_dias = 30
+        limite_dias = self.PERIODOS.get(self.periodo.get(), 30)
         
         movimentacao = self.app.obter_movimentacao(limite_dias)
         
         total = len(movimentacao)
-        emprestimos = sum(1 for m in movimentacao if m['tipo'] == 'EMPRÉSTIMO')
-        devolucoes = sum(1 for m in movimentacao if m['tipo'] == 'DEVOLUÇÃO')
-        
-        for mov in movimentacao:
-            self.treeview.insert("", tk.END, values=(
-                mov['data'],
-                mov['tipo'],
-                mov['usuario'],
-                mov['livro'],
-                mov['status']
-            ))
+        emprestimos = movimentacao.contar(EMPRESTIMO)
+        devolucoes = movimentacao.contar(DEVOLUCAO)
+        
+        # Só as linhas visíveis são montadas, mesmo com todo o histórico
+        self.movimentacao = movimentacao
+        self.lista.definir_chaves(range(total))
         
         self.label_total.config(text=f"Total: {total} movimentações")
         self.label_emprestimos.config(text=f"Empréstimos: {emprestimos}")
         self.label_devolucoes.config(text=f"Devoluções: {devolucoes}")
     
+    def linha_movimentacao(self, posicao):
+        """Valores da linha de uma movimentação na tabela"""
+        mov = self.app.descrever_movimento(self.movimentacao[posicao])
+        return (mov['data'], mov['tipo'], mov['usuario'], mov['livro'], mov['status'])
+    
     def exportar_historico(self):
-        """Exporta o histórico para arquivo de texto"""
-        try:
-            with open("historico_movimentacao.txt", "w", encoding='utf-8') as f:
-                f.write("HISTÓRICO DE MOVIMENTAÇÃO - BIBLIOTECA ISCAT\n")
-                f.write("=" * 70 + "\n\n")
-                
-                for item in self.treeview.get_children():
-                    valores = self.treeview.item(item)['values']
-                    f.write(f"Data: {valores[0]}\n")
-                    f.write(f"Tipo: {valores[1]}\n")
-                    f.write(f"Usuário: {valores[2]}\n")
-                    f.write(f"Livro: {valores[3]}\n")
-                    f.write(f"Status: {valores[4]}\n")
-                    f.write("-" * 70 + "\n")
-                
-                f.write(f"\nTotal de movimentações: {len(self.treeview.get_children())}\n")
-                f.write(f"Período: {self.periodo.get()}\n")
-            
-            messagebox.showinfo("Exportação", "Histórico exportado para 'historico_movimentacao.txt'")
-        except Exception as e:
-            messagebox.showerror("Erro", f"Erro ao exportar: {str(e)}")
+        """Exporta a movimentação do período selecionado"""
+        periodo = self.periodo.get()
+        JanelaExportacao(self.app, 'movimentacao', {'limite_dias': self.PERIODOS.get(periodo, 30)},
+                         f"Movimentação - Período: {periodo}")
 
 
 class TelaRelatorios:
@@ -2450,7 +2649,11 @@ class TelaRelatorios:
             
             ("📖", "Livros Emprestados", 
              "Lista de livros atualmente emprestados", 
-             self.app.relatorio_livros_emprestados)
+             self.app.relatorio_livros_emprestados),
+            
+            ("💰", "Multas Pendentes", 
+             "Atrasos e multas a receber por usuário", 
+             self.app.relatorio_multas)
         ]
         
         for i, (icone, titulo_card, descricao_card, comando) in enumerate(relatorios):
@@ -2475,10 +2678,10 @@ class TelaRelatorios:
         frame_export = ttk.LabelFrame(self.frame, text="📤 Exportação de Dados", padding="20")
         frame_export.grid(row=3, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(0, 20))
         
-        ttk.Label(frame_export, text="Exporte todos os dados do sistema para arquivos de texto:", 
+        ttk.Label(frame_export, text="Exporte os dados do sistema para CSV, JSON lines ou colunas:", 
                  font=("Arial", 10)).grid(row=0, column=0, columnspan=2, pady=(0, 10))
         
-        ttk.Button(frame_export, text="📁 Exportar Todos os Dados", 
+        ttk.Button(frame_export, text="📁 Exportar Dados", 
                   command=self.app.exportar_dados, width=25).grid(row=1, column=0, padx=5)
         ttk.Button(frame_export, text="🖨️ Imprimir Relatórios", 
                   command=self.imprimir_todos_relatorios, width=25).grid(row=1, column=1, padx=5)
@@ -2500,6 +2703,153 @@ class TelaRelatorios:
         messagebox.showinfo("Relatórios", "Todos os relatórios principais foram exibidos!")
 
 
+class JanelaExportacao:
+    """Janela de exportação: dados, formato e arquivo; grava em segundo plano"""
+    
+    CONJUNTOS = {"Livros": 'livros', "Usuários": 'usuarios', "Empréstimos": 'emprestimos',
+                 "Movimentação": 'movimentacao'}
+    FORMATOS = {"CSV": 'csv', "JSON lines": 'jsonl', "Colunas (binário)": 'colunas'}
+    # Intervalo de consulta ao progresso da exportação
+    INTERVALO_PROGRESSO_MS = 200
+    
+    def __init__(self, app, conjunto=None, filtros=None, descricao=None):
+        self.app = app
+        # Vindo de uma tela, o conjunto e os filtros são os dela
+        self.filtros = filtros or {}
+        self.exportando = False
+        
+        self.janela = tk.Toplevel(app.root)
+        self.janela.title("Exportar Dados")
+        self.janela.transient(app.root)
+        self.janela.resizable(False, False)
+        self.janela.protocol("WM_DELETE_WINDOW", self.fechar)
+        
+        self.criar_widgets(conjunto, descricao)
+    
+    def criar_widgets(self, conjunto, descricao):
+        """Cria os campos, a barra de progresso e os botões"""
+        frame = ttk.Frame(self.janela, padding="20")
+        frame.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        
+        ttk.Label(frame, text="📤 Exportar Dados", font=("Arial", 14, "bold"),
+                 foreground="#2c3e50").grid(row=0, column=0, columnspan=2, pady=(0, 15))
+        
+        ttk.Label(frame, text="Dados:").grid(row=1, column=0, sticky=tk.W, pady=5)
+        nomes = {valor: nome for nome, valor in self.CONJUNTOS.items()}
+        self.combo_conjunto = ttk.Combobox(frame, values=list(self.CONJUNTOS), width=25, state="readonly")
+        self.combo_conjunto.grid(row=1, column=1, sticky=tk.W, pady=5, padx=(10, 0))
+        self.combo_conjunto.set(nomes[conjunto or 'livros'])
+        if conjunto is not None:
+            self.combo_conjunto.config(state="disabled")
+        
+        ttk.Label(frame, text="Formato:").grid(row=2, column=0, sticky=tk.W, pady=5)
+        self.combo_formato = ttk.Combobox(frame, values=list(self.FORMATOS), width=25, state="readonly")
+        self.combo_formato.grid(row=2, column=1, sticky=tk.W, pady=5, padx=(10, 0))
+        self.combo_formato.set("CSV")
+        
+        self.comprimir = tk.BooleanVar(value=False)
+        ttk.Checkbutton(frame, text="Comprimir (gzip)", variable=self.comprimir).grid(
+            row=3, column=1, sticky=tk.W, pady=5, padx=(10, 0))
+        
+        if descricao:
+            ttk.Label(frame, text=descricao, foreground="#7f8c8d").grid(
+                row=4, column=0, columnspan=2, sticky=tk.W, pady=(5, 0))
+        
+        self.barra = ttk.Progressbar(frame, mode="determinate", length=320)
+        self.barra.grid(row=5, column=0, columnspan=2, pady=(15, 5))
+        self.label_estado = ttk.Label(frame, text="Escolha o formato e o arquivo de destino.")
+        self.label_estado.grid(row=6, column=0, columnspan=2, sticky=tk.W)
+        
+        frame_botoes = ttk.Frame(frame)
+        frame_botoes.grid(row=7, column=0, columnspan=2, pady=(15, 0))
+        self.botao_exportar = ttk.Button(frame_botoes, text="Exportar...", command=self.exportar)
+        self.botao_exportar.grid(row=0, column=0, padx=5)
+        ttk.Button(frame_botoes, text="Fechar", command=self.fechar).grid(row=0, column=1, padx=5)
+    
+    def exportar(self):
+        """Pede o arquivo de destino e inicia a exportação numa thread"""
+        conjunto = self.CONJUNTOS[self.combo_conjunto.get()]
+        nome_formato = self.combo_formato.get()
+        formato = self.FORMATOS[nome_formato]
+        comprimir = self.comprimir.get()
+        extensao = exportacao.EXTENSOES[formato] + (".gz" if comprimir else "")
+        
+        caminho = filedialog.asksaveasfilename(
+            parent=self.janela,
+            title="Exportar para",
+            initialfile=f"biblioteca_{conjunto}{extensao}",
+            defaultextension=extensao,
+            filetypes=[(nome_formato, f"*{extensao}"), ("Todos os arquivos", "*.*")]
+        )
+        if not caminho:
+            return
+        
+        fila = queue.Queue()
+        
+        def exportar():
+            progresso = lambda lidos, total: fila.put(('progresso', lidos, total))
+            try:
+                fila.put(('pronto', exportacao.exportar(
+                    self.app.repositorio, conjunto, caminho, formato, comprimir,
+                    progresso=progresso, **self.filtros
+                )))
+            except Exception as e:
+                # Arquivo inacessível, formato recusado ou falha inesperada: a janela
+                # tem de sair de "Exportando..." em qualquer caso
+                fila.put(('erro', e))
+        
+        self.exportando = True
+        self.app.exportacoes += 1
+        self.botao_exportar.config(state="disabled")
+        self.barra.config(value=0, maximum=1)
+        self.label_estado.config(text="Exportando...")
+        threading.Thread(target=exportar, name="exportacao", daemon=True).start()
+        self.verificar_exportacao(fila)
+    
+    def verificar_exportacao(self, fila):
+        """Atualiza a barra de progresso e avisa quando a exportação termina"""
+        while True:
+            try:
+                mensagem = fila.get_nowait()
+            except queue.Empty:
+                break
+            
+            if mensagem[0] == 'progresso':
+                _, lidos, total = mensagem
+                self.barra.config(value=lidos, maximum=max(total, 1))
+                self.label_estado.config(text=f"Exportando... {lidos} de {total} registros")
+                continue
+            
+            self.exportando = False
+            self.app.exportacoes -= 1
+            self.botao_exportar.config(state="normal")
+            if mensagem[0] == 'pronto':
+                resumo = mensagem[1]
+                self.barra.config(value=1, maximum=1)
+                self.label_estado.config(
+                    text=f"✅ {resumo['linhas']} linhas exportadas em {resumo['segundos']:.1f} s"
+                )
+                messagebox.showinfo(
+                    "Exportação",
+                    f"{resumo['linhas']} linhas exportadas para:\n{resumo['arquivo']}\n\n"
+                    f"Tamanho: {resumo['bytes'] / 1024:.1f} KB",
+                    parent=self.janela
+                )
+            else:
+                self.label_estado.config(text="⚠️ Erro ao exportar")
+                messagebox.showerror("Erro", f"Erro ao exportar: {mensagem[1]}", parent=self.janela)
+            return
+        
+        self.janela.after(self.INTERVALO_PROGRESSO_MS, self.verificar_exportacao, fila)
+    
+    def fechar(self):
+        """Fecha a janela, exceto durante uma exportação"""
+        if self.exportando:
+            messagebox.showwarning("Atenção", "Aguarde o fim da exportação.", parent=self.janela)
+            return
+        self.janela.destroy()
+
+
 def main():
     """Função principal para iniciar a aplicação"""
     root = tk.Tk()
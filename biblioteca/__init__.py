@@ -0,0 +1,53 @@
+"""Camada de dados da Biblioteca ISCAT, utilizável sem interface gráfica"""
+
+from .busca import BuscaIncremental, IndiceBusca, normalizar, tokenizar
+from .colunas import ColunasEmprestimos
+from .datas import IndiceDatas, LinhaDoTempo, OrdemPorData, ordinal_hoje
+from .estatisticas import EstatisticasAcervo
+from .gravacao import GravadorAssincrono
+from .indices import IndiceEmprestimos
+from .multas import RegrasMulta, ResumoMultas, calcular_multas
+from .remoto import RepositorioRemoto
+from .registros import Emprestimo, Livro, StatusEmprestimo, TipoUsuario, Usuario
+from .repositorio import (
+    COLECOES,
+    ErroConflito,
+    ErroPersistencia,
+    Repositorio,
+    RepositorioJSON,
+    RepositorioSQLite,
+    abrir_repositorio,
+)
+from .vencimentos import FilaVencimentos
+
+__all__ = [
+    'BuscaIncremental',
+    'COLECOES',
+    'ColunasEmprestimos',
+    'Emprestimo',
+    'ErroConflito',
+    'ErroPersistencia',
+    'EstatisticasAcervo',
+    'FilaVencimentos',
+    'GravadorAssincrono',
+    'IndiceBusca',
+    'IndiceDatas',
+    'IndiceEmprestimos',
+    'LinhaDoTempo',
+    'Livro',
+    'OrdemPorData',
+    'RegrasMulta',
+    'Repositorio',
+    'RepositorioJSON',
+    'RepositorioRemoto',
+    'RepositorioSQLite',
+    'ResumoMultas',
+    'StatusEmprestimo',
+    'TipoUsuario',
+    'Usuario',
+    'abrir_repositorio',
+    'calcular_multas',
+    'normalizar',
+    'ordinal_hoje',
+    'tokenizar',
+]
@@ -0,0 +1,7 @@
+"""Permite executar a linha de comando com ``python -m biblioteca``"""
+
+import sys
+
+from .cli import main
+
+sys.exit(main())
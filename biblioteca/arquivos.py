@@ -0,0 +1,82 @@
+"""Utilitários de arquivos: bloqueio entre processos e substituição por renomeação"""
+
+import os
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+@contextmanager
+def bloquear_arquivo(caminho, esperar=True):
+    """Mantém um bloqueio exclusivo sobre ``caminho`` durante o bloco
+
+    O arquivo de bloqueio é criado se não existir e nunca é apagado,
+    para que todos os processos bloqueiem sempre o mesmo inode. Com
+    ``esperar=False`` levanta ``BlockingIOError`` em vez de esperar se
+    outro processo tiver o bloqueio.
+    """
+    with open(caminho, 'a+b') as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX if esperar else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            f.seek(0)
+            try:
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK if esperar else msvcrt.LK_NBLCK, 1)
+            except OSError as e:
+                if esperar:
+                    raise
+                raise BlockingIOError(f"{caminho} bloqueado por outro processo") from e
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+@contextmanager
+def escrever_atomicamente(caminho, modo='w'):
+    """Abre um temporário que só substitui ``caminho`` se o bloco terminar
+
+    O conteúdo vai para o disco (``fsync``) antes da renomeação, e a
+    renomeação é ela própria sincronizada: após uma queda de energia o
+    arquivo tem o conteúdo antigo ou o novo, nunca um meio-termo. Se o
+    bloco levantar uma exceção o temporário é apagado.
+    """
+    temporario = f"{caminho}.tmp"
+    codificacao = None if 'b' in modo else 'utf-8'
+    try:
+        with open(temporario, modo, encoding=codificacao) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporario, caminho)
+    except BaseException:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+        raise
+    sincronizar_diretorio(caminho)
+
+
+def substituir_arquivo(caminho, conteudo):
+    """Grava ``conteudo`` num temporário e renomeia sobre ``caminho``"""
+    with escrever_atomicamente(caminho) as f:
+        f.write(conteudo)
+
+
+def sincronizar_diretorio(caminho):
+    """Garante que criações, renomeações e remoções em ``caminho`` chegaram ao disco"""
+    if os.name == 'nt':
+        # No Windows não é possível abrir diretórios; o NTFS registra os metadados
+        return
+    diretorio = os.open(os.path.dirname(os.path.abspath(caminho)), os.O_RDONLY)
+    try:
+        os.fsync(diretorio)
+    finally:
+        os.close(diretorio)
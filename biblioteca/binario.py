@@ -0,0 +1,210 @@
+"""Snapshots binários das coleções, em colunas com strings internadas"""
+
+import json
+import struct
+import sys
+from array import array
+from itertools import accumulate
+
+from .arquivos import escrever_atomicamente
+
+
+MAGICO = b'BIBSNAP'
+VERSAO = 1
+
+# Tipos de coluna
+_STRINGS = b'S'
+_INTEIROS = b'I'
+_REAIS = b'F'
+_JSON = b'J'
+
+_MIN_INT64 = -(1 << 63)
+_MAX_INT64 = (1 << 63) - 1
+
+
+class ErroFormato(ValueError):
+    """Arquivo que não é um snapshot binário válido desta versão"""
+
+
+def salvar_binario(caminho, dados):
+    """Grava uma coleção (dicionário chave -> registro) em formato binário
+
+    Os registros são agrupados por esquema (os mesmos campos, na mesma
+    ordem) e a ordem original das chaves fica num vetor à parte. Cada
+    campo de um esquema vira uma coluna: IDs na tabela de strings, inteiros de 64 bits, reais, ou
+    JSON para valores mistos. Cada string distinta (chaves, 'ativo',
+    gêneros, tipos...) é guardada uma única vez.
+    """
+    strings = {}
+
+    def interno(texto):
+        indice = strings.get(texto)
+        if indice is None:
+            indice = strings[texto] = len(strings)
+        return indice
+
+    esquemas = {}
+    ordem = array('I')
+    for chave, registro in dados.items():
+        campos = tuple(registro)
+        bloco = esquemas.get(campos)
+        if bloco is None:
+            bloco = esquemas[campos] = (len(esquemas), [], [])
+        ordem.append(bloco[0])
+        bloco[1].append(chave)
+        bloco[2].append(registro)
+
+    corpo = bytearray()
+    corpo += struct.pack('<II', len(esquemas), len(ordem))
+    # Só é preciso guardar a ordem quando há mais de um esquema
+    if len(esquemas) > 1:
+        corpo += bytes_array('I', ordem)
+    for campos, (_, chaves, registros) in esquemas.items():
+        corpo += struct.pack('<IH', len(chaves), len(campos))
+        corpo += bytes_array('I', [interno(campo) for campo in campos])
+        corpo += bytes_array('I', [interno(str(chave)) for chave in chaves])
+        for campo in campos:
+            corpo += codificar_coluna([registro[campo] for registro in registros], interno)
+
+    textos = list(strings)
+    blob = ''.join(textos).encode('utf-8', 'surrogatepass')
+    with escrever_atomicamente(caminho, 'wb') as f:
+        f.write(MAGICO)
+        f.write(struct.pack('<HI', VERSAO, len(textos)))
+        f.write(bytes_array('I', [len(texto) for texto in textos]))
+        f.write(struct.pack('<Q', len(blob)))
+        f.write(blob)
+        f.write(corpo)
+
+
+def ler_binario(caminho):
+    """Lê uma coleção gravada por ``salvar_binario``"""
+    with open(caminho, 'rb') as f:
+        conteudo = f.read()
+    leitor = Leitor(conteudo)
+
+    if leitor.bytes(len(MAGICO)) != MAGICO:
+        raise ErroFormato(f"{caminho}: não é um snapshot binário")
+    versao, quantidade = leitor.struct('<HI')
+    if versao != VERSAO:
+        raise ErroFormato(f"{caminho}: versão {versao} não suportada (esperada {VERSAO})")
+
+    tamanhos = leitor.array('I', quantidade)
+    (tamanho_blob,) = leitor.struct('<Q')
+    # Decodificar tudo de uma vez e fatiar pelos tamanhos (em caracteres)
+    texto = leitor.bytes(tamanho_blob).decode('utf-8', 'surrogatepass')
+    fins = accumulate(tamanhos)
+    strings = [texto[fim - tamanho:fim] for fim, tamanho in zip(fins, tamanhos)]
+
+    total_esquemas, total = leitor.struct('<II')
+    ordem = leitor.array('I', total) if total_esquemas > 1 else None
+    blocos = []
+    for _ in range(total_esquemas):
+        registros, total_campos = leitor.struct('<IH')
+        campos = [strings[i] for i in leitor.array('I', total_campos)]
+        chaves = [strings[i] for i in leitor.array('I', registros)]
+        colunas = [decodificar_coluna(leitor, registros, strings) for _ in campos]
+        blocos.append(zip(chaves, _registros(campos, colunas, registros)))
+
+    if ordem is None:
+        dados = dict(blocos[0]) if blocos else {}
+    else:
+        # Intercalar os esquemas na ordem original das chaves
+        if any(indice >= total_esquemas for indice in ordem):
+            raise ErroFormato(f"{caminho}: índice de esquema inválido")
+        proximos = [bloco.__next__ for bloco in blocos]
+        dados = dict(proximos[indice]() for indice in ordem)
+        if len(dados) != total:
+            raise ErroFormato(f"{caminho}: chaves repetidas ou em falta")
+
+    if not leitor.terminou():
+        raise ErroFormato(f"{caminho}: dados após o fim do snapshot")
+    return dados
+
+
+def converter_json_para_binario(origem, destino):
+    """Converte um snapshot JSON no equivalente binário"""
+    with open(origem, 'r', encoding='utf-8') as f:
+        salvar_binario(destino, json.load(f))
+
+
+def converter_binario_para_json(origem, destino):
+    """Converte um snapshot binário de volta para JSON (mesma formatação do repositório)"""
+    dados = ler_binario(origem)
+    with escrever_atomicamente(destino) as f:
+        json.dump(dados, f, indent=4, ensure_ascii=False)
+
+
+def _registros(campos, colunas, quantidade):
+    if not colunas:
+        return ({} for _ in range(quantidade))
+    return (dict(zip(campos, linha)) for linha in zip(*colunas))
+
+
+def codificar_coluna(valores, interno):
+    """Bytes de uma coluna: o tipo, num byte, seguido dos valores"""
+    if all(type(valor) is str for valor in valores):
+        return _STRINGS + bytes_array('I', [interno(valor) for valor in valores])
+    if all(type(valor) is int and _MIN_INT64 <= valor <= _MAX_INT64 for valor in valores):
+        return _INTEIROS + bytes_array('q', valores)
+    if all(type(valor) is float for valor in valores):
+        return _REAIS + bytes_array('d', valores)
+    # Valores mistos, listas, None...: JSON, que o módulo json lê em C
+    texto = json.dumps(valores, ensure_ascii=False, separators=(',', ':'))
+    texto = texto.encode('utf-8', 'surrogatepass')
+    return _JSON + struct.pack('<Q', len(texto)) + texto
+
+
+def decodificar_coluna(leitor, registros, strings):
+    """Lista dos ``registros`` valores da coluna seguinte de ``leitor``"""
+    tipo = leitor.bytes(1)
+    if tipo == _STRINGS:
+        return [strings[i] for i in leitor.array('I', registros)]
+    if tipo == _INTEIROS:
+        return leitor.array('q', registros).tolist()
+    if tipo == _REAIS:
+        return leitor.array('d', registros).tolist()
+    if tipo == _JSON:
+        (tamanho,) = leitor.struct('<Q')
+        valores = json.loads(leitor.bytes(tamanho).decode('utf-8', 'surrogatepass'))
+        if len(valores) != registros:
+            raise ErroFormato("coluna com número de valores errado")
+        return valores
+    raise ErroFormato(f"tipo de coluna desconhecido: {tipo!r}")
+
+
+def bytes_array(tipo, valores):
+    """Valores de um tipo de ``array`` em bytes little-endian"""
+    dados = array(tipo, valores)
+    if sys.byteorder == 'big':
+        dados.byteswap()
+    return dados.tobytes()
+
+
+class Leitor:
+    """Cursor sobre o conteúdo do arquivo, com verificação de tamanho"""
+
+    def __init__(self, conteudo):
+        self.conteudo = memoryview(conteudo)
+        self.posicao = 0
+
+    def bytes(self, tamanho):
+        fim = self.posicao + tamanho
+        if fim > len(self.conteudo):
+            raise ErroFormato("snapshot truncado")
+        pedaco = self.conteudo[self.posicao:fim]
+        self.posicao = fim
+        return pedaco.tobytes()
+
+    def struct(self, formato):
+        return struct.unpack(formato, self.bytes(struct.calcsize(formato)))
+
+    def array(self, tipo, quantidade):
+        dados = array(tipo)
+        dados.frombytes(self.bytes(dados.itemsize * quantidade))
+        if sys.byteorder == 'big':
+            dados.byteswap()
+        return dados
+
+    def terminou(self):
+        return self.posicao == len(self.conteudo)
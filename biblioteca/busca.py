@@ -0,0 +1,268 @@
+"""Índice invertido para busca de livros"""
+
+import heapq
+import re
+import unicodedata
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from functools import lru_cache
+
+
+# Campo do livro -> (bit da máscara, peso na pontuação)
+CAMPOS_BUSCA = {
+    'título': (1, 3.0),
+    'autor': (2, 2.0),
+    'gênero': (4, 1.0),
+    'isbn': (8, 3.0),
+}
+
+# Campos com poucos valores distintos num catálogo
+_CAMPOS_REPETIDOS = ('autor', 'gênero')
+
+_MASCARA_TODOS = sum(bit for bit, _ in CAMPOS_BUSCA.values())
+
+# Peso de cada combinação de campos, somando os pesos dos bits presentes
+_PESOS = [
+    sum(peso for bit, peso in CAMPOS_BUSCA.values() if mascara & bit)
+    for mascara in range(_MASCARA_TODOS + 1)
+]
+
+_PALAVRA = re.compile(r'\w+')
+
+
+def normalizar(texto):
+    """Minúsculas e sem acentos: 'Informática' -> 'informatica'"""
+    texto = str(texto)
+    if texto.isascii():
+        return texto.lower()
+    decomposto = unicodedata.normalize('NFKD', texto)
+    return ''.join(c for c in decomposto if not unicodedata.combining(c)).casefold()
+
+
+@lru_cache(maxsize=65536)
+def _normalizar_palavra(palavra):
+    return normalizar(palavra)
+
+
+def tokenizar(texto):
+    """Divide um texto em palavras normalizadas"""
+    texto = str(texto)
+    if texto.isascii():
+        return _PALAVRA.findall(texto.lower())
+    # Palavras repetem-se muito num catálogo: normalizar cada uma só uma vez
+    palavras = _PALAVRA.findall(unicodedata.normalize('NFC', texto))
+    return [_normalizar_palavra(palavra) for palavra in palavras]
+
+
+class IndiceBusca:
+    """Índice invertido sobre título, autor, gênero e ISBN dos livros
+
+    Cada palavra aponta para os ISBNs onde aparece e em que campos. O
+    vocabulário é mantido ordenado para responder a consultas por
+    prefixo com ``bisect``. O índice é atualizado pelo repositório a
+    cada inclusão, edição ou exclusão de livro.
+    """
+
+    def __init__(self):
+        self.termos = {}
+        self.vocabulario = []
+        self._tokens_do_livro = {}
+        self._titulos = {}
+
+    def reconstruir(self, repositorio):
+        """Recria o índice a partir de todo o catálogo"""
+        self.termos.clear()
+        self._tokens_do_livro.clear()
+        self._titulos.clear()
+        # Autores e gêneros repetem-se muito: cada texto é dividido uma só vez
+        divididos = {}
+        for isbn, livro in repositorio.livros.items():
+            self._indexar(isbn, livro, ordenar=False, divididos=divididos)
+        self.vocabulario = sorted(self.termos)
+
+    def ao_alterar(self, colecao, chave, antigo, novo):
+        if colecao != 'livros':
+            return
+        if antigo is not None:
+            self._desindexar(chave)
+        if novo is not None:
+            self._indexar(chave, novo)
+
+    def buscar(self, consulta, campos=None, limite=None, candidatos=None):
+        """ISBNs que contêm todas as palavras da consulta, por relevância
+
+        Cada palavra da consulta casa com palavras do índice que comecem
+        por ela; correspondências exatas e em campos mais importantes
+        (título, ISBN) pontuam mais. ``campos`` restringe a busca a
+        alguns dos campos de ``CAMPOS_BUSCA``; ``candidatos`` restringe-a
+        a um conjunto de ISBNs já conhecido (ex.: resultado anterior).
+        """
+        tokens = set(tokenizar(consulta))
+        if not tokens:
+            return []
+
+        if campos is None:
+            mascara = _MASCARA_TODOS
+        else:
+            mascara = sum(CAMPOS_BUSCA[campo][0] for campo in campos)
+
+        if candidatos is not None:
+            pontuacao = {}
+            for isbn in candidatos:
+                total = self._pontuar(isbn, tokens, mascara)
+                if total:
+                    pontuacao[isbn] = total
+            return self._ordenar(pontuacao, limite)
+
+        pontuacao = None
+        # Palavras mais longas costumam ser mais seletivas
+        for token in sorted(tokens, key=len, reverse=True):
+            parciais = {}
+            for palavra in self._palavras_com_prefixo(token):
+                fator = 1.0 if palavra == token else 0.5
+                for isbn, campos_livro in self.termos[palavra].items():
+                    presentes = campos_livro & mascara
+                    if not presentes:
+                        continue
+                    if pontuacao is not None and isbn not in pontuacao:
+                        continue
+                    peso = fator * _PESOS[presentes]
+                    if peso > parciais.get(isbn, 0.0):
+                        parciais[isbn] = peso
+
+            if pontuacao is None:
+                pontuacao = parciais
+            else:
+                pontuacao = {isbn: pontuacao[isbn] + peso for isbn, peso in parciais.items()}
+            if not pontuacao:
+                return []
+
+        return self._ordenar(pontuacao, limite)
+
+    def _pontuar(self, isbn, tokens, mascara):
+        """Pontuação de um único livro para a consulta (0 se não casar)"""
+        palavras = self._tokens_do_livro.get(isbn, ())
+        total = 0.0
+        for token in tokens:
+            melhor = 0.0
+            for palavra in palavras:
+                if not palavra.startswith(token):
+                    continue
+                presentes = self.termos[palavra][isbn] & mascara
+                if presentes:
+                    peso = (1.0 if palavra == token else 0.5) * _PESOS[presentes]
+                    melhor = max(melhor, peso)
+            if not melhor:
+                return 0.0
+            total += melhor
+        return total
+
+    def _ordenar(self, pontuacao, limite):
+        titulos = self._titulos
+        chave = lambda item: (-item[1], titulos.get(item[0], ''))
+        if limite is not None and limite < len(pontuacao):
+            ordenados = heapq.nsmallest(limite, pontuacao.items(), key=chave)
+        else:
+            ordenados = sorted(pontuacao.items(), key=chave)
+        return [isbn for isbn, _ in ordenados]
+
+    def _palavras_com_prefixo(self, prefixo):
+        vocabulario = self.vocabulario
+        posicao = bisect_left(vocabulario, prefixo)
+        while posicao < len(vocabulario) and vocabulario[posicao].startswith(prefixo):
+            yield vocabulario[posicao]
+            posicao += 1
+
+    def _indexar(self, isbn, livro, ordenar=True, divididos=None):
+        tokens = {}
+        for campo, (bit, _) in CAMPOS_BUSCA.items():
+            valor = isbn if campo == 'isbn' else livro.get(campo, '')
+            if divididos is not None and campo in _CAMPOS_REPETIDOS and type(valor) is str:
+                palavras = divididos.get(valor)
+                if palavras is None:
+                    palavras = divididos[valor] = tokenizar(valor)
+            else:
+                palavras = tokenizar(valor)
+            if campo == 'título':
+                titulo = ' '.join(palavras)
+            for token in palavras:
+                tokens[token] = tokens.get(token, 0) | bit
+
+        for token, mascara in tokens.items():
+            postagens = self.termos.get(token)
+            if postagens is None:
+                postagens = self.termos[token] = {}
+                if ordenar:
+                    insort(self.vocabulario, token)
+            postagens[isbn] = mascara
+
+        self._tokens_do_livro[isbn] = tuple(tokens)
+        self._titulos[isbn] = titulo
+
+    def _desindexar(self, isbn):
+        for token in self._tokens_do_livro.pop(isbn, ()):
+            postagens = self.termos.get(token)
+            if postagens is None:
+                continue
+            postagens.pop(isbn, None)
+            if not postagens:
+                del self.termos[token]
+                posicao = bisect_left(self.vocabulario, token)
+                if posicao < len(self.vocabulario) and self.vocabulario[posicao] == token:
+                    del self.vocabulario[posicao]
+        self._titulos.pop(isbn, None)
+
+
+class BuscaIncremental:
+    """Busca para digitação contínua, com cache LRU e refinamento
+
+    Quando a nova consulta só acrescenta caracteres à anterior, os
+    resultados são um subconjunto dos anteriores: apenas esses livros
+    são reavaliados, sem voltar a percorrer o índice. O cache é
+    descartado sempre que a coleção de livros muda.
+    """
+
+    def __init__(self, repositorio, tamanho_cache=32):
+        self.repositorio = repositorio
+        self.tamanho_cache = tamanho_cache
+        self._cache = OrderedDict()
+        self._versao = None
+        self._ultima = None
+
+    def buscar(self, consulta, campos=None):
+        """ISBNs que casam com a consulta, por relevância"""
+        self._validar_cache()
+
+        chave = (' '.join(tokenizar(consulta)), tuple(campos) if campos else None)
+        if not chave[0]:
+            return []
+
+        resultado = self._cache.get(chave)
+        if resultado is not None:
+            self._cache.move_to_end(chave)
+        else:
+            candidatos = None
+            if self._ultima is not None:
+                consulta_anterior, campos_anteriores = self._ultima
+                if campos_anteriores == chave[1] and chave[0].startswith(consulta_anterior):
+                    candidatos = self._cache.get(self._ultima)
+
+            indice = self.repositorio.indice_busca
+            resultado = indice.buscar(consulta, campos, candidatos=candidatos)
+            self._cache[chave] = resultado
+            if len(self._cache) > self.tamanho_cache:
+                self._cache.popitem(last=False)
+
+        self._ultima = chave
+        return resultado
+
+    def limpar(self):
+        """Descarta o cache de resultados"""
+        self._cache.clear()
+        self._ultima = None
+
+    def _validar_cache(self):
+        versao = self.repositorio.versoes['livros']
+        if versao != self._versao:
+            self.limpar()
+            self._versao = versao
@@ -0,0 +1,451 @@
+"""Linha de comando da Biblioteca ISCAT, sem interface gráfica
+
+Uso, a partir da pasta dos dados:
+
+    python -m biblioteca [--json] [--diretorio DIR] COMANDO ...
+
+Comandos: ``livro``, ``usuario``, ``emprestar``, ``devolver``,
+``importar``, ``exportar``, ``lote``, ``relatorio`` e ``servir``;
+``python -m biblioteca COMANDO -h`` mostra os argumentos de cada um. As operações são as mesmas das
+telas (``biblioteca.operacoes``), sobre o mesmo repositório. Com
+``--json`` a saída é um documento JSON, para scripts.
+
+``importar`` lê arquivos CSV ou JSON lines em lotes, com as regras das
+telas (``biblioteca.importacao``); objetos JSON no formato dos arquivos
+de dados são gravados como estão. ``exportar`` escreve uma coleção ou a
+movimentação em CSV, JSON lines ou colunas (``biblioteca.exportacao``).
+
+``lote`` executa um arquivo de comandos, um por linha, com uma só carga
+dos dados: linhas vazias e começadas por ``#`` são ignoradas.
+
+``servir`` atende os outros balcões por HTTP/JSON (``biblioteca.servidor``)
+até Ctrl+C; com ``--backend remoto`` os comandos usam esse servidor.
+Com ``BIBLIOTECA_PARTILHADO=1`` os comandos podem correr ao mesmo tempo
+que as telas ou outros comandos sobre a mesma pasta de dados.
+"""
+
+import argparse
+import json
+import shlex
+import sys
+import time
+
+from . import exportacao, importacao, operacoes, relatorios, servidor
+from .gravacao import GravadorAssincrono
+from .multas import RegrasMulta
+from .remoto import RepositorioRemoto
+from .repositorio import COLECOES, ErroPersistencia, abrir_repositorio
+
+# Códigos de saída
+SUCESSO = 0
+FALHA = 1
+USO_INVALIDO = 2
+
+# Linhas rejeitadas listadas na saída em texto de ``importar``
+LIMITE_REJEITADAS_TEXTO = 20
+
+RELATORIOS = relatorios.NOMES
+
+
+class _ErroUso(Exception):
+    """Argumentos inválidos numa linha de ``lote``"""
+
+
+class _Analisador(argparse.ArgumentParser):
+    # Dentro de um lote, um erro de argumentos não pode encerrar o processo
+    def error(self, message):
+        raise _ErroUso(f"{self.prog}: {message}")
+
+
+def criar_analisador():
+    """ArgumentParser com os comandos da linha de comando"""
+    analisador = _Analisador(prog="biblioteca", description="Biblioteca ISCAT sem interface gráfica")
+    analisador.add_argument('--diretorio', default=".", help="pasta dos dados (padrão: a atual)")
+    analisador.add_argument('--backend', choices=('json', 'sqlite', 'remoto'),
+                            help="armazenamento (padrão: BIBLIOTECA_BACKEND ou json)")
+    analisador.add_argument('--json', action='store_true', help="saída em JSON")
+    comandos = analisador.add_subparsers(dest='comando', metavar='COMANDO', parser_class=_Analisador)
+    comandos.required = True
+
+    livro = comandos.add_parser('livro', help="cadastra um livro")
+    livro.add_argument('isbn')
+    livro.add_argument('titulo')
+    livro.add_argument('--autor', default='')
+    livro.add_argument('--genero', default='')
+    livro.add_argument('--quantidade', default=1)
+    livro.add_argument('--somar', action='store_true',
+                       help="se o ISBN já existir, somar a quantidade ao estoque")
+    livro.set_defaults(executar=_livro)
+
+    usuario = comandos.add_parser('usuario', help="cadastra um usuário")
+    usuario.add_argument('id')
+    usuario.add_argument('nome')
+    usuario.add_argument('--tipo', default='Aluno', choices=operacoes.TIPOS_USUARIO)
+    usuario.set_defaults(executar=_usuario)
+
+    emprestar = comandos.add_parser('emprestar', help="regista um empréstimo")
+    emprestar.add_argument('id_usuario')
+    emprestar.add_argument('isbn')
+    emprestar.add_argument('--prazo', default=operacoes.PRAZO_PADRAO, help="dias até a devolução")
+    emprestar.set_defaults(executar=_emprestar)
+
+    devolver = comandos.add_parser('devolver', help="regista a devolução de um empréstimo")
+    devolver.add_argument('emprestimo')
+    devolver.set_defaults(executar=_devolver)
+
+    importar = comandos.add_parser('importar', help="grava em massa os registros de um arquivo CSV, JSON lines ou JSON")
+    importar.add_argument('colecao', choices=COLECOES)
+    importar.add_argument('arquivo', help="CSV ou JSON lines com uma linha por registro, ou objeto JSON "
+                                          "chave -> registro como os arquivos de dados")
+    importar.add_argument('--formato', choices=importacao.FORMATOS + ('json',),
+                          help="formato do arquivo (padrão: pela extensão)")
+    importar.add_argument('--lote', type=int, default=importacao.TAMANHO_LOTE,
+                          help="linhas gravadas por transação")
+    importar.add_argument('--rejeitados', help="arquivo JSON lines para as linhas recusadas, com o motivo")
+    importar.set_defaults(executar=_importar)
+
+    exportar = comandos.add_parser('exportar', help="escreve uma coleção ou a movimentação em CSV, JSON lines ou colunas")
+    exportar.add_argument('conjunto', choices=exportacao.CONJUNTOS)
+    exportar.add_argument('arquivo', help="arquivo de destino; terminado em .gz sai comprimido")
+    exportar.add_argument('--formato', choices=exportacao.FORMATOS,
+                          help="formato do arquivo (padrão: pela extensão)")
+    exportar.add_argument('--gzip', action='store_true', help="comprimir com gzip")
+    exportar.add_argument('--genero', help="livros: só deste gênero")
+    exportar.add_argument('--disponiveis', choices=('sim', 'nao'),
+                          help="livros: só com (sim) ou sem (nao) unidades disponíveis")
+    exportar.add_argument('--dias', type=int, default=None,
+                          help="movimentação: últimos N dias (padrão: todo o histórico)")
+    exportar.set_defaults(executar=_exportar)
+
+    lote = comandos.add_parser('lote', help="executa um arquivo de comandos, um por linha")
+    lote.add_argument('arquivo', help="arquivo de comandos ('-' para a entrada padrão)")
+    lote.add_argument('--parar', action='store_true', help="parar no primeiro erro")
+    lote.set_defaults(executar=_lote)
+
+    servir = comandos.add_parser('servir', help="atende os balcões por HTTP/JSON até Ctrl+C")
+    servir.add_argument('--endereco', default=servidor.ENDERECO_PADRAO,
+                        help="endereço onde escutar (padrão: só esta máquina)")
+    servir.add_argument('--porta', type=int, default=servidor.PORTA_PADRAO,
+                        help="porta (0: escolhida pelo sistema)")
+    servir.add_argument('--registrar', action='store_true', help="escrever cada pedido em stderr")
+    servir.set_defaults(executar=_servir)
+
+    relatorio = comandos.add_parser('relatorio', help="imprime um relatório")
+    relatorio.add_argument('nome', choices=RELATORIOS)
+    relatorio.add_argument('--dias', type=int, default=None,
+                           help="movimentação: últimos N dias (padrão: todo o histórico)")
+    relatorio.add_argument('--limite', type=int, default=10,
+                           help="mais-emprestados e multas: quantidade de linhas")
+    relatorio.set_defaults(executar=_relatorio)
+    return analisador
+
+
+def main(argumentos=None, saida=None):
+    """Executa a linha de comando; devolve o código de saída"""
+    saida = saida or sys.stdout
+    analisador = criar_analisador()
+    try:
+        opcoes = analisador.parse_args(argumentos)
+    except _ErroUso as e:
+        print(e, file=sys.stderr)
+        return USO_INVALIDO
+
+    try:
+        repositorio = abrir_repositorio(opcoes.backend, opcoes.diretorio)
+    except ErroPersistencia as e:
+        print(f"Não foi possível carregar os dados: {e}", file=sys.stderr)
+        return FALHA
+
+    # Mesmo gravador da interface: lotes grandes não esperam cada escrita
+    if repositorio.GRAVACAO_LOCAL:
+        repositorio.gravador = GravadorAssincrono(repositorio)
+    contexto = _Contexto(repositorio, analisador, RegrasMulta.do_ambiente())
+    try:
+        codigo, resultado = _executar(contexto, opcoes)
+    finally:
+        salvo = _fechar(repositorio)
+    if not salvo:
+        return FALHA
+
+    if opcoes.json:
+        json.dump(resultado, saida, ensure_ascii=False, indent=2, default=str)
+        saida.write("\n")
+    elif codigo != SUCESSO:
+        print(f"Erro: {resultado['erro']}", file=sys.stderr)
+    else:
+        saida.write(_texto(opcoes, resultado))
+    if opcoes.comando == 'lote' and codigo == SUCESSO and resultado['erros']:
+        codigo = FALHA
+    if opcoes.comando == 'importar' and codigo == SUCESSO and resultado.get('rejeitadas'):
+        codigo = FALHA
+    return codigo
+
+
+def _fechar(repositorio):
+    """Grava o que faltar; False (com a mensagem em stderr) se falhar"""
+    try:
+        repositorio.fechar()
+    except ErroPersistencia as e:
+        print(f"Não foi possível salvar os dados: {e}", file=sys.stderr)
+        return False
+    return True
+
+
+class _Contexto:
+    def __init__(self, repositorio, analisador, regras):
+        self.repositorio = repositorio
+        self.analisador = analisador
+        self.regras = regras
+
+
+def _executar(contexto, opcoes):
+    """Par (código de saída, resultado) de um comando"""
+    try:
+        return SUCESSO, opcoes.executar(contexto, opcoes)
+    except operacoes.ErroOperacao as e:
+        return FALHA, {'erro': str(e)}
+    except ErroPersistencia as e:
+        return FALHA, {'erro': f"Não foi possível salvar! {e}"}
+
+
+def _livro(contexto, opcoes):
+    livro = operacoes.cadastrar_livro(
+        contexto.repositorio, opcoes.isbn, opcoes.titulo, opcoes.autor, opcoes.genero,
+        opcoes.quantidade, somar=opcoes.somar,
+    )
+    return {'isbn': opcoes.isbn.strip(), **livro}
+
+
+def _usuario(contexto, opcoes):
+    usuario = operacoes.cadastrar_usuario(contexto.repositorio, opcoes.id, opcoes.nome, opcoes.tipo)
+    return {'id': opcoes.id.strip(), **usuario}
+
+
+def _emprestar(contexto, opcoes):
+    emp_id, emprestimo = operacoes.emprestar(
+        contexto.repositorio, opcoes.id_usuario, opcoes.isbn, opcoes.prazo
+    )
+    return {'emprestimo': emp_id, **emprestimo}
+
+
+def _devolver(contexto, opcoes):
+    multa = operacoes.devolver(contexto.repositorio, opcoes.emprestimo, contexto.regras)
+    return {'emprestimo': opcoes.emprestimo, 'multa': multa}
+
+
+def _importar(contexto, opcoes):
+    formato = opcoes.formato
+    if formato is None and opcoes.arquivo.lower().endswith('.json'):
+        formato = 'json'
+    if formato == 'json':
+        return _importar_json(contexto, opcoes)
+    if opcoes.lote <= 0:
+        raise operacoes.ErroOperacao("--lote deve ser maior que zero")
+    relatorio = importacao.importar(
+        contexto.repositorio, opcoes.colecao, opcoes.arquivo, formato,
+        tamanho_lote=opcoes.lote, rejeitados=opcoes.rejeitados
+    )
+    return relatorio.como_dict()
+
+
+def _importar_json(contexto, opcoes):
+    """Grava os registros de um objeto JSON chave -> registro, substituindo os existentes"""
+    inicio = time.perf_counter()
+    try:
+        with open(opcoes.arquivo, 'r', encoding='utf-8') as f:
+            dados = json.load(f)
+    except (OSError, ValueError) as e:
+        raise operacoes.ErroOperacao(f"Não foi possível ler {opcoes.arquivo}: {e}") from None
+    if not isinstance(dados, dict) or not all(isinstance(registro, dict) for registro in dados.values()):
+        raise operacoes.ErroOperacao(f"{opcoes.arquivo}: esperado um objeto chave -> registro")
+
+    repositorio = contexto.repositorio
+    existentes = repositorio.colecao(opcoes.colecao)
+    novos = sum(1 for chave in dados if chave not in existentes)
+    with repositorio.em_massa():
+        repositorio.gravar_varios(opcoes.colecao, dados.items())
+    return {
+        'colecao': opcoes.colecao,
+        'gravados': len(dados),
+        'novos': novos,
+        'substituidos': len(dados) - novos,
+        'segundos': round(time.perf_counter() - inicio, 3),
+    }
+
+
+def _exportar(contexto, opcoes):
+    disponiveis = {'sim': True, 'nao': False}.get(opcoes.disponiveis)
+    return exportacao.exportar(
+        contexto.repositorio, opcoes.conjunto, opcoes.arquivo, opcoes.formato, opcoes.gzip or None,
+        genero=opcoes.genero, disponiveis=disponiveis, limite_dias=opcoes.dias
+    )
+
+
+def _servir(contexto, opcoes):
+    if isinstance(contexto.repositorio, RepositorioRemoto):
+        raise operacoes.ErroOperacao("servir precisa dos dados locais (backend json ou sqlite)")
+    inicio = time.perf_counter()
+    # Em stderr: a saída padrão fica só com o resultado
+    avisar = lambda url: print(f"Servindo em {url} (Ctrl+C para terminar)", file=sys.stderr, flush=True)
+    pedidos = servidor.servir(
+        contexto.repositorio, opcoes.endereco, opcoes.porta, contexto.regras,
+        ao_iniciar=avisar, registrar_pedidos=opcoes.registrar
+    )
+    return {'pedidos': pedidos, 'segundos': round(time.perf_counter() - inicio, 3)}
+
+
+def _lote(contexto, opcoes):
+    if opcoes.arquivo == '-':
+        linhas = sys.stdin.read().splitlines()
+    else:
+        try:
+            with open(opcoes.arquivo, 'r', encoding='utf-8') as f:
+                linhas = f.read().splitlines()
+        except OSError as e:
+            raise operacoes.ErroOperacao(f"Não foi possível ler {opcoes.arquivo}: {e}") from None
+
+    resultados = []
+    erros = 0
+    for numero, linha in enumerate(linhas, 1):
+        linha = linha.strip()
+        if not linha or linha.startswith('#'):
+            continue
+        try:
+            argumentos = contexto.analisador.parse_args(shlex.split(linha))
+            if argumentos.comando in ('lote', 'servir'):
+                raise _ErroUso(f"{argumentos.comando} não pode ser usado dentro de um lote")
+        except (_ErroUso, ValueError) as e:
+            codigo, resultado = USO_INVALIDO, {'erro': str(e)}
+        except SystemExit:
+            # -h numa linha do lote
+            codigo, resultado = USO_INVALIDO, {'erro': "ajuda não disponível dentro de um lote"}
+        else:
+            codigo, resultado = _executar(contexto, argumentos)
+            if not isinstance(resultado, dict):
+                resultado = {'resultado': resultado}
+        resultados.append({'linha': numero, 'comando': linha, 'ok': codigo == SUCESSO, **resultado})
+        if codigo != SUCESSO:
+            erros += 1
+            if opcoes.parar:
+                break
+    return {'executados': len(resultados), 'erros': erros, 'resultados': resultados}
+
+
+def _relatorio(contexto, opcoes):
+    return relatorios.gerar(contexto.repositorio, opcoes.nome, contexto.regras, opcoes.dias, opcoes.limite)
+
+
+def _texto(opcoes, resultado):
+    """Saída legível de um comando"""
+    comando = opcoes.comando
+    if comando == 'livro':
+        return f"Livro {resultado['isbn']}: {resultado['título']} ({resultado['quantidade']} unidades)\n"
+    if comando == 'usuario':
+        return f"Usuário {resultado['id']}: {resultado['nome']} ({resultado['tipo']})\n"
+    if comando == 'emprestar':
+        return (f"Empréstimo {resultado['emprestimo']} realizado; "
+                f"devolução até {resultado['data_devolucao_prevista']}\n")
+    if comando == 'devolver':
+        return f"Devolução de {resultado['emprestimo']} registrada; multa: {resultado['multa']:.2f} Kz\n"
+    if comando == 'importar' and 'substituidos' in resultado:
+        return (f"{resultado['gravados']} registros gravados em {resultado['colecao']} "
+                f"({resultado['novos']} novos, {resultado['substituidos']} substituídos) "
+                f"em {resultado['segundos']:.2f} s\n")
+    if comando == 'importar':
+        linhas = [
+            f"{resultado['lidas']} linhas lidas, {resultado['gravados']} gravadas em {resultado['colecao']} "
+            f"({resultado['novos']} novos" + (
+                f", {resultado['somados']} somados ao estoque" if resultado['colecao'] == 'livros' else ""
+            ) + f"), {resultado['rejeitadas']} rejeitadas",
+            f"{resultado['segundos']:.2f} s, {resultado['linhas_por_segundo']} linhas por segundo",
+        ]
+        linhas += [
+            f"{item['linha']:>8}: {item['motivo']}" for item in resultado['rejeicoes'][:LIMITE_REJEITADAS_TEXTO]
+        ]
+        if resultado['rejeitadas'] > LIMITE_REJEITADAS_TEXTO:
+            linhas.append(f"... e mais {resultado['rejeitadas'] - LIMITE_REJEITADAS_TEXTO} linhas rejeitadas")
+        return "\n".join(linhas) + "\n"
+    if comando == 'exportar':
+        return (f"{resultado['linhas']} linhas de {resultado['conjunto']} exportadas para {resultado['arquivo']} "
+                f"({resultado['formato']}{', gzip' if resultado['comprimido'] else ''}, "
+                f"{resultado['bytes']} bytes) em {resultado['segundos']:.2f} s\n")
+    if comando == 'servir':
+        return f"Servidor encerrado após {resultado['pedidos']} pedidos em {resultado['segundos']:.0f} s\n"
+    if comando == 'lote':
+        linhas = [
+            f"{item['linha']:>5}: {'ok' if item['ok'] else 'ERRO ' + item['erro']}"
+            for item in resultado['resultados']
+        ]
+        linhas.append(f"{resultado['executados']} comandos, {resultado['erros']} com erro")
+        return "\n".join(linhas) + "\n"
+    return _texto_relatorio(opcoes.nome, resultado)
+
+
+def _texto_relatorio(nome, dados):
+    linhas = []
+    if nome == 'completo':
+        livros, usuarios, emprestimos = dados['livros'], dados['usuarios'], dados['emprestimos']
+        linhas += [
+            "ACERVO",
+            f"  Total de Livros: {livros['unidades']}",
+            f"  Títulos Diferentes: {livros['titulos']}",
+            "USUÁRIOS",
+            f"  Total de Usuários: {usuarios['total']}",
+        ]
+        linhas += [f"  {tipo}: {quantidade}" for tipo, quantidade in usuarios['por_tipo'].items()]
+        linhas += [
+            "EMPRÉSTIMOS",
+            f"  Total de Empréstimos: {emprestimos['total']}",
+            f"  Empréstimos Ativos: {emprestimos['ativos']}",
+            f"  Empréstimos Devolvidos: {emprestimos['devolvidos']}",
+            f"  Taxa de Devolução: {emprestimos['taxa_devolucao']:.1f}%",
+        ]
+    elif nome == 'acervo':
+        linhas += [
+            f"Total de Livros: {dados['unidades']} unidades",
+            f"Títulos Diferentes: {dados['titulos']}",
+            f"Livros Emprestados: {dados['emprestados']}",
+            "Distribuição por gênero:",
+        ]
+        linhas += [f"  {genero}: {quantidade}" for genero, quantidade in dados['generos'].items()]
+    elif nome == 'mais-emprestados':
+        linhas += [
+            f"{i:2d}. {livro['isbn']} | {livro['título'][:30]:30} | {livro['autor'][:20]:20} | {livro['emprestimos']}"
+            for i, livro in enumerate(dados, 1)
+        ]
+    elif nome == 'usuarios-ativos':
+        linhas += [
+            f"{usuario['id']} | {usuario['nome'][:30]:30} | {usuario['tipo']:12} | {usuario['emprestimos_ativos']}"
+            for usuario in dados
+        ]
+    elif nome in ('emprestados', 'atrasos'):
+        for emprestimo in dados:
+            linha = (f"{emprestimo['emprestimo']} | {emprestimo['usuario'][:25]:25} | "
+                     f"{emprestimo['livro'][:30]:30} | {emprestimo['data_emprestimo']} -> "
+                     f"{emprestimo['data_devolucao_prevista']}")
+            if nome == 'atrasos':
+                linha += f" | {emprestimo['dias_atraso']} dias | {emprestimo['multa']:.2f} Kz"
+            linhas.append(linha)
+    elif nome == 'multas':
+        linhas += [
+            f"Data: {dados['data']}",
+            f"Empréstimos em atraso: {dados['atrasados']}",
+            f"Total a receber: {dados['total']:.2f} Kz",
+            "Por tempo de atraso:",
+        ]
+        linhas += [
+            f"  {faixa}: {valores['emprestimos']} empréstimos, {valores['total']:.2f} Kz"
+            for faixa, valores in dados['faixas'].items()
+        ]
+        linhas.append("Maiores devedores:")
+        linhas += [
+            f"  {devedor['id']} | {devedor['nome'][:30]:30} | {devedor['total']:.2f} Kz"
+            for devedor in dados['devedores']
+        ]
+    else:
+        linhas += [
+            f"{evento['data']} | {evento['tipo']:10} | {evento['emprestimo']} | "
+            f"{evento['id_usuario']} | {evento['isbn']}"
+            for evento in dados
+        ]
+    return "".join(linha + "\n" for linha in linhas)
@@ -0,0 +1,260 @@
+"""Espelho colunar dos empréstimos para os relatórios"""
+
+from array import array
+from collections import Counter
+from itertools import compress
+
+from .registros import Emprestimo, StatusEmprestimo, ordinal_data, texto_data
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+# Códigos da coluna ``status``
+ATIVO = 0
+DEVOLVIDO = 1
+OUTRO = 2
+# Linha de um empréstimo removido, reaproveitada na compactação
+LIVRE = 255
+
+_CODIGOS_STATUS = {'ativo': ATIVO, 'devolvido': DEVOLVIDO}
+
+# Tabelas para bytes.translate: código de status -> 1 se a linha entra na máscara
+# (a dos ativos também serve ao cálculo de multas)
+MASCARA_ATIVOS = bytes(1 if codigo == ATIVO else 0 for codigo in range(256))
+_MASCARA_VALIDAS = bytes(0 if codigo == LIVRE else 1 for codigo in range(256))
+
+# Linhas livres toleradas antes de compactar as colunas
+_MINIMO_COMPACTACAO = 1024
+
+
+class ColunasEmprestimos:
+    """Empréstimos em colunas paralelas (``array``), uma linha por empréstimo
+
+    Usuário e livro são códigos inteiros (posição em ``usuarios`` e
+    ``livros``), as datas são ordinais (0 quando ausentes ou inválidas) e
+    o status é um byte. Os relatórios viram contagens e máscaras sobre as
+    colunas, feitas em C (``Counter``, ``itertools.compress``,
+    ``bytes.translate``) ou com NumPy, se estiver instalado, em vez de
+    percorrer os registros em Python.
+
+    É mantido pelo repositório como observador; remover um empréstimo só
+    marca a linha como livre, para as outras não mudarem de posição, e as
+    colunas são compactadas quando metade das linhas está livre.
+    """
+
+    def __init__(self):
+        self._limpar()
+
+    def reconstruir(self, repositorio):
+        """Recria as colunas a partir de todos os empréstimos"""
+        self._limpar()
+        emprestimos = repositorio.emprestimos
+        if not emprestimos:
+            return
+        self.ids = list(emprestimos)
+        self.linhas = {emp_id: linha for linha, emp_id in enumerate(self.ids)}
+        usuarios, livros, inicios, previstas, devolucoes, status = _extrair(list(emprestimos.values()))
+        # Código = ordem de aparição; o dicionário guarda essa ordem
+        codigos = self._codigos_usuario
+        self.usuario = array('q', [codigos.setdefault(valor, len(codigos)) for valor in usuarios])
+        self.usuarios = list(codigos)
+        codigos = self._codigos_livro
+        self.livro = array('q', [codigos.setdefault(valor, len(codigos)) for valor in livros])
+        self.livros = list(codigos)
+        self.data_emprestimo = array('q', inicios)
+        self.data_prevista = array('q', previstas)
+        self.data_devolucao = array('q', devolucoes)
+        self.status = bytearray(status)
+
+    def ao_alterar(self, colecao, chave, antigo, novo):
+        if colecao != 'emprestimos':
+            return
+        linha = self.linhas.get(chave)
+        if novo is None:
+            if linha is not None:
+                self._liberar(chave, linha)
+        elif linha is None:
+            self._acrescentar(chave, novo)
+        else:
+            self._preencher(linha, novo)
+
+    def __len__(self):
+        return len(self.linhas)
+
+    def contar_status(self):
+        """Quantidade de empréstimos ativos e devolvidos"""
+        return {
+            'ativo': self.status.count(ATIVO),
+            'devolvido': self.status.count(DEVOLVIDO),
+        }
+
+    def mais_emprestados(self, limite=10):
+        """Pares (isbn, empréstimos) dos livros mais emprestados"""
+        contagem = self._contar(self.livro, _MASCARA_VALIDAS)
+        return [(self.livros[codigo], total) for codigo, total in contagem.most_common(limite)]
+
+    def ativos_por_usuario(self):
+        """Dicionário id_usuario -> empréstimos ativos, na ordem dos empréstimos"""
+        contagem = self._contar(self.usuario, MASCARA_ATIVOS)
+        return {self.usuarios[codigo]: total for codigo, total in contagem.items()}
+
+    def linhas_desde(self, ordinal):
+        """Linhas dos empréstimos feitos a partir da data ``ordinal``"""
+        if numpy is not None:
+            datas = numpy.frombuffer(self.data_emprestimo, dtype=numpy.int64)
+            return numpy.flatnonzero(datas >= ordinal).tolist()
+        # Linhas livres têm data 0 e nunca entram
+        return [linha for linha, data in enumerate(self.data_emprestimo) if data >= ordinal]
+
+    def id_usuario(self, linha):
+        return self.usuarios[self.usuario[linha]]
+
+    def isbn(self, linha):
+        return self.livros[self.livro[linha]]
+
+    def datas(self, linha):
+        """Datas (texto 'AAAA-MM-DD' ou '') de empréstimo, prevista e de devolução"""
+        return tuple(
+            texto_data(coluna[linha]) if coluna[linha] else ''
+            for coluna in (self.data_emprestimo, self.data_prevista, self.data_devolucao)
+        )
+
+    def _contar(self, coluna, tabela):
+        """Counter código -> linhas, só das linhas marcadas em ``tabela``"""
+        mascara = self.status.translate(tabela)
+        if numpy is not None:
+            codigos = numpy.frombuffer(coluna, dtype=numpy.int64)
+            selecionadas = numpy.frombuffer(mascara, dtype=numpy.uint8).astype(bool)
+            totais = numpy.bincount(codigos[selecionadas])
+            presentes = numpy.flatnonzero(totais)
+            return Counter(dict(zip(presentes.tolist(), totais[presentes].tolist())))
+        return Counter(compress(coluna, mascara))
+
+    def _limpar(self):
+        self.ids = []
+        self.linhas = {}
+        self.usuario = array('q')
+        self.livro = array('q')
+        self.data_emprestimo = array('q')
+        self.data_prevista = array('q')
+        self.data_devolucao = array('q')
+        self.status = bytearray()
+        self.usuarios = []
+        self.livros = []
+        self._codigos_usuario = {}
+        self._codigos_livro = {}
+        self._livres = 0
+
+    def _acrescentar(self, emp_id, emprestimo):
+        linha = len(self.ids)
+        self.ids.append(emp_id)
+        self.linhas[emp_id] = linha
+        for coluna in (self.usuario, self.livro, self.data_emprestimo,
+                       self.data_prevista, self.data_devolucao):
+            coluna.append(0)
+        self.status.append(OUTRO)
+        self._preencher(linha, emprestimo)
+
+    def _preencher(self, linha, emprestimo):
+        id_usuario, isbn, inicio, prevista, devolucao, status = _valores(emprestimo)
+        self.usuario[linha] = _codigo(self._codigos_usuario, self.usuarios, id_usuario)
+        self.livro[linha] = _codigo(self._codigos_livro, self.livros, isbn)
+        self.data_emprestimo[linha] = inicio
+        self.data_prevista[linha] = prevista
+        self.data_devolucao[linha] = devolucao
+        self.status[linha] = status
+
+    def _liberar(self, emp_id, linha):
+        del self.linhas[emp_id]
+        self.ids[linha] = None
+        self.data_emprestimo[linha] = 0
+        self.data_prevista[linha] = 0
+        self.data_devolucao[linha] = 0
+        self.status[linha] = LIVRE
+        self._livres += 1
+        if self._livres >= _MINIMO_COMPACTACAO and self._livres * 2 >= len(self.ids):
+            self._compactar()
+
+    def _compactar(self):
+        """Descarta as linhas livres, mantendo a ordem das restantes"""
+        mascara = self.status.translate(_MASCARA_VALIDAS)
+        for nome in ('usuario', 'livro', 'data_emprestimo', 'data_prevista', 'data_devolucao'):
+            setattr(self, nome, array('q', compress(getattr(self, nome), mascara)))
+        self.status = bytearray(compress(self.status, mascara))
+        self.ids = list(compress(self.ids, mascara))
+        self.linhas = {emp_id: linha for linha, emp_id in enumerate(self.ids)}
+        self._livres = 0
+
+
+def _codigo(codigos, valores, valor):
+    codigo = codigos.get(valor)
+    if codigo is None:
+        codigo = codigos[valor] = len(valores)
+        valores.append(valor)
+    return codigo
+
+
+def _extrair(registros):
+    """Valores das colunas de todos os empréstimos, uma coluna de cada vez
+
+    Com registros compactos os atributos já guardam ordinais e membros da
+    enumeração: cada coluna sai de uma compreensão sobre os atributos, o
+    que na carga é várias vezes mais rápido do que montar linha a linha.
+    """
+    if not all(type(emprestimo) is Emprestimo for emprestimo in registros):
+        return tuple(zip(*map(_valores, registros)))
+
+    def coluna(atributo, ausente):
+        return [getattr(emprestimo, atributo, ausente) for emprestimo in registros]
+
+    def datas(atributo):
+        valores = coluna(atributo, 0)
+        if all(type(valor) is int for valor in valores):
+            return valores
+        # Datas em formato desconhecido ficaram como texto
+        return [valor if type(valor) is int else 0 for valor in valores]
+
+    ativo, devolvido = StatusEmprestimo.ATIVO, StatusEmprestimo.DEVOLVIDO
+    return (
+        [str(valor) for valor in coluna('id_usuario', '')],
+        [str(valor) for valor in coluna('isbn_livro', '')],
+        datas('data_emprestimo'),
+        datas('data_devolucao_prevista'),
+        datas('data_devolucao_real'),
+        [ATIVO if valor is ativo else DEVOLVIDO if valor is devolvido else OUTRO
+         for valor in coluna('status', None)],
+    )
+
+
+def _valores(emprestimo):
+    """Valores das colunas de um empréstimo"""
+    if type(emprestimo) is Emprestimo:
+        inicio = getattr(emprestimo, 'data_emprestimo', 0)
+        prevista = getattr(emprestimo, 'data_devolucao_prevista', 0)
+        devolucao = getattr(emprestimo, 'data_devolucao_real', 0)
+        status = getattr(emprestimo, 'status', None)
+        return (
+            str(getattr(emprestimo, 'id_usuario', '')),
+            str(getattr(emprestimo, 'isbn_livro', '')),
+            inicio if type(inicio) is int else 0,
+            prevista if type(prevista) is int else 0,
+            devolucao if type(devolucao) is int else 0,
+            ATIVO if status is StatusEmprestimo.ATIVO
+            else DEVOLVIDO if status is StatusEmprestimo.DEVOLVIDO else OUTRO,
+        )
+    return (
+        str(emprestimo.get('id_usuario', '')),
+        str(emprestimo.get('isbn_livro', '')),
+        _ordinal(emprestimo.get('data_emprestimo')),
+        _ordinal(emprestimo.get('data_devolucao_prevista')),
+        _ordinal(emprestimo.get('data_devolucao_real')),
+        _CODIGOS_STATUS.get(emprestimo.get('status'), OUTRO),
+    )
+
+
+def _ordinal(valor):
+    ordinal = ordinal_data(valor)
+    return ordinal if type(ordinal) is int else 0
@@ -0,0 +1,281 @@
+"""Datas como ordinais e linha do tempo dos empréstimos e devoluções"""
+
+from array import array
+from bisect import bisect_left, bisect_right
+from collections.abc import Sequence
+from datetime import date
+from itertools import compress
+from operator import itemgetter
+
+from .registros import Emprestimo, Registro, StatusEmprestimo, ordinal_data
+
+
+# Tipos de evento da linha do tempo
+EMPRESTIMO = 0
+DEVOLUCAO = 1
+
+# Tabelas para bytes.translate: tipo -> 1 se o evento é desse tipo
+_MASCARAS = {
+    tipo: bytes(1 if codigo == tipo else 0 for codigo in range(256))
+    for tipo in (EMPRESTIMO, DEVOLUCAO)
+}
+
+
+def ordinal_hoje():
+    """Ordinal da data de hoje"""
+    return date.today().toordinal()
+
+
+def ordinal_do_registro(registro, chave):
+    """Data ``chave`` de um registro como ordinal, ou None se ausente ou inválida
+
+    Nos registros compactos o ordinal já está no atributo; dicionários
+    passam pelo cache de ``ordinal_data``.
+    """
+    if isinstance(registro, Registro):
+        campo = registro._por_chave.get(chave)
+        valor = getattr(registro, campo[0], None) if campo is not None else registro.get(chave)
+    else:
+        valor = registro.get(chave)
+    valor = ordinal_data(valor)
+    return valor if type(valor) is int else None
+
+
+class OrdemPorData:
+    """Chaves ordenadas por data, para consultas por intervalo com bisect
+
+    As datas ficam num ``array`` ordenado e as chaves numa lista paralela;
+    chaves com a mesma data ficam pela ordem de chegada. Acrescentar na
+    data mais recente (o caso comum: empréstimos e devoluções de hoje) é
+    O(1); noutras posições custa um deslocamento de memória.
+    """
+
+    def __init__(self):
+        self.datas = array('q')
+        self.chaves = []
+
+    def definir(self, pares):
+        """Substitui o conteúdo por pares (ordinal, chave), em qualquer ordem"""
+        ordenados = sorted(pares, key=itemgetter(0))
+        self.datas = array('q', [ordinal for ordinal, _ in ordenados])
+        self.chaves = [chave for _, chave in ordenados]
+
+    def inserir(self, ordinal, chave):
+        posicao = bisect_right(self.datas, ordinal)
+        self.datas.insert(posicao, ordinal)
+        self.chaves.insert(posicao, chave)
+
+    def remover(self, ordinal, chave):
+        inicio = bisect_left(self.datas, ordinal)
+        fim = bisect_right(self.datas, ordinal, inicio)
+        try:
+            posicao = self.chaves.index(chave, inicio, fim)
+        except ValueError:
+            return
+        del self.datas[posicao]
+        del self.chaves[posicao]
+
+    def posicoes(self, inicio=None, fim=None):
+        """Intervalo [primeira, última + 1) das datas entre ``inicio`` e ``fim``, inclusive"""
+        primeira = 0 if inicio is None else bisect_left(self.datas, inicio)
+        ultima = len(self.datas) if fim is None else bisect_right(self.datas, fim, primeira)
+        return primeira, ultima
+
+    def entre(self, inicio=None, fim=None):
+        """Chaves com data entre ``inicio`` e ``fim`` (ordinais, inclusive), da mais antiga à mais recente"""
+        primeira, ultima = self.posicoes(inicio, fim)
+        return self.chaves[primeira:ultima]
+
+    def contar(self, inicio=None, fim=None):
+        """Quantidade de chaves com data entre ``inicio`` e ``fim``"""
+        primeira, ultima = self.posicoes(inicio, fim)
+        return ultima - primeira
+
+    def __len__(self):
+        return len(self.chaves)
+
+
+class LinhaDoTempo(OrdemPorData):
+    """Eventos de empréstimo e de devolução ordenados por data
+
+    Como ``OrdemPorData``, com o tipo de cada evento (``EMPRESTIMO`` ou
+    ``DEVOLUCAO``) num ``bytearray`` paralelo: as chaves são os IDs dos
+    empréstimos, que aparecem uma vez por evento. Filtrar e contar por
+    tipo numa fatia é feito em C, sem tuplas por evento.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.tipos = bytearray()
+
+    def definir(self, eventos):
+        """Substitui o conteúdo por trios (ordinal, chave, tipo), em qualquer ordem"""
+        ordenados = sorted(eventos, key=itemgetter(0))
+        self.datas = array('q', [ordinal for ordinal, _, _ in ordenados])
+        self.chaves = [chave for _, chave, _ in ordenados]
+        self.tipos = bytearray(tipo for _, _, tipo in ordenados)
+
+    def definir_colunas(self, datas, chaves, tipos):
+        """Substitui o conteúdo por colunas paralelas, sem montar um trio por evento"""
+        ordem = sorted(range(len(datas)), key=datas.__getitem__)
+        self.datas = array('q', [datas[i] for i in ordem])
+        self.chaves = [chaves[i] for i in ordem]
+        self.tipos = bytearray([tipos[i] for i in ordem])
+
+    def inserir(self, ordinal, chave, tipo=EMPRESTIMO):
+        posicao = bisect_right(self.datas, ordinal)
+        self.datas.insert(posicao, ordinal)
+        self.chaves.insert(posicao, chave)
+        self.tipos.insert(posicao, tipo)
+
+    def remover(self, ordinal, chave, tipo=EMPRESTIMO):
+        posicao = bisect_left(self.datas, ordinal)
+        fim = bisect_right(self.datas, ordinal, posicao)
+        while True:
+            try:
+                posicao = self.chaves.index(chave, posicao, fim)
+            except ValueError:
+                return
+            if self.tipos[posicao] == tipo:
+                break
+            posicao += 1
+        del self.datas[posicao]
+        del self.chaves[posicao]
+        del self.tipos[posicao]
+
+    def entre(self, inicio=None, fim=None, tipo=None):
+        """Chaves dos eventos (só de ``tipo``, se indicado) entre ``inicio`` e ``fim``, da mais antiga à mais recente"""
+        primeira, ultima = self.posicoes(inicio, fim)
+        chaves = self.chaves[primeira:ultima]
+        if tipo is None:
+            return chaves
+        return list(compress(chaves, self.tipos[primeira:ultima].translate(_MASCARAS[tipo])))
+
+    def contar(self, inicio=None, fim=None, tipo=None):
+        """Quantidade de eventos (só de ``tipo``, se indicado) entre ``inicio`` e ``fim``"""
+        primeira, ultima = self.posicoes(inicio, fim)
+        if tipo is None:
+            return ultima - primeira
+        return self.tipos.count(tipo, primeira, ultima)
+
+    def recentes(self, inicio=None, fim=None):
+        """Eventos entre ``inicio`` e ``fim``, do mais recente ao mais antigo
+
+        Devolve uma ``FatiaEventos``: uma cópia das três colunas no
+        intervalo, que não muda se a linha do tempo for alterada depois.
+        """
+        primeira, ultima = self.posicoes(inicio, fim)
+        return FatiaEventos(
+            self.datas[primeira:ultima], self.chaves[primeira:ultima], self.tipos[primeira:ultima],
+        )
+
+    def pagina(self, numero, tamanho, inicio=None, fim=None):
+        """Eventos (ordinal, chave, tipo) da página ``numero`` (0 = os mais recentes)"""
+        primeira, ultima = self.posicoes(inicio, fim)
+        fim_pagina = max(ultima - numero * tamanho, primeira)
+        inicio_pagina = max(fim_pagina - tamanho, primeira)
+        return list(zip(
+            reversed(self.datas[inicio_pagina:fim_pagina]),
+            reversed(self.chaves[inicio_pagina:fim_pagina]),
+            reversed(self.tipos[inicio_pagina:fim_pagina]),
+        ))
+
+
+class FatiaEventos(Sequence):
+    """Eventos (ordinal, chave, tipo) de um intervalo, do mais recente ao mais antigo
+
+    Os trios são montados só quando pedidos: uma tabela virtual lê apenas
+    as linhas visíveis, mesmo com todo o histórico selecionado.
+    """
+
+    def __init__(self, datas, chaves, tipos):
+        self.datas = datas
+        self.chaves = chaves
+        self.tipos = tipos
+
+    def __len__(self):
+        return len(self.chaves)
+
+    def __getitem__(self, posicao):
+        if isinstance(posicao, slice):
+            return [self[i] for i in range(*posicao.indices(len(self)))]
+        if posicao < 0:
+            posicao += len(self)
+        if not 0 <= posicao < len(self):
+            raise IndexError(posicao)
+        indice = len(self) - 1 - posicao
+        return self.datas[indice], self.chaves[indice], self.tipos[indice]
+
+    def contar(self, tipo):
+        """Quantidade de eventos de ``tipo``"""
+        return self.tipos.count(tipo)
+
+
+class IndiceDatas:
+    """Linha do tempo dos empréstimos, mantida a cada alteração
+
+    Cada empréstimo gera um evento na data do empréstimo e, depois de
+    devolvido, outro na data da devolução. Consultar um período ("os
+    últimos N dias", todo o histórico) é uma busca binária e uma fatia de
+    ``eventos``, sem percorrer nem converter datas de todos os empréstimos.
+    """
+
+    def __init__(self):
+        self.eventos = LinhaDoTempo()
+
+    def reconstruir(self, repositorio):
+        """Recria a linha do tempo a partir de todos os empréstimos"""
+        emprestimos = repositorio.emprestimos
+        registros = list(emprestimos.values())
+        if all(type(emprestimo) is Emprestimo for emprestimo in registros):
+            # Ordinais e status lidos direto dos atributos, sem conversão por registro
+            inicios = [getattr(emprestimo, 'data_emprestimo', None) for emprestimo in registros]
+            devolvido = StatusEmprestimo.DEVOLVIDO
+            devolucoes = [
+                getattr(emprestimo, 'data_devolucao_real', None)
+                if getattr(emprestimo, 'status', None) is devolvido else None
+                for emprestimo in registros
+            ]
+        else:
+            inicios = [ordinal_do_registro(emprestimo, 'data_emprestimo') for emprestimo in registros]
+            devolucoes = [_data_devolucao(emprestimo) for emprestimo in registros]
+
+        datas, chaves, tipos = [], [], []
+        for tipo, coluna in ((EMPRESTIMO, inicios), (DEVOLUCAO, devolucoes)):
+            for data, emp_id in zip(coluna, emprestimos):
+                if type(data) is int:
+                    datas.append(data)
+                    chaves.append(emp_id)
+                    tipos.append(tipo)
+        self.eventos.definir_colunas(datas, chaves, tipos)
+
+    def ao_alterar(self, colecao, chave, antigo, novo):
+        if colecao != 'emprestimos':
+            return
+        antigos = _eventos(antigo)
+        novos = _eventos(novo)
+        if antigos == novos:
+            return
+        for data, tipo in antigos:
+            if data is not None and (data, tipo) not in novos:
+                self.eventos.remover(data, chave, tipo)
+        for data, tipo in novos:
+            if data is not None and (data, tipo) not in antigos:
+                self.eventos.inserir(data, chave, tipo)
+
+
+def _data_devolucao(emprestimo):
+    """Ordinal da devolução de um empréstimo devolvido, senão None"""
+    if emprestimo.get('status') != 'devolvido':
+        return None
+    return ordinal_do_registro(emprestimo, 'data_devolucao_real')
+
+
+def _eventos(emprestimo):
+    """Pares (ordinal ou None, tipo) dos eventos de um empréstimo"""
+    if emprestimo is None:
+        return ()
+    return (
+        (ordinal_do_registro(emprestimo, 'data_emprestimo'), EMPRESTIMO),
+        (_data_devolucao(emprestimo), DEVOLUCAO),
+    )
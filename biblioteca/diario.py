@@ -0,0 +1,85 @@
+"""Diário de alterações (write-ahead) em JSON Lines"""
+
+import json
+import os
+
+from .arquivos import sincronizar_diretorio
+from .registros import para_json
+
+
+class Diario:
+    """Arquivo só de acréscimo com uma linha por transação
+
+    Cada linha é uma lista de ``[coleção, chave, registro]``; registro
+    ``null`` indica remoção. O custo de gravar não depende do tamanho das
+    coleções, apenas do que mudou. Cada linha é sincronizada com o disco
+    antes de ``registrar`` retornar: é ela que confirma a transação.
+    """
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self.registros = 0
+        # Fim da última transação lida ou gravada por este objeto, em bytes
+        self.posicao = 0
+
+    def registrar(self, alteracoes):
+        """Acrescenta uma transação ao fim do diário"""
+        linha = json.dumps(
+            [[colecao, chave, registro] for colecao, chave, registro in alteracoes],
+            ensure_ascii=False,
+            separators=(',', ':'),
+            # Registros compactos (biblioteca.registros) viram objetos JSON
+            default=para_json
+        )
+        novo = not os.path.exists(self.caminho)
+        with open(self.caminho, 'a', encoding='utf-8') as f:
+            f.write(linha + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+            self.posicao = os.fstat(f.fileno()).st_size
+        if novo:
+            sincronizar_diretorio(self.caminho)
+        self.registros += 1
+
+    def ler(self, desde=0):
+        """Percorre as transações gravadas, na ordem em que ocorreram
+
+        Com ``desde`` (a ``posicao`` de uma leitura anterior) só vêm as
+        transações acrescentadas depois dela, por exemplo por outro
+        processo; ``registros`` continua a contar o diário inteiro.
+        """
+        if not desde:
+            self.registros = 0
+        self.posicao = desde
+        if not os.path.exists(self.caminho):
+            self.posicao = 0
+            return
+
+        valido = desde
+        with open(self.caminho, 'rb') as f:
+            f.seek(desde)
+            for linha in f:
+                if not linha.endswith(b"\n"):
+                    break
+                try:
+                    alteracoes = json.loads(linha.decode('utf-8'))
+                except (UnicodeDecodeError, json.JSONDecodeError):
+                    # Linha incompleta de uma gravação interrompida
+                    break
+                valido += len(linha)
+                self.registros += 1
+                self.posicao = valido
+                yield [tuple(alteracao) for alteracao in alteracoes]
+
+        # Descartar o resto inválido para que novos registros não se colem a ele
+        if valido < os.path.getsize(self.caminho):
+            with open(self.caminho, 'r+b') as f:
+                f.truncate(valido)
+
+    def limpar(self):
+        """Esvazia o diário depois de os snapshots estarem gravados"""
+        if os.path.exists(self.caminho):
+            os.remove(self.caminho)
+            sincronizar_diretorio(self.caminho)
+        self.registros = 0
+        self.posicao = 0
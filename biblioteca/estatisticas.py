@@ -0,0 +1,122 @@
+"""Estatísticas do painel inicial mantidas a cada alteração"""
+
+import heapq
+
+from .datas import ordinal_do_registro
+from .sequencias import chave_ordenacao_id
+
+
+class EstatisticasAcervo:
+    """Contadores do acervo e empréstimos mais recentes
+
+    Os totais são ajustados pela diferença entre o registro antigo e o
+    novo, e os empréstimos mais recentes ficam num heap limitado a
+    ``capacidade`` entradas; o painel lê tudo em O(1). ``_limiar`` é um
+    limite superior das chaves que ficaram fora do heap: enquanto os mais
+    recentes pedidos estiverem acima dele, o heap basta. Só quando perde
+    entradas (exclusão ou mudança de data) e deixa de cobrir o pedido é
+    que é recalculado a partir de todos os empréstimos.
+    """
+
+    def __init__(self, capacidade=32):
+        self.capacidade = capacidade
+        self.unidades = 0
+        self.titulos_disponiveis = 0
+        self.emprestimos_ativos = 0
+        self._recentes = []
+        self._no_heap = set()
+        self._limiar = None
+        self._repositorio = None
+
+    def reconstruir(self, repositorio):
+        """Recalcula todos os contadores"""
+        self._repositorio = repositorio
+        self.unidades = 0
+        self.titulos_disponiveis = 0
+        for livro in repositorio.livros.values():
+            self._contar_livro(livro, 1)
+
+        self.emprestimos_ativos = sum(
+            1 for emprestimo in repositorio.emprestimos.values()
+            if emprestimo.get('status') == 'ativo'
+        )
+        self._refazer_recentes()
+
+    def ao_alterar(self, colecao, chave, antigo, novo):
+        if colecao == 'livros':
+            if antigo is not None:
+                self._contar_livro(antigo, -1)
+            if novo is not None:
+                self._contar_livro(novo, 1)
+        elif colecao == 'emprestimos':
+            if antigo is not None and antigo.get('status') == 'ativo':
+                self.emprestimos_ativos -= 1
+            if novo is not None and novo.get('status') == 'ativo':
+                self.emprestimos_ativos += 1
+            self._atualizar_recentes(chave, antigo, novo)
+
+    def resumo(self):
+        """Valores do painel: unidades, títulos, usuários, ativos, disponíveis"""
+        repositorio = self._repositorio
+        return {
+            'unidades': self.unidades,
+            'titulos': len(repositorio.livros),
+            'usuarios': len(repositorio.usuarios),
+            'emprestimos_ativos': self.emprestimos_ativos,
+            'titulos_disponiveis': self.titulos_disponiveis,
+        }
+
+    def emprestimos_recentes(self, limite=5):
+        """IDs dos empréstimos mais recentes, do mais novo para o mais antigo"""
+        recentes = heapq.nlargest(limite, self._recentes)
+        if self._limiar is not None and (len(recentes) < limite or recentes[-1] <= self._limiar):
+            self._refazer_recentes()
+            recentes = heapq.nlargest(limite, self._recentes)
+        return [emp_id for _, _, emp_id in recentes]
+
+    def _contar_livro(self, livro, sinal):
+        quantidade = livro.get('quantidade', 0)
+        self.unidades += sinal * quantidade
+        if quantidade > 0:
+            self.titulos_disponiveis += sinal
+
+    def _atualizar_recentes(self, emp_id, antigo, novo):
+        data = _data(novo) if novo is not None else None
+        if emp_id in self._no_heap:
+            if antigo is not None and _data(antigo) == data:
+                # Só mudou o status ou a multa: a posição no heap é a mesma
+                return
+            self._recentes = [item for item in self._recentes if item[2] != emp_id]
+            heapq.heapify(self._recentes)
+            self._no_heap.discard(emp_id)
+        if novo is None:
+            return
+
+        item = (data, chave_ordenacao_id(emp_id), emp_id)
+        if len(self._recentes) < self.capacidade:
+            heapq.heappush(self._recentes, item)
+            self._no_heap.add(emp_id)
+        else:
+            if item > self._recentes[0]:
+                item = heapq.heapreplace(self._recentes, item)
+                self._no_heap.discard(item[2])
+                self._no_heap.add(emp_id)
+            if self._limiar is None or item > self._limiar:
+                self._limiar = item
+
+    def _refazer_recentes(self):
+        emprestimos = self._repositorio.emprestimos
+        maiores = heapq.nlargest(self.capacidade + 1, (
+            (_data(emprestimo), chave_ordenacao_id(emp_id), emp_id)
+            for emp_id, emprestimo in emprestimos.items()
+        ))
+        self._limiar = maiores.pop() if len(maiores) > self.capacidade else None
+        self._recentes = maiores
+        heapq.heapify(self._recentes)
+        self._no_heap = {emp_id for _, _, emp_id in self._recentes}
+
+
+def _data(emprestimo):
+    # Ordinal da data do empréstimo; sem data válida conta como o mais antigo
+    ordinal = ordinal_do_registro(emprestimo, 'data_emprestimo')
+    return 0 if ordinal is None else ordinal
@@ -0,0 +1,367 @@
+"""Exportação das coleções e da movimentação para CSV, JSON lines ou colunas
+
+Os registros são lidos do repositório em blocos de ``TAMANHO_BLOCO`` e
+escritos à medida, sem montar o arquivo em memória: de cada coleção só
+a lista de chaves é copiada no início. Cada bloco é lido com a
+``trava`` do repositório, por isso a exportação pode correr numa thread
+enquanto a interface continua a gravar; como os registros nunca são
+alterados no lugar, cada linha sai inteira, antes ou depois de uma
+alteração. O arquivo só substitui um anterior quando está completo.
+
+O formato ``colunas`` é binário, à maneira do Parquet: um cabeçalho com
+os nomes das colunas e grupos de linhas em que cada coluna é gravada
+seguida, com as strings de cada grupo numa tabela própria (como nos
+snapshots de ``biblioteca.binario``). ``ler_colunas`` lê-o de volta.
+Com ``comprimir`` (ou um nome terminado em ``.gz``) a saída vai em gzip.
+"""
+
+import csv
+import gzip
+import io
+import json
+import os
+import struct
+import time
+from contextlib import contextmanager
+from itertools import accumulate, islice
+
+from .arquivos import escrever_atomicamente
+from .binario import ErroFormato, Leitor, bytes_array, codificar_coluna, decodificar_coluna
+from .datas import DEVOLUCAO, ordinal_hoje
+from .operacoes import ErroOperacao
+from .registros import texto_data
+
+CONJUNTOS = ('livros', 'usuarios', 'emprestimos', 'movimentacao')
+FORMATOS = ('csv', 'jsonl', 'colunas')
+# Linhas lidas do repositório e escritas de cada vez
+TAMANHO_BLOCO = 10000
+# Equilíbrio entre tamanho e tempo (9 custa o dobro e ganha pouco)
+NIVEL_GZIP = 6
+
+EXTENSOES = {'csv': '.csv', 'jsonl': '.jsonl', 'colunas': '.bibcol'}
+
+MAGICO_COLUNAS = b'BIBCOL'
+VERSAO_COLUNAS = 1
+_MAGICO_GZIP = b'\x1f\x8b'
+
+_COLUNAS = {
+    'livros': ('isbn', 'título', 'autor', 'gênero', 'quantidade', 'emprestados', 'disponiveis'),
+    'usuarios': ('id', 'nome', 'tipo', 'data_cadastro', 'emprestimos_ativos'),
+    'emprestimos': ('id', 'id_usuario', 'isbn_livro', 'data_emprestimo', 'data_devolucao_prevista',
+                    'data_devolucao_real', 'status', 'multa'),
+    'movimentacao': ('data', 'tipo', 'emprestimo', 'id_usuario', 'usuario', 'isbn', 'livro', 'status'),
+}
+
+
+def formato_do_arquivo(caminho):
+    """Formato e compressão pelo nome do arquivo, ex.: 'livros.csv.gz' -> ('csv', True)"""
+    comprimido = caminho.lower().endswith('.gz')
+    base = caminho[:-3] if comprimido else caminho
+    extensao = os.path.splitext(base)[1].lower()
+    for formato, esperada in EXTENSOES.items():
+        if extensao == esperada:
+            return formato, comprimido
+    raise ErroOperacao(
+        f"Formato de {caminho} desconhecido: use a extensão .csv, .jsonl ou .bibcol, ou indique o formato"
+    )
+
+
+def exportar(repositorio, conjunto, caminho, formato=None, comprimir=None, progresso=None,
+             genero=None, disponiveis=None, limite_dias=None, hoje=None):
+    """Exporta um conjunto para ``caminho``; devolve um resumo com linhas, bytes e segundos
+
+    ``formato`` e ``comprimir`` são deduzidos do nome do arquivo se
+    omitidos. ``progresso(lidos, total)`` é chamado após cada bloco
+    escrito. Filtros: ``genero`` e ``disponiveis`` (True/False) para
+    livros, como na consulta de estoque; ``limite_dias`` para a
+    movimentação (None = todo o histórico).
+    """
+    if conjunto not in CONJUNTOS:
+        raise ErroOperacao(f"Conjunto desconhecido: {conjunto} (use {', '.join(CONJUNTOS)})")
+    if formato is None or comprimir is None:
+        deduzido, comprimido = formato_do_arquivo(caminho)
+        formato = formato or deduzido
+        comprimir = comprimido if comprimir is None else comprimir
+    if formato not in FORMATOS:
+        raise ErroOperacao(f"Formato desconhecido: {formato} (use {', '.join(FORMATOS)})")
+
+    inicio = time.perf_counter()
+    if conjunto == 'livros':
+        total, blocos = _blocos_livros(repositorio, genero, disponiveis)
+    elif conjunto == 'usuarios':
+        total, blocos = _blocos_usuarios(repositorio)
+    elif conjunto == 'emprestimos':
+        total, blocos = _blocos_emprestimos(repositorio)
+    else:
+        total, blocos = _blocos_movimentacao(repositorio, limite_dias, hoje)
+    colunas = _COLUNAS[conjunto]
+
+    linhas = 0
+    try:
+        with _abrir_saida(caminho, comprimir) as saida:
+            escritor = _ESCRITORES[formato](saida, conjunto, colunas)
+            for lidos, bloco in blocos:
+                escritor.escrever(bloco)
+                linhas += len(bloco)
+                if progresso is not None:
+                    progresso(lidos, total)
+            escritor.terminar(linhas)
+    except OSError as e:
+        raise ErroOperacao(f"Não foi possível gravar {caminho}: {e}") from None
+    return {
+        'conjunto': conjunto,
+        'arquivo': caminho,
+        'formato': formato,
+        'comprimido': comprimir,
+        'linhas': linhas,
+        'bytes': os.path.getsize(caminho),
+        'segundos': round(time.perf_counter() - inicio, 3),
+    }
+
+
+def ler_colunas(caminho):
+    """Percorre as linhas de um arquivo ``colunas`` como dicionários coluna -> valor"""
+    with open(caminho, 'rb') as bruto:
+        comprimido = bruto.read(2) == _MAGICO_GZIP
+        bruto.seek(0)
+        arquivo = gzip.GzipFile(fileobj=bruto) if comprimido else bruto
+        if arquivo.read(len(MAGICO_COLUNAS)) != MAGICO_COLUNAS:
+            raise ErroFormato(f"{caminho}: não é um arquivo de colunas")
+        versao, tamanho = struct.unpack('<HI', _ler_exato(arquivo, 6))
+        if versao != VERSAO_COLUNAS:
+            raise ErroFormato(f"{caminho}: versão {versao} não suportada (esperada {VERSAO_COLUNAS})")
+        colunas = json.loads(_ler_exato(arquivo, tamanho))['colunas']
+
+        lidas = 0
+        while True:
+            quantidade, tamanho = struct.unpack('<IQ', _ler_exato(arquivo, 12))
+            if quantidade == 0:
+                # Marca de fim: ``tamanho`` é o total de linhas
+                if tamanho != lidas:
+                    raise ErroFormato(f"{caminho}: {lidas} linhas lidas, {tamanho} esperadas")
+                return
+            leitor = Leitor(_ler_exato(arquivo, tamanho))
+            (total_strings,) = leitor.struct('<I')
+            tamanhos = leitor.array('I', total_strings)
+            (tamanho_blob,) = leitor.struct('<Q')
+            texto = leitor.bytes(tamanho_blob).decode('utf-8', 'surrogatepass')
+            strings = [texto[fim - n:fim] for fim, n in zip(accumulate(tamanhos), tamanhos)]
+            valores = [decodificar_coluna(leitor, quantidade, strings) for _ in colunas]
+            if not leitor.terminou():
+                raise ErroFormato(f"{caminho}: dados após o fim de um grupo de linhas")
+            for linha in zip(*valores):
+                yield dict(zip(colunas, linha))
+            lidas += quantidade
+
+
+@contextmanager
+def _abrir_saida(caminho, comprimir):
+    with escrever_atomicamente(caminho, 'wb') as arquivo:
+        if not comprimir:
+            yield arquivo
+            return
+        # mtime fixo: o mesmo conteúdo gera sempre o mesmo arquivo
+        with gzip.GzipFile(fileobj=arquivo, mode='wb', compresslevel=NIVEL_GZIP, mtime=0) as saida:
+            yield saida
+
+
+def _ler_exato(arquivo, tamanho):
+    dados = arquivo.read(tamanho)
+    if len(dados) != tamanho:
+        raise ErroFormato("arquivo de colunas truncado")
+    return dados
+
+
+def _em_blocos(repositorio, dados):
+    """Pares (chaves percorridas, bloco de chaves) de uma coleção
+
+    As chaves são copiadas de uma vez, com a trava; quem percorre os
+    blocos lê os registros e salta os que entretanto foram removidos.
+    """
+    with repositorio.trava:
+        chaves = list(dados)
+    lidos = 0
+    iterador = iter(chaves)
+    while True:
+        bloco = list(islice(iterador, TAMANHO_BLOCO))
+        if not bloco:
+            return
+        lidos += len(bloco)
+        yield lidos, bloco
+
+
+def _blocos_livros(repositorio, genero, disponiveis):
+    livros = repositorio.livros
+    ativos = repositorio.indice_emprestimos.ativos_por_livro
+
+    def blocos():
+        for lidos, chaves in _em_blocos(repositorio, livros):
+            linhas = []
+            with repositorio.trava:
+                for isbn in chaves:
+                    livro = livros.get(isbn)
+                    if livro is None or (genero is not None and livro.get('gênero', '') != genero):
+                        continue
+                    quantidade = livro.get('quantidade', 0)
+                    emprestados = ativos.get(isbn, 0)
+                    if disponiveis is not None and (quantidade - emprestados > 0) != disponiveis:
+                        continue
+                    linhas.append((isbn, livro.get('título', ''), livro.get('autor', ''),
+                                   livro.get('gênero', ''), quantidade, emprestados,
+                                   quantidade - emprestados))
+            yield lidos, linhas
+
+    return len(livros), blocos()
+
+
+def _blocos_usuarios(repositorio):
+    usuarios = repositorio.usuarios
+    indice = repositorio.indice_emprestimos
+
+    def blocos():
+        for lidos, chaves in _em_blocos(repositorio, usuarios):
+            linhas = []
+            with repositorio.trava:
+                for id_usuario in chaves:
+                    usuario = usuarios.get(id_usuario)
+                    if usuario is None:
+                        continue
+                    linhas.append((id_usuario, usuario.get('nome', ''), usuario.get('tipo', ''),
+                                   usuario.get('data_cadastro', ''), indice.ativos_do_usuario(id_usuario)))
+            yield lidos, linhas
+
+    return len(usuarios), blocos()
+
+
+def _blocos_emprestimos(repositorio):
+    emprestimos = repositorio.emprestimos
+
+    def blocos():
+        for lidos, chaves in _em_blocos(repositorio, emprestimos):
+            linhas = []
+            with repositorio.trava:
+                for emp_id in chaves:
+                    emprestimo = emprestimos.get(emp_id)
+                    if emprestimo is None:
+                        continue
+                    linhas.append((
+                        emp_id, emprestimo.get('id_usuario', ''), emprestimo.get('isbn_livro', ''),
+                        emprestimo.get('data_emprestimo', ''), emprestimo.get('data_devolucao_prevista', ''),
+                        emprestimo.get('data_devolucao_real', ''), emprestimo.get('status', ''),
+                        float(emprestimo.get('multa', 0.00) or 0.00),
+                    ))
+            yield lidos, linhas
+
+    return len(emprestimos), blocos()
+
+
+def _blocos_movimentacao(repositorio, limite_dias, hoje):
+    hoje = ordinal_hoje() if hoje is None else hoje
+    inicio = None if limite_dias is None else hoje - limite_dias + 1
+    with repositorio.trava:
+        # Cópia compacta das três colunas do período, do mais recente
+        eventos = repositorio.indice_datas.eventos.recentes(inicio)
+
+    def blocos():
+        emprestimos = repositorio.emprestimos
+        usuarios = repositorio.usuarios
+        livros = repositorio.livros
+        for comeco in range(0, len(eventos), TAMANHO_BLOCO):
+            linhas = []
+            with repositorio.trava:
+                for ordinal, emp_id, tipo in eventos[comeco:comeco + TAMANHO_BLOCO]:
+                    emprestimo = emprestimos.get(emp_id, {})
+                    id_usuario = emprestimo.get('id_usuario', '')
+                    isbn = emprestimo.get('isbn_livro', '')
+                    linhas.append((
+                        texto_data(ordinal),
+                        'DEVOLUÇÃO' if tipo == DEVOLUCAO else 'EMPRÉSTIMO',
+                        emp_id,
+                        id_usuario,
+                        usuarios.get(id_usuario, {}).get('nome', 'Desconhecido'),
+                        isbn,
+                        livros.get(isbn, {}).get('título', 'Desconhecido'),
+                        emprestimo.get('status', ''),
+                    ))
+            yield min(comeco + TAMANHO_BLOCO, len(eventos)), linhas
+
+    return len(eventos), blocos()
+
+
+class _EscritorCSV:
+    def __init__(self, saida, conjunto, colunas):
+        # BOM: as planilhas reconhecem os acentos; a importação ignora-o
+        self.texto = io.TextIOWrapper(saida, encoding='utf-8-sig', newline='')
+        self.csv = csv.writer(self.texto)
+        self.csv.writerow(colunas)
+
+    def escrever(self, linhas):
+        self.csv.writerows(linhas)
+
+    def terminar(self, total):
+        self.texto.flush()
+        # Sem fechar o arquivo por baixo, que ainda vai ser sincronizado
+        self.texto.detach()
+
+
+class _EscritorJSONL:
+    def __init__(self, saida, conjunto, colunas):
+        self.texto = io.TextIOWrapper(saida, encoding='utf-8', newline='\n')
+        self.colunas = colunas
+        # Um só codificador: json.dumps com opções cria um a cada chamada
+        self.codificar = json.JSONEncoder(ensure_ascii=False).encode
+
+    def escrever(self, linhas):
+        colunas = self.colunas
+        codificar = self.codificar
+        self.texto.write(''.join(
+            codificar(dict(zip(colunas, linha))) + "\n" for linha in linhas
+        ))
+
+    def terminar(self, total):
+        self.texto.flush()
+        self.texto.detach()
+
+
+class _EscritorColunas:
+    """Cabeçalho, grupos de linhas (um por bloco) e a marca de fim com o total"""
+
+    def __init__(self, saida, conjunto, colunas):
+        self.saida = saida
+        self.colunas = colunas
+        cabecalho = json.dumps({'conjunto': conjunto, 'colunas': colunas}, ensure_ascii=False).encode('utf-8')
+        saida.write(MAGICO_COLUNAS + struct.pack('<HI', VERSAO_COLUNAS, len(cabecalho)) + cabecalho)
+
+    def escrever(self, linhas):
+        if not linhas:
+            return
+        strings = {}
+
+        def interno(texto):
+            indice = strings.get(texto)
+            if indice is None:
+                indice = strings[texto] = len(strings)
+            return indice
+
+        corpo = b''.join(codificar_coluna(list(coluna), interno) for coluna in zip(*linhas))
+        textos = list(strings)
+        blob = ''.join(textos).encode('utf-8', 'surrogatepass')
+        grupo = b''.join((
+            struct.pack('<I', len(textos)),
+            bytes_array('I', [len(texto) for texto in textos]),
+            struct.pack('<Q', len(blob)),
+            blob,
+            corpo,
+        ))
+        self.saida.write(struct.pack('<IQ', len(linhas), len(grupo)))
+        self.saida.write(grupo)
+
+    def terminar(self, total):
+        self.saida.write(struct.pack('<IQ', 0, total))
+
+
+_ESCRITORES = {
+    'csv': _EscritorCSV,
+    'jsonl': _EscritorJSONL,
+    'colunas': _EscritorColunas,
+}
@@ -0,0 +1,148 @@
+"""Gravação do repositório numa thread separada da interface"""
+
+import queue
+import threading
+
+from .repositorio import COLECOES, ErroPersistencia
+
+
+class GravadorAssincrono:
+    """Thread que persiste as transações do repositório em segundo plano
+
+    ``enfileirar`` só acrescenta as alterações à fila e retorna. A thread
+    junta tudo o que estiver à espera num único lote, mantendo apenas o
+    último valor de cada registro, e pedidos repetidos de regravar a
+    mesma coleção viram uma só escrita. O resultado de cada lote vai para
+    ``resultados`` (uma ``queue.Queue``), que a interface consulta a
+    partir da sua própria thread (ex.: com ``root.after``). Se um lote
+    falhar, volta para a fila e é tentado de novo na gravação seguinte.
+    """
+
+    def __init__(self, repositorio):
+        self.repositorio = repositorio
+        self.resultados = queue.Queue()
+        self._condicao = threading.Condition()
+        self._alteracoes = {}
+        self._colecoes = set()
+        self._ocupado = False
+        self._parar = False
+        self._lotes = 0
+        self._falhou = False
+        self._thread = threading.Thread(target=self._executar, name="gravador", daemon=True)
+        self._thread.start()
+
+    def enfileirar(self, alteracoes):
+        """Agenda a gravação das alterações de uma transação"""
+        with self._condicao:
+            for colecao, chave, registro in alteracoes:
+                # Reinserir para a ordem do lote seguir a da última alteração
+                self._alteracoes.pop((colecao, chave), None)
+                self._alteracoes[(colecao, chave)] = registro
+            self._condicao.notify_all()
+
+    def salvar_colecoes(self, colecoes=COLECOES):
+        """Agenda a regravação completa das coleções indicadas"""
+        with self._condicao:
+            self._colecoes.update(colecoes)
+            self._condicao.notify_all()
+
+    def descarregar(self):
+        """Grava já, na thread atual, as alterações que estão na fila"""
+        with self._condicao:
+            alteracoes, self._alteracoes = self._alteracoes, {}
+        if not alteracoes:
+            return
+        try:
+            self.repositorio._registrar(_como_lista(alteracoes))
+        except BaseException:
+            with self._condicao:
+                alteracoes.update(self._alteracoes)
+                self._alteracoes = alteracoes
+            raise
+
+    def ocupado(self):
+        """Indica se há gravações na fila ou em curso"""
+        with self._condicao:
+            return self._ocupado or bool(self._alteracoes or self._colecoes)
+
+    def esperar(self, tempo_limite=None):
+        """Bloqueia até a fila esvaziar ou a próxima tentativa falhar
+
+        Retorna True se tudo foi gravado.
+        """
+        with self._condicao:
+            lotes = self._lotes
+            self._condicao.notify_all()
+            self._condicao.wait_for(
+                lambda: not (self._ocupado or self._alteracoes or self._colecoes)
+                or (self._falhou and self._lotes > lotes)
+                or not self._thread.is_alive(),
+                tempo_limite
+            )
+            return not (self._ocupado or self._alteracoes or self._colecoes)
+
+    def parar(self):
+        """Grava o que estiver pendente e encerra a thread
+
+        Levanta ``ErroPersistencia`` se a última tentativa de gravar
+        falhou e ainda há alterações por gravar.
+        """
+        with self._condicao:
+            self._parar = True
+            self._condicao.notify_all()
+        self._thread.join()
+
+        with self._condicao:
+            pendentes = bool(self._alteracoes or self._colecoes)
+        if pendentes:
+            raise ErroPersistencia("Existem alterações que não puderam ser gravadas")
+
+    def _executar(self):
+        while True:
+            with self._condicao:
+                self._condicao.wait_for(
+                    lambda: self._alteracoes or self._colecoes or self._parar
+                )
+                if not (self._alteracoes or self._colecoes):
+                    self._condicao.notify_all()
+                    return
+                alteracoes, self._alteracoes = self._alteracoes, {}
+                colecoes, self._colecoes = self._colecoes, set()
+                self._ocupado = True
+
+            erro = None
+            try:
+                if alteracoes:
+                    self.repositorio._escrever(_como_lista(alteracoes))
+                    alteracoes = {}
+                if colecoes:
+                    self.repositorio._salvar_colecoes(colecoes)
+                    colecoes = set()
+            except ErroPersistencia as e:
+                erro = e
+            except Exception as e:
+                # Um erro inesperado não pode matar a thread com dados na fila
+                erro = ErroPersistencia(f"Erro inesperado ao gravar: {e}")
+
+            with self._condicao:
+                self._ocupado = False
+                self._lotes += 1
+                self._falhou = erro is not None
+                if erro is not None:
+                    # Devolver à fila o que falhou, sem passar à frente do que chegou depois
+                    alteracoes.update(self._alteracoes)
+                    self._alteracoes = alteracoes
+                    self._colecoes |= colecoes
+                self._condicao.notify_all()
+            self.resultados.put(erro)
+
+            if erro is not None:
+                with self._condicao:
+                    if self._parar:
+                        return
+                    # Esperar por nova alteração antes de tentar de novo
+                    self._condicao.wait()
+
+
+def _como_lista(alteracoes):
+    return [(colecao, chave, registro) for (colecao, chave), registro in alteracoes.items()]
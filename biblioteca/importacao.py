@@ -0,0 +1,416 @@
+"""Importação em massa de livros, usuários e empréstimos de arquivos CSV ou JSON lines
+
+O arquivo é lido em lotes de ``TAMANHO_LOTE`` linhas, sem carregá-lo
+inteiro; cada lote é validado e gravado numa transação, e os índices do
+repositório são reconstruídos uma só vez, no fim (``em_massa``). Uma
+linha inválida não interrompe a importação: fica no relatório, com o
+número da linha e o motivo, e opcionalmente num arquivo de rejeitados.
+
+As colunas (ou chaves, em JSON lines) têm os nomes dos campos dos
+arquivos de dados, com ou sem acentos: ``isbn, titulo, autor, genero,
+quantidade`` para livros, ``id, nome, tipo, data_cadastro`` para
+usuários e ``id, id_usuario, isbn_livro, data_emprestimo,
+data_devolucao_prevista, data_devolucao_real, status, multa`` para
+empréstimos. As regras são as do cadastro pelas telas: ISBN só com
+dígitos, ISBN repetido soma a quantidade ao estoque, ID de usuário
+repetido é recusado.
+"""
+
+import csv
+import json
+import os
+import time
+from itertools import islice
+
+from .busca import normalizar
+from .datas import ordinal_hoje
+from .operacoes import (
+    PRAZO_PADRAO,
+    TAMANHO_ISBN,
+    TIPOS_USUARIO,
+    ErroOperacao,
+    isbn_valido,
+    quantidade_valida,
+)
+from .registros import ordinal_data, texto_data
+
+FORMATOS = ('csv', 'jsonl')
+# Linhas gravadas por transação
+TAMANHO_LOTE = 10000
+# Rejeições guardadas no relatório; as seguintes só são contadas
+LIMITE_REJEICOES = 1000
+STATUS_EMPRESTIMO = ('ativo', 'devolvido')
+
+_EXTENSOES = {'.csv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl'}
+
+# Campo de cada coleção pelo nome normalizado da coluna
+_CAMPOS = {
+    'livros': {
+        'isbn': 'isbn', 'titulo': 'título', 'autor': 'autor',
+        'genero': 'gênero', 'quantidade': 'quantidade',
+    },
+    'usuarios': {
+        'id': 'id', 'nome': 'nome', 'tipo': 'tipo', 'data_cadastro': 'data_cadastro',
+    },
+    'emprestimos': {
+        'id': 'id', 'id_usuario': 'id_usuario', 'isbn_livro': 'isbn_livro', 'isbn': 'isbn_livro',
+        'data_emprestimo': 'data_emprestimo', 'data_devolucao_prevista': 'data_devolucao_prevista',
+        'data_devolucao_real': 'data_devolucao_real', 'status': 'status', 'multa': 'multa',
+    },
+}
+
+
+class RelatorioImportacao:
+    """Resultado de uma importação: contagens, rejeições e duração
+
+    ``novos`` são os registros criados e ``somados`` os livros já
+    existentes (no acervo ou mais acima no arquivo) que ganharam
+    unidades. ``rejeicoes`` tem os pares (linha, motivo) das primeiras
+    ``LIMITE_REJEICOES`` linhas recusadas; ``rejeitadas`` conta todas.
+    """
+
+    def __init__(self, colecao, arquivo, formato, saida_rejeitados=None):
+        self.colecao = colecao
+        self.arquivo = arquivo
+        self.formato = formato
+        self.lidas = 0
+        self.novos = 0
+        self.somados = 0
+        self.rejeitadas = 0
+        self.rejeicoes = []
+        self.lotes = 0
+        self.segundos = 0.0
+        self._saida_rejeitados = saida_rejeitados
+
+    @property
+    def gravados(self):
+        return self.novos + self.somados
+
+    @property
+    def linhas_por_segundo(self):
+        return self.lidas / self.segundos if self.segundos else 0.0
+
+    def rejeitar(self, linha, motivo, dados=None):
+        """Conta uma linha recusada e regista-a no arquivo de rejeitados"""
+        self.rejeitadas += 1
+        if len(self.rejeicoes) < LIMITE_REJEICOES:
+            self.rejeicoes.append((linha, motivo))
+        if self._saida_rejeitados is not None:
+            self._saida_rejeitados.write(json.dumps(
+                {'linha': linha, 'motivo': motivo, 'dados': dados}, ensure_ascii=False, default=str
+            ) + "\n")
+
+    def como_dict(self):
+        """Dicionário pronto para JSON"""
+        return {
+            'colecao': self.colecao,
+            'arquivo': self.arquivo,
+            'formato': self.formato,
+            'lidas': self.lidas,
+            'gravados': self.gravados,
+            'novos': self.novos,
+            'somados': self.somados,
+            'rejeitadas': self.rejeitadas,
+            'rejeicoes': [{'linha': linha, 'motivo': motivo} for linha, motivo in self.rejeicoes],
+            'lotes': self.lotes,
+            'segundos': round(self.segundos, 3),
+            'linhas_por_segundo': round(self.linhas_por_segundo),
+        }
+
+
+def formato_do_arquivo(caminho):
+    """'csv' ou 'jsonl' pela extensão do arquivo"""
+    extensao = os.path.splitext(caminho)[1].lower()
+    if extensao not in _EXTENSOES:
+        raise ErroOperacao(
+            f"Formato de {caminho} desconhecido: use a extensão .csv ou .jsonl, ou indique o formato"
+        )
+    return _EXTENSOES[extensao]
+
+
+def ler_linhas(caminho, formato, colecao):
+    """Percorre as linhas de um arquivo como trios (número da linha, campos, erro)
+
+    ``campos`` é um dicionário campo -> valor com os nomes da coleção,
+    ou None quando a linha não pôde ser lida (o motivo vem em ``erro``).
+    """
+    if formato == 'csv':
+        return _ler_csv(caminho, _CAMPOS[colecao])
+    if formato == 'jsonl':
+        return _ler_jsonl(caminho, _CAMPOS[colecao])
+    raise ErroOperacao(f"Formato desconhecido: {formato} (use {', '.join(FORMATOS)})")
+
+
+def importar(repositorio, colecao, caminho, formato=None, tamanho_lote=TAMANHO_LOTE,
+             rejeitados=None, progresso=None, hoje=None):
+    """Importa um arquivo CSV ou JSON lines para uma coleção; devolve o ``RelatorioImportacao``
+
+    ``formato`` é deduzido da extensão se omitido. ``rejeitados`` é o
+    caminho de um arquivo JSON lines para as linhas recusadas, com o
+    motivo; ``progresso(relatorio)`` é chamado após cada lote gravado.
+    Os lotes já gravados ficam gravados se um lote seguinte falhar.
+    """
+    if colecao not in _CAMPOS:
+        raise ErroOperacao(f"Coleção desconhecida: {colecao}")
+    formato = formato or formato_do_arquivo(caminho)
+    hoje = ordinal_hoje() if hoje is None else hoje
+    validar = _VALIDAR[colecao]
+    gravar_lote = _GRAVAR[colecao]
+
+    inicio = time.perf_counter()
+    try:
+        saida = open(rejeitados, 'w', encoding='utf-8') if rejeitados else None
+    except OSError as e:
+        raise ErroOperacao(f"Não foi possível criar {rejeitados}: {e}") from None
+    relatorio = RelatorioImportacao(colecao, caminho, formato, saida)
+    try:
+        linhas = ler_linhas(caminho, formato, colecao)
+        with repositorio.em_massa():
+            while True:
+                lote = list(islice(linhas, tamanho_lote))
+                if not lote:
+                    break
+                validos = []
+                for numero, campos, erro in lote:
+                    if erro is None:
+                        try:
+                            validos.append((numero, campos) + validar(campos, hoje))
+                            continue
+                        except ErroOperacao as e:
+                            erro = str(e)
+                    relatorio.rejeitar(numero, erro, campos)
+                with repositorio.transacao():
+                    gravar_lote(repositorio, validos, relatorio)
+                relatorio.lidas += len(lote)
+                relatorio.lotes += 1
+                relatorio.segundos = time.perf_counter() - inicio
+                if progresso is not None:
+                    progresso(relatorio)
+    except OSError as e:
+        raise ErroOperacao(f"Não foi possível ler {caminho}: {e}") from None
+    except UnicodeDecodeError as e:
+        raise ErroOperacao(f"{caminho} não está em UTF-8: {e}") from None
+    except csv.Error as e:
+        raise ErroOperacao(f"CSV inválido em {caminho}: {e}") from None
+    finally:
+        if saida is not None:
+            saida.close()
+    relatorio.segundos = time.perf_counter() - inicio
+    # Recusas na gravação (ex.: ID repetido) vêm depois das da validação do lote
+    relatorio.rejeicoes.sort()
+    return relatorio
+
+
+def _ler_csv(caminho, nomes):
+    # utf-8-sig: planilhas costumam gravar o BOM no início
+    with open(caminho, 'r', encoding='utf-8-sig', newline='') as f:
+        amostra = f.read(1 << 16)
+        f.seek(0)
+        try:
+            dialeto = csv.Sniffer().sniff(amostra, delimiters=',;\t')
+        except csv.Error:
+            dialeto = csv.excel
+        leitor = csv.reader(f, dialeto)
+        cabecalho = next(leitor, None)
+        if cabecalho is None:
+            return
+        colunas = [
+            (nomes[normalizar(nome.strip())], posicao)
+            for posicao, nome in enumerate(cabecalho)
+            if normalizar(nome.strip()) in nomes
+        ]
+        if not colunas:
+            raise ErroOperacao(
+                f"{caminho}: nenhuma coluna reconhecida no cabeçalho (esperadas: {', '.join(nomes)})"
+            )
+        for linha in leitor:
+            if not linha:
+                continue
+            tamanho = len(linha)
+            yield leitor.line_num, {
+                campo: linha[posicao] for campo, posicao in colunas if posicao < tamanho
+            }, None
+
+
+def _ler_jsonl(caminho, nomes):
+    # Documentos com as mesmas chaves reutilizam a tradução dos nomes
+    traducoes = {}
+    with open(caminho, 'r', encoding='utf-8-sig') as f:
+        for numero, linha in enumerate(f, 1):
+            if not linha.strip():
+                continue
+            try:
+                dados = json.loads(linha)
+            except ValueError as e:
+                yield numero, None, f"JSON inválido: {e}"
+                continue
+            if not isinstance(dados, dict):
+                yield numero, None, "Esperado um objeto JSON"
+                continue
+            chaves = tuple(dados)
+            traducao = traducoes.get(chaves)
+            if traducao is None:
+                traducao = [(chave, nomes[normalizar(chave)]) for chave in chaves if normalizar(chave) in nomes]
+                if len(traducoes) < 64:
+                    traducoes[chaves] = traducao
+            yield numero, {campo: dados[chave] for chave, campo in traducao}, None
+
+
+def _texto(campos, campo):
+    valor = campos.get(campo)
+    return '' if valor is None else str(valor).strip()
+
+
+def _data(campos, campo, descricao):
+    """Texto 'AAAA-MM-DD' de uma data, '' se ausente; ErroOperacao se inválida"""
+    texto = _texto(campos, campo)
+    if texto and type(ordinal_data(texto)) is not int:
+        raise ErroOperacao(f"{descricao} inválida: {texto} (use AAAA-MM-DD)")
+    return texto
+
+
+def _validar_livro(campos, hoje):
+    isbn = _texto(campos, 'isbn')
+    titulo = _texto(campos, 'título')
+    if not titulo or not isbn:
+        raise ErroOperacao("Título e ISBN são obrigatórios!")
+    if not isbn_valido(isbn):
+        raise ErroOperacao(f"ISBN inválido: {isbn} (só números, até {TAMANHO_ISBN} dígitos)")
+    quantidade = _texto(campos, 'quantidade')
+    return isbn, {
+        'título': titulo,
+        'autor': _texto(campos, 'autor'),
+        'gênero': _texto(campos, 'gênero'),
+        'quantidade': quantidade_valida(quantidade) if quantidade else 1,
+    }
+
+
+def _validar_usuario(campos, hoje):
+    id_usuario = _texto(campos, 'id')
+    nome = _texto(campos, 'nome')
+    if not nome or not id_usuario:
+        raise ErroOperacao("Nome e ID são obrigatórios!")
+    tipo = _texto(campos, 'tipo') or 'Aluno'
+    if tipo not in TIPOS_USUARIO:
+        raise ErroOperacao(f"Tipo de usuário inválido: {tipo} (use {', '.join(TIPOS_USUARIO)})")
+    return id_usuario, {
+        'nome': nome,
+        'tipo': tipo,
+        'data_cadastro': _data(campos, 'data_cadastro', "Data de cadastro") or texto_data(hoje),
+        'historico': [],
+    }
+
+
+def _validar_emprestimo(campos, hoje):
+    id_usuario = _texto(campos, 'id_usuario')
+    isbn = _texto(campos, 'isbn_livro')
+    if not id_usuario or not isbn:
+        raise ErroOperacao("Usuário e ISBN do livro são obrigatórios!")
+    data_emprestimo = _data(campos, 'data_emprestimo', "Data de empréstimo")
+    if not data_emprestimo:
+        raise ErroOperacao("Data de empréstimo é obrigatória!")
+    prevista = (_data(campos, 'data_devolucao_prevista', "Data de devolução prevista")
+                or texto_data(ordinal_data(data_emprestimo) + PRAZO_PADRAO))
+    real = _data(campos, 'data_devolucao_real', "Data de devolução")
+    status = _texto(campos, 'status') or ('devolvido' if real else 'ativo')
+    if status not in STATUS_EMPRESTIMO:
+        raise ErroOperacao(f"Status inválido: {status} (use {', '.join(STATUS_EMPRESTIMO)})")
+    multa = _texto(campos, 'multa')
+    try:
+        multa = float(multa) if multa else 0.00
+    except ValueError:
+        raise ErroOperacao("Multa deve ser um número!") from None
+    if multa < 0:
+        raise ErroOperacao("Multa não pode ser negativa!")
+
+    emprestimo = {
+        'id_usuario': id_usuario,
+        'isbn_livro': isbn,
+        'data_emprestimo': data_emprestimo,
+        'data_devolucao_prevista': prevista,
+        'status': status,
+        'multa': multa,
+    }
+    if real:
+        emprestimo['data_devolucao_real'] = real
+    return _texto(campos, 'id') or None, emprestimo
+
+
+def _gravar_livros(repositorio, validos, relatorio):
+    livros = repositorio.livros
+    lote = {}
+    for _, _, isbn, livro in validos:
+        anterior = lote.get(isbn)
+        if anterior is None and isbn in livros:
+            anterior = livros[isbn].como_dict()
+        if anterior is None:
+            lote[isbn] = livro
+            relatorio.novos += 1
+        else:
+            # ISBN repetido soma ao estoque, como no cadastro pela tela
+            anterior['quantidade'] = anterior.get('quantidade', 0) + livro['quantidade']
+            lote[isbn] = anterior
+            relatorio.somados += 1
+    repositorio.gravar_varios('livros', lote.items())
+
+
+def _gravar_usuarios(repositorio, validos, relatorio):
+    usuarios = repositorio.usuarios
+    lote = {}
+    for numero, campos, id_usuario, usuario in validos:
+        if id_usuario in usuarios or id_usuario in lote:
+            relatorio.rejeitar(numero, f"Já existe usuário com ID {id_usuario}!", campos)
+            continue
+        lote[id_usuario] = usuario
+    repositorio.gravar_varios('usuarios', lote.items())
+    relatorio.novos += len(lote)
+
+
+def _gravar_emprestimos(repositorio, validos, relatorio):
+    """Grava empréstimos históricos, sem mexer no estoque dos livros
+
+    Empréstimos sem ID recebem IDs da sequência reservados de uma vez;
+    cada um entra no histórico do usuário, como em ``emprestar``.
+    """
+    usuarios = repositorio.usuarios
+    livros = repositorio.livros
+    emprestimos = repositorio.emprestimos
+    aceitos = []
+    for numero, campos, emp_id, emprestimo in validos:
+        if emprestimo['id_usuario'] not in usuarios:
+            relatorio.rejeitar(numero, f"Usuário não encontrado: {emprestimo['id_usuario']}", campos)
+        elif emprestimo['isbn_livro'] not in livros:
+            relatorio.rejeitar(numero, f"Livro não encontrado: {emprestimo['isbn_livro']}", campos)
+        else:
+            aceitos.append((numero, campos, emp_id, emprestimo))
+
+    sem_id = sum(1 for _, _, emp_id, _ in aceitos if emp_id is None)
+    ids_novos = iter(repositorio.reservar_ids("EMP", sem_id) if sem_id else ())
+    lote = {}
+    historicos = {}
+    for numero, campos, emp_id, emprestimo in aceitos:
+        if emp_id is None:
+            emp_id = next(ids_novos)
+        elif emp_id in emprestimos or emp_id in lote:
+            relatorio.rejeitar(numero, f"Já existe empréstimo com ID {emp_id}!", campos)
+            continue
+        lote[emp_id] = emprestimo
+        historicos.setdefault(emprestimo['id_usuario'], []).append(emp_id)
+    repositorio.gravar_varios('emprestimos', lote.items())
+    relatorio.novos += len(lote)
+
+    for id_usuario, novos in historicos.items():
+        historico = usuarios[id_usuario].get('historico', []) + novos
+        repositorio.atualizar('usuarios', id_usuario, historico=historico)
+
+
+_VALIDAR = {
+    'livros': _validar_livro,
+    'usuarios': _validar_usuario,
+    'emprestimos': _validar_emprestimo,
+}
+_GRAVAR = {
+    'livros': _gravar_livros,
+    'usuarios': _gravar_usuarios,
+    'emprestimos': _gravar_emprestimos,
+}
@@ -0,0 +1,101 @@
+"""Índices secundários mantidos em memória sobre os empréstimos"""
+
+from collections import Counter
+
+
+class IndiceEmprestimos:
+    """Empréstimos por usuário, por ISBN e por status, com contadores de ativos
+
+    É atualizado pelo repositório a cada alteração, de modo que as
+    verificações das telas custam O(1) ou O(k) em vez de percorrer todos
+    os empréstimos. Os dicionários internos guardam os IDs na ordem de
+    inserção.
+    """
+
+    def __init__(self):
+        self.por_usuario = {}
+        self.por_livro = {}
+        self.por_status = {}
+        self.ativos_por_usuario = Counter()
+        self.ativos_por_livro = Counter()
+
+    def reconstruir(self, repositorio):
+        """Recria o índice a partir de todos os empréstimos"""
+        self.por_usuario.clear()
+        self.por_livro.clear()
+        self.por_status.clear()
+        self.ativos_por_usuario.clear()
+        self.ativos_por_livro.clear()
+        for emp_id, emprestimo in repositorio.emprestimos.items():
+            self._adicionar(emp_id, emprestimo)
+
+    def ao_alterar(self, colecao, chave, antigo, novo):
+        if colecao != 'emprestimos':
+            return
+        if antigo is not None:
+            self._retirar(chave, antigo)
+        if novo is not None:
+            self._adicionar(chave, novo)
+
+    def emprestimos_do_usuario(self, id_usuario):
+        """IDs de todos os empréstimos de um usuário"""
+        return list(self.por_usuario.get(str(id_usuario), ()))
+
+    def emprestimos_do_livro(self, isbn):
+        """IDs de todos os empréstimos de um livro"""
+        return list(self.por_livro.get(str(isbn), ()))
+
+    def com_status(self, status):
+        """IDs dos empréstimos com um status ('ativo' ou 'devolvido')"""
+        return list(self.por_status.get(status, ()))
+
+    def ativos_do_usuario(self, id_usuario):
+        """Quantidade de empréstimos ativos de um usuário"""
+        return self.ativos_por_usuario.get(str(id_usuario), 0)
+
+    def ativos_do_livro(self, isbn):
+        """Quantidade de exemplares de um livro emprestados no momento"""
+        return self.ativos_por_livro.get(str(isbn), 0)
+
+    def total_ativos(self):
+        """Quantidade total de empréstimos ativos"""
+        return len(self.por_status.get('ativo', ()))
+
+    def _adicionar(self, emp_id, emprestimo):
+        id_usuario = str(emprestimo.get('id_usuario', ''))
+        isbn = str(emprestimo.get('isbn_livro', ''))
+        status = emprestimo.get('status')
+
+        self.por_usuario.setdefault(id_usuario, {})[emp_id] = None
+        self.por_livro.setdefault(isbn, {})[emp_id] = None
+        self.por_status.setdefault(status, {})[emp_id] = None
+        if status == 'ativo':
+            self.ativos_por_usuario[id_usuario] += 1
+            self.ativos_por_livro[isbn] += 1
+
+    def _retirar(self, emp_id, emprestimo):
+        id_usuario = str(emprestimo.get('id_usuario', ''))
+        isbn = str(emprestimo.get('isbn_livro', ''))
+        status = emprestimo.get('status')
+
+        _descartar(self.por_usuario, id_usuario, emp_id)
+        _descartar(self.por_livro, isbn, emp_id)
+        _descartar(self.por_status, status, emp_id)
+        if status == 'ativo':
+            _decrementar(self.ativos_por_usuario, id_usuario)
+            _decrementar(self.ativos_por_livro, isbn)
+
+
+def _descartar(indice, chave, emp_id):
+    grupo = indice.get(chave)
+    if grupo is None:
+        return
+    grupo.pop(emp_id, None)
+    if not grupo:
+        del indice[chave]
+
+
+def _decrementar(contador, chave):
+    contador[chave] -= 1
+    if contador[chave] <= 0:
+        del contador[chave]
@@ -0,0 +1,85 @@
+"""Leitura incremental dos snapshots JSON"""
+
+import json
+import re
+
+
+# Chave de primeiro nível seguida de ':'; o valor é lido pelo decodificador
+_CHAVE = re.compile(r'[ \t\n\r]*"((?:[^"\\]|\\.)*)"[ \t\n\r]*:[ \t\n\r]*', re.S)
+_ABERTURA = re.compile(r'[ \t\n\r]*\{[ \t\n\r]*(\}?)')
+_SEPARADOR = re.compile(r'[ \t\n\r]*([,}])')
+_FIM = re.compile(r'[ \t\n\r]*\Z')
+_DELIMITADORES = ' \t\n\r,}'
+
+
+def ler_pares_json(caminho, tamanho_bloco=1 << 20):
+    """Percorre os pares ``(chave, valor)`` do objeto JSON de um arquivo
+
+    O arquivo é lido em blocos e cada valor é decodificado assim que
+    está completo, sem manter o texto inteiro em memória. Levanta
+    ``json.JSONDecodeError`` se o conteúdo não for um objeto JSON válido.
+    """
+    decodificador = json.JSONDecoder()
+    with open(caminho, 'r', encoding='utf-8') as f:
+        leitor = _Leitor(f, tamanho_bloco)
+
+        abertura = leitor.casar(_ABERTURA, "esperado um objeto JSON")
+        vazio = abertura.group(1)
+        while not vazio:
+            chave = leitor.casar(_CHAVE, "esperado uma chave").group(1)
+            if '\\' in chave:
+                chave = json.loads(f'"{chave}"')
+            yield chave, leitor.decodificar(decodificador)
+            vazio = leitor.casar(_SEPARADOR, "esperado ',' ou '}'").group(1) == '}'
+
+        leitor.casar(_FIM, "conteúdo após o fim do objeto")
+
+
+class _Leitor:
+    """Janela deslizante sobre o texto do arquivo"""
+
+    def __init__(self, arquivo, tamanho_bloco):
+        self.arquivo = arquivo
+        self.tamanho_bloco = tamanho_bloco
+        self.texto = ''
+        self.posicao = 0
+        self.fim = False
+
+    def ler_mais(self):
+        bloco = self.arquivo.read(self.tamanho_bloco)
+        if not bloco:
+            self.fim = True
+            return
+        # Descartar o que já foi consumido antes de acrescentar
+        self.texto = self.texto[self.posicao:] + bloco
+        self.posicao = 0
+
+    def casar(self, padrao, mensagem):
+        """Casa ``padrao`` na posição atual, lendo mais se faltar texto"""
+        while True:
+            encontrado = padrao.match(self.texto, self.posicao)
+            # Casar até ao fim do bloco pode ser só parte do texto (ex.: espaços)
+            if encontrado and (encontrado.end() < len(self.texto) or self.fim):
+                self.posicao = encontrado.end()
+                return encontrado
+            if self.fim:
+                raise json.JSONDecodeError(mensagem, self.texto, self.posicao)
+            self.ler_mais()
+
+    def decodificar(self, decodificador):
+        """Decodifica o próximo valor, lendo mais blocos se estiver incompleto"""
+        while True:
+            try:
+                valor, fim = decodificador.raw_decode(self.texto, self.posicao)
+            except json.JSONDecodeError:
+                if self.fim:
+                    raise
+                self.ler_mais()
+                continue
+            # Um número cortado no fim do bloco ("2.5" de "2.5e3") também
+            # decodifica: só aceitar quando o próximo caractere o delimita
+            if not self.fim and (fim == len(self.texto) or self.texto[fim] not in _DELIMITADORES):
+                self.ler_mais()
+                continue
+            self.posicao = fim
+            return valor
@@ -0,0 +1,137 @@
+"""Multas por atraso: regras configuráveis e cálculo de todos os empréstimos ativos"""
+
+import os
+from bisect import bisect_right
+from collections import Counter
+from itertools import compress
+
+from .colunas import ATIVO, MASCARA_ATIVOS, numpy
+from .datas import ordinal_hoje
+
+
+# Faixas de atraso, pelo primeiro dia de cada uma
+FAIXAS = (
+    (1, "1 a 7 dias"),
+    (8, "8 a 14 dias"),
+    (15, "15 a 30 dias"),
+    (31, "mais de 30 dias"),
+)
+
+
+class RegrasMulta:
+    """Valor por dia de atraso e dias de tolerância
+
+    Dentro da tolerância não há multa; passada ela, só os dias além da
+    tolerância são cobrados. As regras de sempre são 500 Kz por dia, sem
+    tolerância.
+    """
+
+    def __init__(self, valor_dia=500.00, tolerancia=0):
+        if valor_dia < 0 or tolerancia < 0:
+            raise ValueError("valor por dia e tolerância não podem ser negativos")
+        self.valor_dia = float(valor_dia)
+        self.tolerancia = int(tolerancia)
+
+    @classmethod
+    def do_ambiente(cls):
+        """Regras de ``BIBLIOTECA_MULTA_DIA`` e ``BIBLIOTECA_TOLERANCIA``, ou as de sempre"""
+        return cls(
+            float(os.environ.get('BIBLIOTECA_MULTA_DIA', 500.00)),
+            int(os.environ.get('BIBLIOTECA_TOLERANCIA', 0)),
+        )
+
+    def multa(self, dias_atraso):
+        """Multa de um empréstimo com ``dias_atraso`` dias de atraso"""
+        dias_cobrados = dias_atraso - self.tolerancia
+        if dias_cobrados > 0:
+            return dias_cobrados * self.valor_dia
+        return 0.00
+
+    def descricao(self):
+        """Texto das regras para as mensagens, ex.: '500 Kz por dia de atraso'"""
+        texto = f"{self.valor_dia:g} Kz por dia de atraso"
+        if self.tolerancia:
+            texto += f" ({self.tolerancia} dias de tolerância)"
+        return texto
+
+    def __repr__(self):
+        return f"RegrasMulta(valor_dia={self.valor_dia!r}, tolerancia={self.tolerancia!r})"
+
+
+class ResumoMultas:
+    """Multas de todos os empréstimos ativos em atraso numa data
+
+    ``atrasados`` tem, por empréstimo em atraso, o par (dias de atraso,
+    multa); ``faixas`` tem, por faixa de atraso, o par (empréstimos,
+    total); ``por_usuario`` tem o total de cada usuário com multa.
+    Empréstimos dentro da tolerância contam nas faixas, com multa zero.
+    """
+
+    def __init__(self, hoje, regras, atrasados, faixas, por_usuario):
+        self.hoje = hoje
+        self.regras = regras
+        self.atrasados = atrasados
+        self.faixas = faixas
+        self.por_usuario = por_usuario
+
+    @property
+    def total(self):
+        return sum(self.por_usuario.values(), 0.00)
+
+    def maiores_devedores(self, limite=10):
+        """Pares (id_usuario, total) dos usuários com mais multa"""
+        return Counter(self.por_usuario).most_common(limite)
+
+
+def calcular_multas(colunas, regras=None, hoje=None):
+    """Multas de todos os empréstimos ativos, numa só passagem pelas colunas
+
+    ``colunas`` é a ``ColunasEmprestimos`` do repositório e ``hoje`` um
+    ordinal, o mesmo para todos os empréstimos (o dia corrente por
+    omissão). Os ativos com data prevista anterior a hoje são escolhidos
+    com uma máscara sobre as colunas, em C ou com NumPy; só os atrasados
+    são percorridos em Python.
+    """
+    regras = regras or RegrasMulta()
+    hoje = ordinal_hoje() if hoje is None else hoje
+    if numpy is not None:
+        linhas, dias = _atrasados_numpy(colunas, hoje)
+    else:
+        linhas, dias = _atrasados(colunas, hoje)
+
+    inicios = [inicio for inicio, _ in FAIXAS]
+    contagem = [0] * len(FAIXAS)
+    totais = [0.00] * len(FAIXAS)
+    atrasados = {}
+    por_usuario = Counter()
+    multa = regras.multa
+    for linha, atraso in zip(linhas, dias):
+        valor = multa(atraso)
+        faixa = bisect_right(inicios, atraso) - 1
+        contagem[faixa] += 1
+        totais[faixa] += valor
+        atrasados[colunas.ids[linha]] = (atraso, valor)
+        if valor:
+            por_usuario[colunas.id_usuario(linha)] += valor
+
+    faixas = {nome: (contagem[i], totais[i]) for i, (_, nome) in enumerate(FAIXAS)}
+    return ResumoMultas(hoje, regras, atrasados, faixas, dict(por_usuario))
+
+
+def _atrasados(colunas, hoje):
+    """Linhas dos ativos em atraso e os respetivos dias de atraso"""
+    previstas = colunas.data_prevista
+    mascara = colunas.status.translate(MASCARA_ATIVOS)
+    # Data prevista 0: ausente ou inválida, sem multa
+    linhas = [
+        linha for linha in compress(range(len(previstas)), mascara)
+        if 0 < previstas[linha] < hoje
+    ]
+    return linhas, [hoje - previstas[linha] for linha in linhas]
+
+
+def _atrasados_numpy(colunas, hoje):
+    previstas = numpy.frombuffer(colunas.data_prevista, dtype=numpy.int64)
+    status = numpy.frombuffer(colunas.status, dtype=numpy.uint8)
+    linhas = numpy.flatnonzero((status == ATIVO) & (previstas > 0) & (previstas < hoje))
+    return linhas.tolist(), (hoje - previstas[linhas]).tolist()
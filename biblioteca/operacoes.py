@@ -0,0 +1,185 @@
+"""Operações da biblioteca com as regras de negócio, sem interface
+
+Usadas pelas telas e pela linha de comando: cada operação valida os
+dados, grava numa transação do repositório e devolve o resultado. Uma
+regra violada levanta ``ErroOperacao`` com a mensagem para o usuário,
+sem nada gravado. Uma transação recusada por conflito com outro
+processo ou balcão (``ErroConflito``) é repetida sobre os dados
+atualizados até ``TENTATIVAS_CONFLITO`` vezes.
+"""
+
+import functools
+
+from .datas import ordinal_hoje
+from .multas import RegrasMulta
+from .registros import TipoUsuario, ordinal_data, texto_data
+from .repositorio import ErroConflito
+
+# Empréstimos ativos permitidos por usuário
+LIMITE_EMPRESTIMOS = 3
+# Prazo de devolução sugerido, em dias
+PRAZO_PADRAO = 7
+
+TIPOS_USUARIO = tuple(tipo.value for tipo in TipoUsuario)
+# Dígitos de um ISBN-13
+TAMANHO_ISBN = 13
+# Vezes que uma operação é tentada se outros gravarem os mesmos registros
+TENTATIVAS_CONFLITO = 5
+
+
+class ErroOperacao(Exception):
+    """Operação recusada por uma regra da biblioteca"""
+
+
+def _repetir_em_conflito(operacao):
+    """Repete ``operacao`` enquanto a transação dela for recusada por conflito"""
+    @functools.wraps(operacao)
+    def executar(repositorio, *args, **kwargs):
+        for tentativa in range(TENTATIVAS_CONFLITO):
+            try:
+                return operacao(repositorio, *args, **kwargs)
+            except ErroConflito:
+                if tentativa == TENTATIVAS_CONFLITO - 1:
+                    raise
+    return executar
+
+
+def isbn_valido(isbn):
+    """Se ``isbn`` tem só dígitos, no máximo ``TAMANHO_ISBN``"""
+    return isbn.isdigit() and len(isbn) <= TAMANHO_ISBN
+
+
+def quantidade_valida(valor):
+    """Converte ``valor`` num número de unidades; ErroOperacao se não for inteiro ou for negativo"""
+    try:
+        quantidade = int(valor)
+    except (TypeError, ValueError):
+        raise ErroOperacao("Quantidade deve ser um número!") from None
+    if quantidade < 0:
+        raise ErroOperacao("Quantidade não pode ser negativa!")
+    return quantidade
+
+
+@_repetir_em_conflito
+def cadastrar_livro(repositorio, isbn, titulo, autor='', genero='', quantidade=1, somar=False):
+    """Cadastra um livro; com ``somar``, um ISBN existente ganha ``quantidade`` unidades
+
+    Devolve o registro gravado.
+    """
+    isbn = str(isbn).strip()
+    titulo = str(titulo).strip()
+    if not titulo or not isbn:
+        raise ErroOperacao("Título e ISBN são obrigatórios!")
+    quantidade = quantidade_valida(quantidade)
+
+    with repositorio.transacao():
+        existente = repositorio.livros.get(isbn)
+        if existente is not None:
+            if not somar:
+                raise ErroOperacao(f"Já existe livro com ISBN {isbn}.")
+            return repositorio.atualizar(
+                'livros', isbn, quantidade=existente.get('quantidade', 0) + quantidade
+            )
+        if not isbn_valido(isbn):
+            raise ErroOperacao(f"ISBN inválido: {isbn} (só números, até {TAMANHO_ISBN} dígitos)")
+        repositorio.gravar('livros', isbn, {
+            'título': titulo,
+            'autor': str(autor).strip(),
+            'gênero': str(genero).strip(),
+            'quantidade': quantidade
+        })
+        return repositorio.livros[isbn]
+
+
+@_repetir_em_conflito
+def cadastrar_usuario(repositorio, id_usuario, nome, tipo='Aluno', hoje=None):
+    """Cadastra um usuário com histórico vazio; devolve o registro gravado"""
+    id_usuario = str(id_usuario).strip()
+    nome = str(nome).strip()
+    if not nome or not id_usuario:
+        raise ErroOperacao("Nome e ID são obrigatórios!")
+    if tipo not in TIPOS_USUARIO:
+        raise ErroOperacao(f"Tipo de usuário inválido: {tipo} (use {', '.join(TIPOS_USUARIO)})")
+
+    with repositorio.transacao():
+        if id_usuario in repositorio.usuarios:
+            raise ErroOperacao(f"Já existe usuário com ID {id_usuario}!")
+        repositorio.gravar('usuarios', id_usuario, {
+            'nome': nome,
+            'tipo': tipo,
+            'data_cadastro': texto_data(ordinal_hoje() if hoje is None else hoje),
+            'historico': []
+        })
+        return repositorio.usuarios[id_usuario]
+
+
+@_repetir_em_conflito
+def emprestar(repositorio, id_usuario, isbn, prazo_dias=PRAZO_PADRAO, hoje=None):
+    """Empresta um exemplar; devolve o par (emp_id, registro do empréstimo)
+
+    Baixa uma unidade do livro e acrescenta o empréstimo ao histórico do
+    usuário, tudo na mesma transação.
+    """
+    try:
+        prazo_dias = int(prazo_dias)
+    except (TypeError, ValueError):
+        raise ErroOperacao("Prazo deve ser um número!") from None
+    if prazo_dias <= 0:
+        raise ErroOperacao("Prazo deve ser maior que zero!")
+
+    with repositorio.transacao():
+        if id_usuario not in repositorio.usuarios:
+            raise ErroOperacao("Usuário não encontrado!")
+        livro = repositorio.livros.get(isbn)
+        if livro is None:
+            raise ErroOperacao("Livro não encontrado!")
+        if livro.get('quantidade', 0) <= 0:
+            raise ErroOperacao("Livro não disponível!")
+        ativos = repositorio.indice_emprestimos.ativos_do_usuario(id_usuario)
+        if ativos >= LIMITE_EMPRESTIMOS:
+            raise ErroOperacao(f"Usuário já tem {ativos} empréstimos ativos!")
+
+        hoje = ordinal_hoje() if hoje is None else hoje
+        emp_id = repositorio.proximo_id("EMP")
+        repositorio.gravar('emprestimos', emp_id, {
+            'id_usuario': id_usuario,
+            'isbn_livro': isbn,
+            'data_emprestimo': texto_data(hoje),
+            'data_devolucao_prevista': texto_data(hoje + prazo_dias),
+            'status': 'ativo',
+            'multa': 0.00
+        })
+        repositorio.atualizar('livros', isbn, quantidade=livro.get('quantidade', 0) - 1)
+        historico = repositorio.usuarios[id_usuario].get('historico', []) + [emp_id]
+        repositorio.atualizar('usuarios', id_usuario, historico=historico)
+        return emp_id, repositorio.emprestimos[emp_id]
+
+
+@_repetir_em_conflito
+def devolver(repositorio, emp_id, regras=None, hoje=None):
+    """Regista a devolução com a multa do atraso; devolve o valor da multa"""
+    regras = regras or RegrasMulta()
+    with repositorio.transacao():
+        emprestimo = repositorio.emprestimos.get(emp_id)
+        if emprestimo is None:
+            raise ErroOperacao("Empréstimo não encontrado!")
+        if emprestimo.get('status') == 'devolvido':
+            raise ErroOperacao("Este empréstimo já foi devolvido!")
+
+        hoje = ordinal_hoje() if hoje is None else hoje
+        prevista = ordinal_data(emprestimo.get('data_devolucao_prevista', ''))
+        multa = regras.multa(hoje - prevista) if type(prevista) is int else 0.00
+        repositorio.atualizar(
+            'emprestimos', emp_id,
+            status='devolvido',
+            data_devolucao_real=texto_data(hoje),
+            multa=multa
+        )
+        isbn = emprestimo.get('isbn_livro', '')
+        if isbn in repositorio.livros:
+            repositorio.atualizar(
+                'livros', isbn,
+                quantidade=repositorio.livros[isbn].get('quantidade', 0) + 1
+            )
+        return multa
+
@@ -0,0 +1,278 @@
+"""Registros compactos de livros, usuários e empréstimos
+
+Cada registro é um objeto com ``__slots__`` em vez de um dicionário:
+não guarda as chaves por registro, os valores repetidos (status, tipo de
+usuário) são membros de enumerações partilhados, os IDs referenciados
+são strings internadas e as datas ficam como ordinais (``date.toordinal``).
+
+Para o código das telas nada muda: cada registro é um ``Mapping`` de
+leitura com as chaves e valores de sempre (``emp['status'] == 'ativo'``,
+``emp.get('data_emprestimo')`` devolve ``'2024-03-01'``). Os atributos
+dão acesso à forma compacta (``emp.status is StatusEmprestimo.ATIVO``,
+``emp.data_emprestimo`` é um inteiro). Para alterar, copia-se com
+``dict(registro)`` e grava-se o dicionário, como antes.
+"""
+
+import sys
+from collections.abc import Mapping
+from datetime import date
+from enum import Enum
+
+
+class StatusEmprestimo(Enum):
+    ATIVO = 'ativo'
+    DEVOLVIDO = 'devolvido'
+
+
+class TipoUsuario(Enum):
+    ALUNO = 'Aluno'
+    PROFESSOR = 'Professor'
+    FUNCIONARIO = 'Funcionário'
+    VISITANTE = 'Visitante'
+
+
+# Caches das conversões de datas: poucas datas distintas, muitos registros
+_ORDINAIS = {}
+_DATAS = {}
+
+
+def ordinal_data(texto):
+    """Ordinal de uma data 'AAAA-MM-DD'; outros valores ficam como estão"""
+    if type(texto) is not str:
+        return texto
+    ordinal = _ORDINAIS.get(texto)
+    if ordinal is None:
+        try:
+            dia = date.fromisoformat(texto)
+        except ValueError:
+            return texto
+        # fromisoformat aceita outras grafias ('20240301'): só converter
+        # o que volta igual, para não alterar o que foi gravado
+        if dia.isoformat() != texto:
+            return texto
+        ordinal = _ORDINAIS[texto] = dia.toordinal()
+        _DATAS[ordinal] = sys.intern(texto)
+    return ordinal
+
+
+def texto_data(ordinal):
+    """Inverso de ``ordinal_data``"""
+    if type(ordinal) is not int:
+        return ordinal
+    texto = _DATAS.get(ordinal)
+    if texto is None:
+        texto = _DATAS[ordinal] = date.fromordinal(ordinal).isoformat()
+        _ORDINAIS[texto] = ordinal
+    return texto
+
+
+def _identidade(valor):
+    return valor
+
+
+def _internar(valor):
+    return sys.intern(valor) if type(valor) is str else valor
+
+
+def _codec_enum(enumeracao):
+    membros = {membro.value: membro for membro in enumeracao}
+
+    def codificar(valor):
+        # Valores fora da enumeração são mantidos (internados) sem erro
+        if type(valor) is not str:
+            return valor
+        return membros.get(valor) or sys.intern(valor)
+
+    def decodificar(valor):
+        return valor.value if type(valor) is enumeracao else valor
+
+    return codificar, decodificar
+
+
+_TEXTO = (_identidade, _identidade)
+_AUSENTE = object()
+_REFERENCIA = (_internar, _identidade)
+_DATA = (ordinal_data, texto_data)
+
+
+class Registro(Mapping):
+    """Base dos registros: mapeamento só de leitura sobre ``__slots__``
+
+    Subclasses definem ``CAMPOS``, tuplas ``(chave, atributo, (codificar,
+    decodificar))`` na ordem em que as chaves são percorridas. Um campo
+    ausente é um slot não atribuído; chaves desconhecidas ficam em
+    ``_extras``, para nada se perder ao regravar.
+    """
+
+    __slots__ = ('_extras',)
+    CAMPOS = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._por_chave = {chave: (atributo, codec) for chave, atributo, codec in cls.CAMPOS}
+        cls._definir = tuple(
+            (chave, atributo, None if codec is _TEXTO else codec[0])
+            for chave, atributo, codec in cls.CAMPOS
+        )
+        cls._planos = {}
+        cls._ler = tuple(
+            (chave, cls.__dict__[atributo].__get__, None if codec is _TEXTO else codec[1])
+            for chave, atributo, codec in cls.CAMPOS
+        )
+
+    def __init__(self, dados=()):
+        if type(dados) is not dict:
+            dados = dict(dados)
+        campos = tuple(dados)
+        plano = self._planos.get(campos)
+        if plano is None:
+            plano = self._planejar(campos)
+        conversoes, extras = plano
+        if extras:
+            self._extras = {chave: dados[chave] for chave in extras}
+            dados = {chave: valor for chave, valor in dados.items() if chave not in self._extras}
+        else:
+            self._extras = None
+        for (atributo, codificar), valor in zip(conversoes, dados.values()):
+            setattr(self, atributo, valor if codificar is None else codificar(valor))
+
+    @classmethod
+    def _planejar(cls, campos):
+        """Atributo e conversão das chaves conhecidas, na ordem de ``campos``
+
+        Os registros de uma coleção têm quase sempre as mesmas chaves: o
+        plano é calculado uma vez por combinação e reutilizado.
+        """
+        definicoes = {chave: (atributo, codificar) for chave, atributo, codificar in cls._definir}
+        plano = (
+            tuple(definicoes[chave] for chave in campos if chave in definicoes),
+            tuple(chave for chave in campos if chave not in definicoes),
+        )
+        if len(cls._planos) < 64:
+            cls._planos[campos] = plano
+        return plano
+
+    def como_dict(self):
+        """Dicionário com as chaves e valores de sempre"""
+        dados = {}
+        for chave, ler, decodificar in self._ler:
+            try:
+                valor = ler(self)
+            except AttributeError:
+                continue
+            dados[chave] = valor if decodificar is None else decodificar(valor)
+        if self._extras is not None:
+            dados.update(self._extras)
+        return dados
+
+    def keys(self):
+        return self.como_dict().keys()
+
+    def items(self):
+        return self.como_dict().items()
+
+    def values(self):
+        return self.como_dict().values()
+
+    def __getitem__(self, chave):
+        campo = self._por_chave.get(chave)
+        if campo is None:
+            if self._extras is None:
+                raise KeyError(chave)
+            return self._extras[chave]
+        atributo, (_, decodificar) = campo
+        try:
+            return decodificar(getattr(self, atributo))
+        except AttributeError:
+            raise KeyError(chave) from None
+
+    def get(self, chave, padrao=None):
+        campo = self._por_chave.get(chave)
+        if campo is None:
+            return padrao if self._extras is None else self._extras.get(chave, padrao)
+        atributo, (_, decodificar) = campo
+        try:
+            return decodificar(getattr(self, atributo))
+        except AttributeError:
+            return padrao
+
+    def __contains__(self, chave):
+        campo = self._por_chave.get(chave)
+        if campo is None:
+            return self._extras is not None and chave in self._extras
+        return hasattr(self, campo[0])
+
+    def __iter__(self):
+        for chave, atributo, _ in self.CAMPOS:
+            if hasattr(self, atributo):
+                yield chave
+        if self._extras is not None:
+            yield from self._extras
+
+    def __len__(self):
+        total = sum(1 for _, atributo, _ in self.CAMPOS if hasattr(self, atributo))
+        return total + (len(self._extras) if self._extras is not None else 0)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.como_dict()!r})"
+
+
+class Livro(Registro):
+    __slots__ = ('titulo', 'autor', 'genero', 'quantidade')
+    CAMPOS = (
+        ('título', 'titulo', _TEXTO),
+        ('autor', 'autor', _TEXTO),
+        ('gênero', 'genero', _REFERENCIA),
+        ('quantidade', 'quantidade', _TEXTO),
+    )
+
+
+class Usuario(Registro):
+    __slots__ = ('nome', 'tipo', 'data_cadastro', 'historico')
+    CAMPOS = (
+        ('nome', 'nome', _TEXTO),
+        ('tipo', 'tipo', _codec_enum(TipoUsuario)),
+        ('data_cadastro', 'data_cadastro', _DATA),
+        ('historico', 'historico', _TEXTO),
+    )
+
+
+class Emprestimo(Registro):
+    __slots__ = (
+        'id_usuario', 'isbn_livro', 'data_emprestimo', 'data_devolucao_prevista',
+        'data_devolucao_real', 'status', 'multa',
+    )
+    CAMPOS = (
+        ('id_usuario', 'id_usuario', _REFERENCIA),
+        ('isbn_livro', 'isbn_livro', _REFERENCIA),
+        ('data_emprestimo', 'data_emprestimo', _DATA),
+        ('data_devolucao_prevista', 'data_devolucao_prevista', _DATA),
+        ('data_devolucao_real', 'data_devolucao_real', _DATA),
+        ('status', 'status', _codec_enum(StatusEmprestimo)),
+        ('multa', 'multa', _TEXTO),
+    )
+
+
+TIPOS_REGISTRO = {
+    'livros': Livro,
+    'usuarios': Usuario,
+    'emprestimos': Emprestimo,
+}
+
+
+def como_registro(colecao, dados):
+    """Converte um dicionário no registro compacto da coleção"""
+    tipo = TIPOS_REGISTRO[colecao]
+    if type(dados) is tipo:
+        return dados
+    return tipo(dados)
+
+
+def para_json(registro):
+    """``default`` de ``json.dump``: registros compactos viram dicionários
+
+    Mais rápido que ``default=dict``, que lê as chaves uma a uma.
+    """
+    if isinstance(registro, Registro):
+        return registro.como_dict()
+    raise TypeError(f"{type(registro).__name__} não é serializável em JSON")
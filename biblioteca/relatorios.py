@@ -0,0 +1,183 @@
+"""Dados dos relatórios, como dicionários e listas prontos para JSON
+
+A apresentação fica com quem chama: as telas montam as mensagens e a
+linha de comando imprime texto ou JSON a partir dos mesmos valores.
+"""
+
+from collections import Counter
+
+from .datas import DEVOLUCAO, ordinal_hoje
+from .multas import RegrasMulta, calcular_multas
+from .registros import texto_data
+
+# Relatórios de ``gerar``
+NOMES = ('completo', 'acervo', 'mais-emprestados', 'usuarios-ativos',
+         'emprestados', 'multas', 'atrasos', 'movimentacao')
+
+
+def mais_emprestados(repositorio, limite=10):
+    """Livros mais emprestados, com título, autor e total de empréstimos"""
+    # Contagem sobre a coluna de livros, sem percorrer os registros
+    contagem = repositorio.colunas_emprestimos.mais_emprestados(limite + 1)
+    contagem = [(isbn, total) for isbn, total in contagem if isbn][:limite]
+    resultado = []
+    for isbn, total in contagem:
+        livro = repositorio.livros.get(isbn, {})
+        resultado.append({
+            'isbn': isbn,
+            'título': livro.get('título', 'Desconhecido'),
+            'autor': livro.get('autor', 'Desconhecido'),
+            'emprestimos': total
+        })
+    return resultado
+
+
+def situacao_acervo(repositorio):
+    """Unidades, títulos, unidades por gênero e empréstimos ativos"""
+    generos = Counter()
+    for livro in repositorio.livros.values():
+        generos[livro.get('gênero', 'Sem Gênero')] += livro.get('quantidade', 0)
+    return {
+        'unidades': sum(generos.values()),
+        'titulos': len(repositorio.livros),
+        'emprestados': repositorio.colunas_emprestimos.contar_status()['ativo'],
+        'generos': dict(generos.most_common()),
+    }
+
+
+def resumo_geral(repositorio):
+    """Totais do acervo, dos usuários (por tipo) e dos empréstimos"""
+    total = len(repositorio.emprestimos)
+    ativos = repositorio.colunas_emprestimos.contar_status()['ativo']
+    tipos = Counter(usuario.get('tipo', 'Desconhecido') for usuario in repositorio.usuarios.values())
+    return {
+        'livros': {
+            'unidades': sum(livro.get('quantidade', 0) for livro in repositorio.livros.values()),
+            'titulos': len(repositorio.livros),
+        },
+        'usuarios': {
+            'total': len(repositorio.usuarios),
+            'por_tipo': dict(tipos.most_common()),
+        },
+        'emprestimos': {
+            'total': total,
+            'ativos': ativos,
+            'devolvidos': total - ativos,
+            'taxa_devolucao': (total - ativos) / total * 100 if total else 0.0,
+        },
+    }
+
+
+def usuarios_ativos(repositorio):
+    """Usuários com empréstimos ativos e quantos têm cada um"""
+    ativos = repositorio.colunas_emprestimos.ativos_por_usuario()
+    ativos.pop('', None)
+    resultado = []
+    for id_usuario, quantidade in ativos.items():
+        usuario = repositorio.usuarios.get(id_usuario, {})
+        resultado.append({
+            'id': id_usuario,
+            'nome': usuario.get('nome', 'Desconhecido'),
+            'tipo': usuario.get('tipo', 'Desconhecido'),
+            'emprestimos_ativos': quantidade
+        })
+    return resultado
+
+
+def livros_emprestados(repositorio):
+    """Empréstimos ativos com o livro, o usuário e as datas"""
+    resultado = []
+    for emp_id in repositorio.indice_emprestimos.com_status('ativo'):
+        emprestimo = repositorio.emprestimos[emp_id]
+        resultado.append(_descrever(repositorio, emp_id, emprestimo))
+    return resultado
+
+
+def multas(repositorio, regras=None, hoje=None, limite=10):
+    """Multas pendentes: totais, faixas de atraso e maiores devedores"""
+    resumo = calcular_multas(repositorio.colunas_emprestimos, regras, hoje)
+    return {
+        'data': texto_data(resumo.hoje),
+        'regras': {'valor_dia': resumo.regras.valor_dia, 'tolerancia': resumo.regras.tolerancia},
+        'atrasados': len(resumo.atrasados),
+        'total': resumo.total,
+        'faixas': {
+            faixa: {'emprestimos': quantidade, 'total': total}
+            for faixa, (quantidade, total) in resumo.faixas.items()
+        },
+        'devedores': [
+            {'id': id_usuario,
+             'nome': repositorio.usuarios.get(id_usuario, {}).get('nome', 'Desconhecido'),
+             'total': total}
+            for id_usuario, total in resumo.maiores_devedores(limite)
+        ],
+    }
+
+
+def atrasos(repositorio, regras=None, hoje=None):
+    """Empréstimos em atraso, do mais antigo, com dias de atraso e multa"""
+    regras = regras or RegrasMulta()
+    hoje = ordinal_hoje() if hoje is None else hoje
+    resultado = []
+    for prevista, emp_id in repositorio.vencimentos.atrasados(hoje):
+        linha = _descrever(repositorio, emp_id, repositorio.emprestimos[emp_id])
+        linha['dias_atraso'] = hoje - prevista
+        linha['multa'] = regras.multa(hoje - prevista)
+        resultado.append(linha)
+    return resultado
+
+
+def movimentacao(repositorio, limite_dias=30, hoje=None):
+    """Empréstimos e devoluções dos últimos dias (todos com None), do mais recente"""
+    hoje = ordinal_hoje() if hoje is None else hoje
+    inicio = None if limite_dias is None else hoje - limite_dias + 1
+    resultado = []
+    for ordinal, emp_id, tipo in repositorio.indice_datas.eventos.recentes(inicio):
+        emprestimo = repositorio.emprestimos.get(emp_id, {})
+        resultado.append({
+            'data': texto_data(ordinal),
+            'tipo': 'DEVOLUÇÃO' if tipo == DEVOLUCAO else 'EMPRÉSTIMO',
+            'emprestimo': emp_id,
+            'id_usuario': emprestimo.get('id_usuario', ''),
+            'isbn': emprestimo.get('isbn_livro', ''),
+        })
+    return resultado
+
+
+def gerar(repositorio, nome, regras=None, dias=None, limite=10):
+    """Dados do relatório ``nome`` (um de ``NOMES``), como na linha de comando
+
+    ``dias`` só vale para a movimentação (None = todo o histórico) e
+    ``limite`` para os mais emprestados e as multas.
+    """
+    if nome == 'completo':
+        return resumo_geral(repositorio)
+    if nome == 'acervo':
+        return situacao_acervo(repositorio)
+    if nome == 'mais-emprestados':
+        return mais_emprestados(repositorio, limite)
+    if nome == 'usuarios-ativos':
+        return usuarios_ativos(repositorio)
+    if nome == 'emprestados':
+        return livros_emprestados(repositorio)
+    if nome == 'multas':
+        return multas(repositorio, regras, limite=limite)
+    if nome == 'atrasos':
+        return atrasos(repositorio, regras)
+    if nome == 'movimentacao':
+        return movimentacao(repositorio, dias)
+    raise KeyError(f"Relatório desconhecido: {nome}")
+
+
+def _descrever(repositorio, emp_id, emprestimo):
+    usuario = repositorio.usuarios.get(emprestimo.get('id_usuario', ''), {})
+    livro = repositorio.livros.get(emprestimo.get('isbn_livro', ''), {})
+    return {
+        'emprestimo': emp_id,
+        'id_usuario': emprestimo.get('id_usuario', ''),
+        'usuario': usuario.get('nome', 'Desconhecido'),
+        'isbn': emprestimo.get('isbn_livro', ''),
+        'livro': livro.get('título', 'Desconhecido'),
+        'data_emprestimo': emprestimo.get('data_emprestimo', ''),
+        'data_devolucao_prevista': emprestimo.get('data_devolucao_prevista', ''),
+    }
@@ -0,0 +1,199 @@
+"""Repositório remoto: os dados de um servidor ``biblioteca.servidor``
+
+Com ``BIBLIOTECA_BACKEND=remoto`` as telas e a linha de comando usam
+o servidor em ``BIBLIOTECA_SERVIDOR`` (``http://127.0.0.1:8765`` por
+omissão) em vez dos arquivos locais. As coleções são copiadas para a
+memória na carga, como nos outros backends, e as telas continuam a
+ler os dicionários e os índices locais.
+
+Cada transação é confirmada pelo servidor antes de terminar: vai com os
+registros como estavam quando foram lidos e o servidor só a grava se
+ninguém os tiver alterado entretanto. Caso contrário levanta
+``ErroConflito`` e a transação é desfeita, como qualquer falha de
+gravação; a seguinte já parte dos dados atualizados. ``sincronizar``
+traz as transações dos outros balcões e é chamado no início de cada
+transação; a interface fá-lo também periodicamente, com a consulta ao
+servidor numa thread (``buscar_alteracoes``) e a aplicação na sua
+(``aplicar_alteracoes``).
+"""
+
+import http.client
+import json
+import threading
+from contextlib import contextmanager
+from http import HTTPStatus
+from urllib.parse import quote, urlsplit
+
+from .registros import para_json
+from .repositorio import COLECOES, ErroConflito, ErroPersistencia, Repositorio
+
+SERVIDOR_PADRAO = 'http://127.0.0.1:8765'
+# Segundos à espera de uma resposta do servidor
+TEMPO_LIMITE = 30
+
+
+class ClienteHTTP:
+    """Pedidos JSON a um servidor da biblioteca, com uma ligação aberta por thread"""
+
+    def __init__(self, url=SERVIDOR_PADRAO, tempo_limite=TEMPO_LIMITE):
+        partes = urlsplit(url)
+        if partes.scheme != 'http' or not partes.hostname:
+            raise ValueError(f"Endereço de servidor inválido: {url}")
+        self.url = url.rstrip('/')
+        self.endereco = partes.hostname
+        self.porta = partes.port or 80
+        self.tempo_limite = tempo_limite
+        self._locais = threading.local()
+
+    def pedir(self, metodo, caminho, dados=None):
+        """Par (código HTTP, resposta JSON); ``ErroPersistencia`` se o servidor não responder"""
+        corpo = None
+        cabecalhos = {}
+        if dados is not None:
+            corpo = json.dumps(dados, ensure_ascii=False, default=para_json).encode('utf-8')
+            cabecalhos['Content-Type'] = 'application/json'
+        while True:
+            conexao = getattr(self._locais, 'conexao', None)
+            reutilizada = conexao is not None
+            if conexao is None:
+                conexao = http.client.HTTPConnection(self.endereco, self.porta, timeout=self.tempo_limite)
+                self._locais.conexao = conexao
+            try:
+                conexao.request(metodo, caminho, corpo, cabecalhos)
+                resposta = conexao.getresponse()
+                conteudo = resposta.read()
+                break
+            except (http.client.HTTPException, OSError) as e:
+                self.fechar()
+                # Uma ligação parada pode ter sido fechada do outro lado: tentar numa nova
+                if not reutilizada:
+                    raise ErroPersistencia(f"Servidor {self.url} indisponível: {e}") from e
+        try:
+            return resposta.status, json.loads(conteudo)
+        except ValueError as e:
+            raise ErroPersistencia(f"Resposta inválida de {self.url}: {e}") from e
+
+    def fechar(self):
+        """Fecha a ligação da thread atual"""
+        conexao = getattr(self._locais, 'conexao', None)
+        self._locais.conexao = None
+        if conexao is not None:
+            conexao.close()
+
+
+class RepositorioRemoto(Repositorio):
+    """Repositório sobre um servidor HTTP, para vários balcões partilharem os dados"""
+
+    GRAVACAO_LOCAL = False
+
+    def __init__(self, url=SERVIDOR_PADRAO, tempo_limite=TEMPO_LIMITE):
+        super().__init__()
+        self.cliente = ClienteHTTP(url, tempo_limite)
+        self.url = self.cliente.url
+        # Arranque do servidor e última versão dele já aplicada aqui
+        self.instancia = None
+        self.versao_servidor = 0
+
+    def carregar(self, progresso=None):
+        estado = self._pedir('GET', '/estado')
+        super().carregar(progresso)
+        self.instancia = estado['instancia']
+        self.versao_servidor = estado['versao']
+        # As coleções podem já trazer parte destas alterações: reaplicá-las não muda nada
+        self.sincronizar()
+
+    def sincronizar(self):
+        """Traz e aplica as transações confirmadas no servidor desde a última vez
+
+        Devolve quantos registros mudaram.
+        """
+        with self.trava:
+            if self._pendentes is not None:
+                # No meio de uma transação: fica para a próxima
+                return 0
+            return self.aplicar_alteracoes(self.buscar_alteracoes())
+
+    def buscar_alteracoes(self):
+        """Pede ao servidor as transações novas, sem tocar nos dados
+
+        Pode correr noutra thread; o resultado vai para
+        ``aplicar_alteracoes``. None se o servidor já não tiver o
+        histórico desde a última versão aplicada.
+        """
+        estado, resposta = self.cliente.pedir('GET', f"/alteracoes?desde={self.versao_servidor}")
+        if estado == HTTPStatus.GONE:
+            return None
+        self._verificar(estado, resposta)
+        return resposta
+
+    def aplicar_alteracoes(self, resposta):
+        """Aplica um resultado de ``buscar_alteracoes``; devolve quantos registros mudaram
+
+        Sem histórico suficiente, ou se o servidor foi reiniciado, os
+        dados são recarregados por inteiro. Um resultado mais antigo que
+        a versão já aplicada é ignorado.
+        """
+        with self.trava:
+            if self._pendentes is not None:
+                return 0
+            if resposta is None or resposta['instancia'] != self.instancia:
+                self.carregar()
+                return sum(len(self.colecao(nome)) for nome in COLECOES)
+            if resposta['versao'] <= self.versao_servidor:
+                return 0
+            alterados = 0
+            for colecao, chave, registro in resposta['alteracoes']:
+                alterados += self._aplicar(colecao, chave, registro)
+            self.versao_servidor = resposta['versao']
+            return alterados
+
+    @contextmanager
+    def transacao(self):
+        if self._pendentes is None:
+            # Partir dos dados mais recentes: menos conflitos ao confirmar
+            self.sincronizar()
+        with super().transacao():
+            yield
+
+    def reservar_ids(self, prefixo, quantidade, colecao='emprestimos'):
+        resposta = self._pedir('POST', '/ids', {
+            'prefixo': prefixo, 'quantidade': quantidade, 'colecao': colecao,
+        })
+        return resposta['ids']
+
+    def fechar(self):
+        super().fechar()
+        self.cliente.fechar()
+
+    def _ler_colecao(self, nome):
+        yield from self._pedir('GET', f"/colecoes/{quote(nome)}").items()
+
+    def _escrever(self, alteracoes):
+        # Chamado dentro da transação: os valores lidos ainda estão nos pendentes
+        lidos = {}
+        for colecao, chave, antigo in self._pendentes:
+            lidos.setdefault((colecao, chave), antigo)
+        estado, resposta = self.cliente.pedir('POST', '/transacoes', {'alteracoes': [
+            [colecao, chave, lidos[(colecao, chave)], registro]
+            for colecao, chave, registro in alteracoes
+        ]})
+        if estado == HTTPStatus.CONFLICT:
+            raise ErroConflito(
+                "Os dados foram alterados noutro balcão e nada foi gravado. "
+                "Tente de novo: a próxima tentativa já parte dos dados atualizados."
+            )
+        self._verificar(estado, resposta)
+
+    def _salvar_colecoes(self, nomes):
+        # Os arquivos são do servidor, que os grava por conta própria
+        pass
+
+    def _pedir(self, metodo, caminho, dados=None):
+        estado, resposta = self.cliente.pedir(metodo, caminho, dados)
+        self._verificar(estado, resposta)
+        return resposta
+
+    def _verificar(self, estado, resposta):
+        if estado >= 400:
+            erro = resposta.get('erro', estado) if isinstance(resposta, dict) else estado
+            raise ErroPersistencia(f"Servidor {self.url}: {erro}")
@@ -0,0 +1,955 @@
+"""Repositórios de dados da Biblioteca ISCAT (JSON e SQLite)"""
+
+import gc
+import json
+import os
+import sqlite3
+import struct
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+
+from .arquivos import bloquear_arquivo, escrever_atomicamente, substituir_arquivo
+from .binario import ler_binario, salvar_binario
+from .busca import IndiceBusca
+from .colunas import ColunasEmprestimos
+from .datas import IndiceDatas
+from .diario import Diario
+from .estatisticas import EstatisticasAcervo
+from .indices import IndiceEmprestimos
+from .leitura import ler_pares_json
+from .registros import como_registro, para_json
+from .sequencias import SequenciasJSON, formatar_id, maior_numero
+from .vencimentos import FilaVencimentos
+
+
+COLECOES = ('livros', 'usuarios', 'emprestimos')
+
+# De quantos em quantos registros lidos o progresso da carga é informado
+PASSO_PROGRESSO = 5000
+
+
+class ErroPersistencia(Exception):
+    """Falha ao ler ou gravar dados no armazenamento"""
+
+
+class ErroConflito(ErroPersistencia):
+    """Transação recusada: outro processo ou balcão alterou os mesmos registros"""
+
+
+class Repositorio:
+    """Base dos repositórios: coleções em memória e gravação por registro
+
+    As telas continuam a ler ``livros``, ``usuarios`` e ``emprestimos``
+    como dicionários (os registros de ``biblioteca.registros`` leem-se
+    como dicionários); toda alteração passa por ``gravar``/``remover`` para
+    que o backend persista apenas os registros modificados e os
+    observadores (índices, estatísticas) se mantenham sincronizados.
+    """
+
+    # False quando cada transação tem de ser confirmada antes de terminar
+    # (ex.: por um servidor): nesse caso não se usa GravadorAssincrono
+    GRAVACAO_LOCAL = True
+
+    def __init__(self):
+        self.livros = {}
+        self.usuarios = {}
+        self.emprestimos = {}
+        self._pendentes = None
+        # Blocos ``em_massa`` abertos: enquanto houver algum, os observadores
+        # só são avisados no fim
+        self._em_massa = 0
+        self._coletor_ativo = False
+        # Transações da interface e cópias feitas pelo gravador não se cruzam
+        self.trava = threading.RLock()
+        # GravadorAssincrono opcional; sem ele cada transação grava na hora
+        self.gravador = None
+        self.observadores = []
+        # Funções chamadas com as alterações de cada transação confirmada
+        self.assinantes = []
+        # Incrementadas a cada alteração, para invalidar caches
+        self.versoes = dict.fromkeys(COLECOES, 0)
+        # Duração de cada etapa da última carga, em segundos
+        self.tempos_carga = {}
+
+        self.indice_emprestimos = IndiceEmprestimos()
+        self.registrar_observador(self.indice_emprestimos)
+        self.indice_busca = IndiceBusca()
+        self.registrar_observador(self.indice_busca)
+        self.estatisticas = EstatisticasAcervo()
+        self.registrar_observador(self.estatisticas)
+        self.colunas_emprestimos = ColunasEmprestimos()
+        self.registrar_observador(self.colunas_emprestimos)
+        self.indice_datas = IndiceDatas()
+        self.registrar_observador(self.indice_datas)
+        self.vencimentos = FilaVencimentos()
+        self.registrar_observador(self.vencimentos)
+
+    def registrar_observador(self, observador):
+        """Regista um objeto com ``reconstruir(repo)`` e ``ao_alterar(...)``"""
+        self.observadores.append(observador)
+        observador.reconstruir(self)
+
+    def colecao(self, nome):
+        """Retorna o dicionário de uma coleção pelo nome"""
+        if nome not in COLECOES:
+            raise KeyError(f"Coleção desconhecida: {nome}")
+        return getattr(self, nome)
+
+    def carregar(self, progresso=None):
+        """Carrega todas as coleções do armazenamento
+
+        Os registros são lidos um a um, sem carregar arquivos inteiros de
+        uma vez. ``progresso(etapa, registros)``, se indicado, é chamado
+        a cada ``PASSO_PROGRESSO`` registros e no início da reconstrução
+        dos índices (etapa ``'indices'``). As durações ficam em
+        ``tempos_carga``.
+        """
+        inicio = time.perf_counter()
+        self.tempos_carga = {}
+        for nome in COLECOES:
+            comeco = time.perf_counter()
+            dados = self.colecao(nome)
+            dados.clear()
+            for chave, registro in self._ler_colecao(nome):
+                dados[chave] = como_registro(nome, registro)
+                if progresso is not None and len(dados) % PASSO_PROGRESSO == 0:
+                    progresso(nome, len(dados))
+            self.tempos_carga[nome] = time.perf_counter() - comeco
+
+        comeco = time.perf_counter()
+        self._recuperar()
+        self.tempos_carga['diario'] = time.perf_counter() - comeco
+
+        for nome in COLECOES:
+            self.versoes[nome] += 1
+
+        comeco = time.perf_counter()
+        if progresso is not None:
+            progresso('indices', sum(len(self.colecao(nome)) for nome in COLECOES))
+        for observador in self.observadores:
+            observador.reconstruir(self)
+        self.tempos_carga['indices'] = time.perf_counter() - comeco
+        self.tempos_carga['total'] = time.perf_counter() - inicio
+
+    @contextmanager
+    def transacao(self):
+        """Agrupa alterações: todas são gravadas juntas ou desfeitas"""
+        if self._pendentes is not None:
+            # Transação aninhada junta-se à externa
+            yield
+            return
+
+        self.trava.acquire()
+        self._pendentes = []
+        try:
+            yield
+            if self._pendentes:
+                alteracoes = self._alteracoes_pendentes()
+                if self.gravador is not None:
+                    self.gravador.enfileirar(alteracoes)
+                else:
+                    self._escrever(alteracoes)
+                for assinante in self.assinantes:
+                    assinante(alteracoes)
+        except BaseException:
+            self._desfazer()
+            raise
+        finally:
+            self._pendentes = None
+            self.trava.release()
+
+    @contextmanager
+    def em_massa(self):
+        """Agrupa uma carga grande: os observadores são reconstruídos uma vez, no fim
+
+        Dentro do bloco as alterações não avisam os observadores uma a
+        uma, por isso índices e estatísticas ficam desatualizados até o
+        bloco terminar, também para as outras threads; cada ``transacao``
+        continua a gravar e a desfazer as suas alterações normalmente.
+        A trava só é tomada por cada transação e pela reconstrução final,
+        não durante o bloco inteiro: uma importação noutra thread deixa a
+        interface gravar e sincronizar entre dois lotes.
+        """
+        with self.trava:
+            self._em_massa += 1
+            if self._em_massa == 1:
+                # Só se criam objetos sem ciclos: o coletor apenas atrasaria a carga
+                self._coletor_ativo = gc.isenabled()
+                gc.disable()
+        try:
+            yield
+        finally:
+            with self.trava:
+                self._em_massa -= 1
+                if not self._em_massa:
+                    try:
+                        for observador in self.observadores:
+                            observador.reconstruir(self)
+                    finally:
+                        if self._coletor_ativo:
+                            gc.enable()
+
+    def gravar(self, colecao, chave, registro):
+        """Insere ou substitui um registro de uma coleção"""
+        registro = como_registro(colecao, registro)
+        with self.transacao():
+            dados = self.colecao(colecao)
+            antigo = dados.get(chave)
+            self._pendentes.append((colecao, chave, antigo))
+            dados[chave] = registro
+            self._notificar(colecao, chave, antigo, registro)
+
+    def gravar_varios(self, colecao, pares):
+        """Insere ou substitui os pares (chave, registro) de uma coleção numa transação"""
+        dados = self.colecao(colecao)
+        with self.transacao():
+            pendentes = self._pendentes
+            for chave, registro in pares:
+                registro = como_registro(colecao, registro)
+                antigo = dados.get(chave)
+                pendentes.append((colecao, chave, antigo))
+                dados[chave] = registro
+                self._notificar(colecao, chave, antigo, registro)
+
+    def remover(self, colecao, chave):
+        """Remove um registro de uma coleção"""
+        with self.transacao():
+            dados = self.colecao(colecao)
+            if chave not in dados:
+                return
+            antigo = dados.pop(chave)
+            self._pendentes.append((colecao, chave, antigo))
+            self._notificar(colecao, chave, antigo, None)
+
+    def atualizar(self, colecao, chave, **campos):
+        """Grava uma cópia do registro com os campos alterados"""
+        registro = self.colecao(colecao)[chave].como_dict()
+        registro.update(campos)
+        self.gravar(colecao, chave, registro)
+        return self.colecao(colecao)[chave]
+
+    def proximo_id(self, prefixo, colecao='emprestimos'):
+        """Gera um ID novo pela sequência persistente do prefixo
+
+        Custa O(1): a coleção só é percorrida na primeira vez, para
+        iniciar a sequência acima dos IDs já existentes.
+        """
+        return self.reservar_ids(prefixo, 1, colecao)[0]
+
+    def reservar_ids(self, prefixo, quantidade, colecao='emprestimos'):
+        """Gera ``quantidade`` IDs novos, avançando a sequência de uma só vez"""
+        dados = self.colecao(colecao)
+        ids = []
+        while len(ids) < quantidade:
+            falta = quantidade - len(ids)
+            ultimo = self._proximo_sequencial(prefixo, lambda: maior_numero(dados, prefixo), falta)
+            for numero in range(ultimo - falta + 1, ultimo + 1):
+                id_novo = formatar_id(prefixo, numero)
+                if id_novo not in dados:
+                    ids.append(id_novo)
+        return ids
+
+    def salvar_tudo(self):
+        """Regrava todas as coleções por completo"""
+        if self.gravador is not None:
+            self.gravador.salvar_colecoes(COLECOES)
+        else:
+            self._salvar_colecoes(COLECOES)
+
+    def fechar(self):
+        """Grava o que estiver pendente e libera os recursos do armazenamento"""
+        if self.gravador is None:
+            return
+        gravador, self.gravador = self.gravador, None
+        try:
+            gravador.parar()
+        except ErroPersistencia:
+            # Última tentativa, já sem a thread: regravar tudo a partir da memória
+            self._salvar_colecoes(COLECOES)
+
+    def copiar_colecoes(self, nomes):
+        """Cópias rasas das coleções, tiradas entre transações
+
+        Os registros nunca são alterados no lugar (``atualizar`` grava uma
+        cópia), por isso a cópia rasa pode ser serializada noutra thread.
+        Transações ainda na fila do gravador são gravadas antes, para que
+        a cópia nunca contenha algo que o armazenamento não confirmou.
+        """
+        with self.trava:
+            if self.gravador is not None:
+                self.gravador.descarregar()
+            return {nome: dict(self.colecao(nome)) for nome in nomes}
+
+    def _alteracoes_pendentes(self):
+        """Lista (coleção, chave, registro atual) sem repetições"""
+        vistos = {}
+        for colecao, chave, _ in self._pendentes:
+            vistos[(colecao, chave)] = None
+        return [
+            (colecao, chave, self.colecao(colecao).get(chave))
+            for colecao, chave in vistos
+        ]
+
+    def _desfazer(self):
+        """Restaura em memória os valores anteriores à transação"""
+        for colecao, chave, antigo in reversed(self._pendentes):
+            dados = self.colecao(colecao)
+            atual = dados.get(chave)
+            if antigo is None:
+                dados.pop(chave, None)
+            else:
+                dados[chave] = antigo
+            self._notificar(colecao, chave, atual, antigo)
+
+    def _aplicar(self, colecao, chave, registro):
+        """Grava em memória um registro já confirmado por outro processo; 1 se mudou, 0 se não"""
+        dados = self.colecao(colecao)
+        antigo = dados.get(chave)
+        if registro is None:
+            if antigo is None:
+                return 0
+            novo = None
+            del dados[chave]
+        else:
+            if antigo is not None and antigo == registro:
+                # Normalmente uma transação deste mesmo processo
+                return 0
+            novo = dados[chave] = como_registro(colecao, registro)
+        self._notificar(colecao, chave, antigo, novo)
+        return 1
+
+    def _notificar(self, colecao, chave, antigo, novo):
+        self.versoes[colecao] += 1
+        if self._em_massa:
+            return
+        for observador in self.observadores:
+            observador.ao_alterar(colecao, chave, antigo, novo)
+
+    def _recuperar(self):
+        """Aplica alterações pendentes do armazenamento após a leitura"""
+
+    def _salvar_colecoes(self, nomes):
+        for nome, dados in self.copiar_colecoes(nomes).items():
+            self._salvar_colecao(nome, dados)
+
+    def _registrar(self, alteracoes):
+        """Grava alterações sem tarefas de manutenção (ex.: compactação)"""
+        self._escrever(alteracoes)
+
+    def _ler_colecao(self, nome):
+        """Percorre os pares (chave, registro) gravados de uma coleção"""
+        raise NotImplementedError
+
+    def _escrever(self, alteracoes):
+        raise NotImplementedError
+
+    def _salvar_colecao(self, nome, dados):
+        raise NotImplementedError
+
+    def _proximo_sequencial(self, prefixo, semente, quantidade=1):
+        """Avança a sequência ``quantidade`` vezes e devolve o último valor"""
+        raise NotImplementedError
+
+
+class RepositorioJSON(Repositorio):
+    """Repositório em arquivos JSON, indicado para instalações pequenas
+
+    Cada transação é acrescentada ao diário; os snapshots só são
+    regravados na compactação (a cada ``limite_diario`` transações e ao
+    fechar). Ao carregar, o diário é reaplicado sobre os snapshots.
+
+    Com ``formato='binario'`` os snapshots usam o formato de
+    ``biblioteca.binario`` (``.bin``), menor e mais rápido de ler; se só
+    existir o JSON de uma coleção, ele é lido e convertido na próxima
+    compactação.
+
+    Com ``partilhado=True`` vários processos (por exemplo em computadores
+    diferentes com a mesma pasta de rede) podem usar o mesmo diretório.
+    Leituras e gravações dos arquivos passam a ser feitas com o
+    bloqueio de ``biblioteca.lock``, e cada transação é confirmada no
+    diário antes de terminar (sem ``GravadorAssincrono``). Antes de
+    gravar, o processo lê o que os outros acrescentaram ao diário
+    desde a última vez e junta-o à memória. Se algum dos registros que
+    a transação altera mudou entretanto, levanta ``ErroConflito`` e a
+    transação é desfeita; a seguinte já parte dos dados atualizados.
+    A compactação grava em ``biblioteca_versoes.json`` uma geração nova
+    e a versão de cada coleção, para os outros processos saberem que o
+    diário recomeçou e que coleções têm de reler dos snapshots. Todos
+    os processos que usam o diretório têm de estar no modo partilhado.
+    """
+
+    def __init__(self, diretorio=".", limite_diario=1000, formato='json', partilhado=False):
+        super().__init__()
+        if formato not in ('json', 'binario'):
+            raise ValueError(f"Formato desconhecido: {formato}")
+        self.diretorio = diretorio
+        self.formato = formato
+        self.arquivos_json = {
+            nome: os.path.join(diretorio, f"biblioteca_{nome}.json")
+            for nome in COLECOES
+        }
+        if formato == 'binario':
+            self.arquivos = {
+                nome: os.path.join(diretorio, f"biblioteca_{nome}.bin")
+                for nome in COLECOES
+            }
+        else:
+            self.arquivos = self.arquivos_json
+        self.diario = Diario(os.path.join(diretorio, "biblioteca_diario.jsonl"))
+        self.sequencias = SequenciasJSON(os.path.join(diretorio, "biblioteca_sequencias.json"))
+        self.limite_diario = limite_diario
+        self._sujas = set()
+
+        self.partilhado = partilhado
+        if partilhado:
+            self.GRAVACAO_LOCAL = False
+        self.caminho_bloqueio = os.path.join(diretorio, "biblioteca.lock")
+        self.caminho_versoes = os.path.join(diretorio, "biblioteca_versoes.json")
+        # Geração (compactação) dos snapshots lidos e versão de cada coleção
+        # até ``diario.posicao``: mais uma por transação que a alterou
+        self.geracao = 0
+        self.versoes_arquivos = dict.fromkeys(COLECOES, 0)
+        # Transações recusadas por alterações de outros processos
+        self.conflitos = 0
+        self._com_bloqueio = False
+
+    def carregar(self, progresso=None):
+        if not self.partilhado:
+            super().carregar(progresso)
+            return
+        # Ninguém compacta enquanto os snapshots e o diário são lidos
+        with self._bloqueio():
+            self.geracao, self.versoes_arquivos = self._ler_versoes()
+            super().carregar(progresso)
+
+    @contextmanager
+    def transacao(self):
+        if self.partilhado and self._pendentes is None:
+            # Partir dos dados mais recentes: menos conflitos ao gravar
+            self.sincronizar()
+        with super().transacao():
+            yield
+
+    def sincronizar(self, esperar=True):
+        """Junta à memória as transações gravadas por outros processos
+
+        Só faz algo no modo partilhado; devolve quantos registros mudaram.
+        Com ``esperar=False`` desiste (devolve 0) se outra thread tiver a
+        trava ou outro processo estiver a usar os arquivos, em vez de ficar
+        à espera; é o modo para chamar a partir da interface.
+        """
+        if not self.partilhado:
+            return 0
+        if not self.trava.acquire(blocking=esperar):
+            return 0
+        try:
+            if self._pendentes is not None or not self._desatualizado():
+                return 0
+            try:
+                with self._bloqueio(esperar):
+                    return self._incorporar()
+            except BlockingIOError:
+                return 0
+        finally:
+            self.trava.release()
+
+    def _recuperar(self):
+        try:
+            for alteracoes in self.diario.ler():
+                for colecao, chave, registro in alteracoes:
+                    dados = self.colecao(colecao)
+                    if registro is None:
+                        dados.pop(chave, None)
+                    else:
+                        dados[chave] = como_registro(colecao, registro)
+                    self._sujas.add(colecao)
+                for colecao in {colecao for colecao, _, _ in alteracoes}:
+                    self.versoes_arquivos[colecao] += 1
+        except OSError as e:
+            raise ErroPersistencia(f"Erro ao ler {self.diario.caminho}: {e}") from e
+
+    def compactar(self):
+        """Grava os snapshots alterados e esvazia o diário
+
+        Cada snapshot é substituído atomicamente e o diário só é apagado
+        depois de todos estarem no disco. Uma queda a meio deixa alguns
+        snapshots novos e outros antigos, mas o diário ainda tem todas as
+        transações e reaplicá-lo sobre qualquer um deles dá o mesmo
+        resultado: as coleções nunca ficam com metade de uma transação.
+        """
+        if not self.partilhado:
+            self._compactar()
+            return
+        with self._bloqueio():
+            # Os snapshots têm de incluir também as transações dos outros
+            self._incorporar()
+            self._compactar()
+
+    def fechar(self):
+        super().fechar()
+        # No modo partilhado o diário fica para o próximo: compactar obrigaria
+        # os outros processos a reler as coleções dos snapshots
+        if not self.partilhado and (self._sujas or self.diario.registros):
+            self.compactar()
+
+    def _compactar(self):
+        copias = self.copiar_colecoes([nome for nome in COLECOES if nome in self._sujas])
+        for nome, dados in copias.items():
+            self._salvar_colecao(nome, dados)
+        try:
+            if self.partilhado:
+                # Antes de limpar o diário: se a limpeza não chegar a acontecer,
+                # reaplicá-lo sobre os snapshots novos não muda nada
+                substituir_arquivo(self.caminho_versoes, json.dumps({
+                    'geracao': self.geracao + 1,
+                    'colecoes': self.versoes_arquivos,
+                }, indent=4))
+                self.geracao += 1
+            self.diario.limpar()
+        except OSError as e:
+            raise ErroPersistencia(f"Erro ao limpar {self.diario.caminho}: {e}") from e
+        self._sujas.clear()
+
+    def _ler_colecao(self, nome):
+        arquivo = self.arquivos[nome]
+        if self.formato == 'binario' and not os.path.exists(arquivo):
+            arquivo = self.arquivos_json[nome]
+            # Converter para o formato binário na próxima compactação
+            if os.path.exists(arquivo):
+                self._sujas.add(nome)
+        if not os.path.exists(arquivo):
+            return
+        try:
+            if arquivo.endswith('.bin'):
+                yield from ler_binario(arquivo).items()
+            else:
+                yield from ler_pares_json(arquivo)
+        except (OSError, ValueError, IndexError, struct.error) as e:
+            # Nunca começar com a coleção vazia: a próxima gravação apagaria os dados
+            raise ErroPersistencia(f"Arquivo de dados danificado ou ilegível: {arquivo}\n{e}") from e
+
+    def _escrever(self, alteracoes):
+        if not self.partilhado:
+            self._registrar(alteracoes)
+            if self.diario.registros >= self.limite_diario:
+                self.compactar()
+            return
+
+        # Chamado dentro da transação: os valores lidos ainda estão nos pendentes
+        lidos = {}
+        for colecao, chave, antigo in self._pendentes:
+            lidos.setdefault((colecao, chave), antigo)
+        with self._bloqueio():
+            self._incorporar(lidos)
+            self._registrar(alteracoes)
+            if self.diario.registros >= self.limite_diario:
+                self._compactar()
+
+    def _registrar(self, alteracoes):
+        try:
+            self.diario.registrar(alteracoes)
+        except OSError as e:
+            raise ErroPersistencia(f"Erro ao gravar {self.diario.caminho}: {e}") from e
+        colecoes = {colecao for colecao, _, _ in alteracoes}
+        self._sujas.update(colecoes)
+        for colecao in colecoes:
+            self.versoes_arquivos[colecao] += 1
+
+    def _proximo_sequencial(self, prefixo, semente, quantidade=1):
+        try:
+            return self.sequencias.proximo(prefixo, semente, quantidade)
+        except (OSError, ValueError) as e:
+            raise ErroPersistencia(f"Erro ao gerar ID em {self.sequencias.caminho}: {e}") from e
+
+    def _salvar_colecoes(self, nomes):
+        self._sujas.update(nomes)
+        self.compactar()
+
+    def _salvar_colecao(self, nome, dados):
+        arquivo = self.arquivos[nome]
+        try:
+            if self.formato == 'binario':
+                salvar_binario(arquivo, dados)
+                return
+            with escrever_atomicamente(arquivo) as f:
+                json.dump(dados, f, indent=4, ensure_ascii=False, default=para_json)
+        except OSError as e:
+            raise ErroPersistencia(f"Erro ao salvar dados em {arquivo}: {e}") from e
+
+    @contextmanager
+    def _bloqueio(self, esperar=True):
+        """Bloqueio do diretório entre processos; reentrante na mesma thread"""
+        with self.trava:
+            if self._com_bloqueio:
+                yield
+                return
+            with ExitStack() as pilha:
+                try:
+                    pilha.enter_context(bloquear_arquivo(self.caminho_bloqueio, esperar))
+                except BlockingIOError:
+                    raise
+                except OSError as e:
+                    raise ErroPersistencia(f"Erro ao bloquear {self.caminho_bloqueio}: {e}") from e
+                self._com_bloqueio = True
+                try:
+                    yield
+                finally:
+                    self._com_bloqueio = False
+
+    def _ler_versoes(self):
+        """Geração e versões das coleções gravadas na última compactação"""
+        try:
+            with open(self.caminho_versoes, 'r', encoding='utf-8') as f:
+                estado = json.load(f)
+        except FileNotFoundError:
+            return 0, dict.fromkeys(COLECOES, 0)
+        except (OSError, ValueError) as e:
+            raise ErroPersistencia(f"Erro ao ler {self.caminho_versoes}: {e}") from e
+        return estado['geracao'], {nome: estado['colecoes'].get(nome, 0) for nome in COLECOES}
+
+    def _tamanho_diario(self):
+        try:
+            return os.path.getsize(self.diario.caminho)
+        except FileNotFoundError:
+            return 0
+
+    def _desatualizado(self):
+        """Se outro processo gravou desde a última leitura; sem bloqueio, só indicativo"""
+        try:
+            return self._tamanho_diario() != self.diario.posicao or self._ler_versoes()[0] != self.geracao
+        except OSError:
+            return True
+
+    def _incorporar(self, lidos=None):
+        """Junta à memória o que os outros processos gravaram; chamado com o bloqueio
+
+        Na mesma geração basta ler o diário a partir de ``posicao``. Depois
+        de uma compactação de outro processo, as coleções com versão
+        diferente são relidas dos snapshots e comparadas com a memória.
+        ``lidos`` são os registros da transação em curso como estavam
+        quando ela os leu: se outro processo alterou algum, levanta
+        ``ErroConflito`` sem mexer na memória. Devolve quantos registros mudaram.
+        """
+        posicao, registros = self.diario.posicao, self.diario.registros
+        geracao, versoes = self._ler_versoes()
+        try:
+            if geracao == self.geracao and self._tamanho_diario() >= posicao:
+                versoes = dict(self.versoes_arquivos)
+                sujas = set(self._sujas)
+                relidas = {}
+                transacoes = self.diario.ler(posicao)
+            else:
+                if geracao == self.geracao:
+                    # Diário encolheu sem compactação registrada: reler tudo
+                    relidas = {nome: dict(self._ler_colecao(nome)) for nome in COLECOES}
+                else:
+                    relidas = {
+                        nome: dict(self._ler_colecao(nome)) for nome in COLECOES
+                        if versoes[nome] != self.versoes_arquivos[nome]
+                    }
+                sujas = set()
+                transacoes = self.diario.ler()
+
+            alteracoes = []
+            for transacao in transacoes:
+                for colecao, chave, registro in transacao:
+                    sujas.add(colecao)
+                    if colecao not in relidas:
+                        alteracoes.append((colecao, chave, registro))
+                    elif registro is None:
+                        relidas[colecao].pop(chave, None)
+                    else:
+                        relidas[colecao][chave] = registro
+                for colecao in {colecao for colecao, _, _ in transacao}:
+                    versoes[colecao] += 1
+        except OSError as e:
+            self.diario.posicao, self.diario.registros = posicao, registros
+            raise ErroPersistencia(f"Erro ao ler {self.diario.caminho}: {e}") from e
+        except ErroPersistencia:
+            self.diario.posicao, self.diario.registros = posicao, registros
+            raise
+
+        lidos = lidos or {}
+        for nome, dados in relidas.items():
+            atuais = self.colecao(nome)
+            # Os registros da transação já têm o valor novo em memória: são
+            # sempre comparados com o valor lido, mais abaixo
+            alteracoes.extend(
+                (nome, chave, registro) for chave, registro in dados.items()
+                if (nome, chave) in lidos or atuais.get(chave) != registro
+            )
+            removidas = set(atuais).union(chave for colecao, chave in lidos if colecao == nome)
+            alteracoes.extend((nome, chave, None) for chave in removidas if chave not in dados)
+
+        for colecao, chave, registro in alteracoes:
+            if (colecao, chave) in lidos and lidos[(colecao, chave)] != registro:
+                # Ler tudo de novo na próxima vez, já sem a transação por cima
+                self.diario.posicao, self.diario.registros = posicao, registros
+                self.conflitos += 1
+                raise ErroConflito(
+                    "Os dados foram alterados por outro processo e nada foi gravado. "
+                    "Tente de novo: a próxima tentativa já parte dos dados atualizados."
+                )
+
+        self.geracao, self.versoes_arquivos, self._sujas = geracao, versoes, sujas
+        alterados = 0
+        for colecao, chave, registro in alteracoes:
+            # Os registros da transação ficam com o valor dela, que vai ser gravado
+            if (colecao, chave) not in lidos:
+                alterados += self._aplicar(colecao, chave, registro)
+        return alterados
+
+
+# Colunas de cada tabela: (campo no dicionário, coluna SQL)
+CAMPOS_SQLITE = {
+    'livros': ('isbn', (
+        ('título', 'titulo'),
+        ('autor', 'autor'),
+        ('gênero', 'genero'),
+        ('quantidade', 'quantidade'),
+    )),
+    'usuarios': ('id', (
+        ('nome', 'nome'),
+        ('tipo', 'tipo'),
+        ('data_cadastro', 'data_cadastro'),
+        ('historico', 'historico'),
+    )),
+    'emprestimos': ('id', (
+        ('id_usuario', 'id_usuario'),
+        ('isbn_livro', 'isbn_livro'),
+        ('data_emprestimo', 'data_emprestimo'),
+        ('data_devolucao_prevista', 'data_devolucao_prevista'),
+        ('data_devolucao_real', 'data_devolucao_real'),
+        ('status', 'status'),
+        ('multa', 'multa'),
+    )),
+}
+
+# Campos guardados como texto JSON
+CAMPOS_JSON = {'historico'}
+
+ESQUEMA_SQLITE = """
+CREATE TABLE IF NOT EXISTS livros (
+    isbn TEXT PRIMARY KEY,
+    titulo TEXT,
+    autor TEXT,
+    genero TEXT,
+    quantidade INTEGER,
+    extras TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_livros_titulo ON livros (titulo);
+CREATE INDEX IF NOT EXISTS idx_livros_genero ON livros (genero);
+
+CREATE TABLE IF NOT EXISTS usuarios (
+    id TEXT PRIMARY KEY,
+    nome TEXT,
+    tipo TEXT,
+    data_cadastro TEXT,
+    historico TEXT,
+    extras TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_usuarios_nome ON usuarios (nome);
+
+CREATE TABLE IF NOT EXISTS emprestimos (
+    id TEXT PRIMARY KEY,
+    id_usuario TEXT,
+    isbn_livro TEXT,
+    data_emprestimo TEXT,
+    data_devolucao_prevista TEXT,
+    data_devolucao_real TEXT,
+    status TEXT,
+    multa REAL,
+    extras TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_emprestimos_usuario ON emprestimos (id_usuario, status);
+CREATE INDEX IF NOT EXISTS idx_emprestimos_livro ON emprestimos (isbn_livro, status);
+CREATE INDEX IF NOT EXISTS idx_emprestimos_status ON emprestimos (status);
+CREATE INDEX IF NOT EXISTS idx_emprestimos_data ON emprestimos (data_emprestimo);
+
+CREATE TABLE IF NOT EXISTS sequencias (
+    prefixo TEXT PRIMARY KEY,
+    valor INTEGER NOT NULL
+);
+"""
+
+
+class RepositorioSQLite(Repositorio):
+    """Repositório em SQLite com tabelas indexadas e gravação por linha"""
+
+    def __init__(self, caminho="biblioteca.db"):
+        super().__init__()
+        self.caminho = caminho
+        self._trava_conexao = threading.Lock()
+        try:
+            # A conexão é partilhada com o gravador, sob _trava_conexao
+            self.conexao = sqlite3.connect(caminho, check_same_thread=False)
+            self.conexao.execute("PRAGMA journal_mode=WAL")
+            self.conexao.execute("PRAGMA synchronous=NORMAL")
+            self.conexao.executescript(ESQUEMA_SQLITE)
+        except sqlite3.Error as e:
+            raise ErroPersistencia(f"Erro ao abrir {caminho}: {e}") from e
+
+    def vazio(self):
+        """Indica se o banco ainda não tem nenhum registro"""
+        return not any(
+            self.conexao.execute(f"SELECT 1 FROM {nome} LIMIT 1").fetchone()
+            for nome in COLECOES
+        )
+
+    def importar(self, origem):
+        """Copia todas as coleções de outro repositório para este"""
+        for nome in COLECOES:
+            self.colecao(nome).clear()
+            self.colecao(nome).update(origem.colecao(nome))
+        self.salvar_tudo()
+
+    def fechar(self):
+        super().fechar()
+        self.conexao.close()
+
+    def _ler_colecao(self, nome):
+        chave, campos = CAMPOS_SQLITE[nome]
+        colunas = ", ".join([chave] + [coluna for _, coluna in campos] + ['extras'])
+        try:
+            for linha in self.conexao.execute(f"SELECT {colunas} FROM {nome}"):
+                yield linha[0], self._para_registro(nome, linha[1:])
+        except sqlite3.Error as e:
+            raise ErroPersistencia(f"Erro ao ler {nome}: {e}") from e
+
+    def _escrever(self, alteracoes):
+        try:
+            with self._trava_conexao, self.conexao:
+                for colecao, chave, registro in alteracoes:
+                    if registro is None:
+                        pk = CAMPOS_SQLITE[colecao][0]
+                        self.conexao.execute(f"DELETE FROM {colecao} WHERE {pk} = ?", (chave,))
+                    else:
+                        self.conexao.execute(
+                            self._sql_inserir(colecao),
+                            (chave,) + self._para_linha(colecao, registro)
+                        )
+        except sqlite3.Error as e:
+            raise ErroPersistencia(f"Erro ao salvar dados em {self.caminho}: {e}") from e
+
+    def _salvar_colecoes(self, nomes):
+        # Todas as tabelas numa única transação do SQLite
+        copias = self.copiar_colecoes(nomes)
+        try:
+            with self._trava_conexao, self.conexao:
+                for nome, dados in copias.items():
+                    self._regravar_tabela(nome, dados)
+        except sqlite3.Error as e:
+            raise ErroPersistencia(f"Erro ao salvar dados em {self.caminho}: {e}") from e
+
+    def _salvar_colecao(self, nome, dados):
+        try:
+            with self._trava_conexao, self.conexao:
+                self._regravar_tabela(nome, dados)
+        except sqlite3.Error as e:
+            raise ErroPersistencia(f"Erro ao salvar dados em {self.caminho}: {e}") from e
+
+    def _regravar_tabela(self, nome, dados):
+        self.conexao.execute(f"DELETE FROM {nome}")
+        self.conexao.executemany(self._sql_inserir(nome), (
+            (chave,) + self._para_linha(nome, registro)
+            for chave, registro in dados.items()
+        ))
+
+    def _proximo_sequencial(self, prefixo, semente, quantidade=1):
+        try:
+            with self._trava_conexao, self.conexao:
+                # O UPDATE obtém o bloqueio de escrita: outros processos esperam
+                atualizadas = self.conexao.execute(
+                    "UPDATE sequencias SET valor = valor + ? WHERE prefixo = ?", (quantidade, prefixo)
+                ).rowcount
+                if not atualizadas:
+                    self.conexao.execute(
+                        "INSERT INTO sequencias (prefixo, valor) VALUES (?, ?)",
+                        (prefixo, semente() + quantidade)
+                    )
+                return self.conexao.execute(
+                    "SELECT valor FROM sequencias WHERE prefixo = ?", (prefixo,)
+                ).fetchone()[0]
+        except sqlite3.Error as e:
+            raise ErroPersistencia(f"Erro ao gerar ID em {self.caminho}: {e}") from e
+
+    def _sql_inserir(self, nome):
+        chave, campos = CAMPOS_SQLITE[nome]
+        colunas = [chave] + [coluna for _, coluna in campos] + ['extras']
+        marcadores = ", ".join("?" * len(colunas))
+        return f"INSERT OR REPLACE INTO {nome} ({', '.join(colunas)}) VALUES ({marcadores})"
+
+    def _para_linha(self, nome, registro):
+        """Converte um registro em valores de colunas"""
+        _, campos = CAMPOS_SQLITE[nome]
+        conhecidos = {campo for campo, _ in campos}
+        valores = []
+        for campo, _ in campos:
+            valor = registro.get(campo)
+            if campo in CAMPOS_JSON and valor is not None:
+                valor = json.dumps(valor, ensure_ascii=False)
+            valores.append(valor)
+
+        extras = {k: v for k, v in registro.items() if k not in conhecidos}
+        valores.append(json.dumps(extras, ensure_ascii=False) if extras else None)
+        return tuple(valores)
+
+    def _para_registro(self, nome, valores):
+        """Converte valores de colunas em registro (colunas nulas são omitidas)"""
+        _, campos = CAMPOS_SQLITE[nome]
+        registro = {}
+        for (campo, _), valor in zip(campos, valores):
+            if valor is None:
+                continue
+            if campo in CAMPOS_JSON:
+                valor = json.loads(valor)
+            registro[campo] = valor
+
+        extras = valores[-1]
+        if extras:
+            registro.update(json.loads(extras))
+        return registro
+
+
+def abrir_repositorio(backend=None, diretorio=".", progresso=None):
+    """Abre e carrega o repositório configurado
+
+    O backend vem do argumento ou da variável ``BIBLIOTECA_BACKEND``
+    (``json`` por omissão) e o formato dos snapshots do backend JSON de
+    ``BIBLIOTECA_FORMATO`` (``json`` ou ``binario``). Um banco SQLite novo
+    importa os arquivos existentes na primeira abertura. Com ``remoto``
+    os dados vêm do servidor em ``BIBLIOTECA_SERVIDOR`` (ver
+    ``biblioteca.remoto``) e ``diretorio`` não é usado. Com
+    ``BIBLIOTECA_PARTILHADO=1`` o backend JSON usa o modo partilhado,
+    para vários processos abrirem o mesmo diretório. ``progresso`` é
+    repassado a ``Repositorio.carregar``.
+    """
+    backend = backend or os.environ.get('BIBLIOTECA_BACKEND', 'json')
+    formato = os.environ.get('BIBLIOTECA_FORMATO', 'json')
+    partilhado = os.environ.get('BIBLIOTECA_PARTILHADO', '') not in ('', '0')
+
+    if backend == 'json':
+        repositorio = RepositorioJSON(diretorio, formato=formato, partilhado=partilhado)
+        repositorio.carregar(progresso)
+        return repositorio
+
+    if backend == 'sqlite':
+        repositorio = RepositorioSQLite(os.path.join(diretorio, "biblioteca.db"))
+        if repositorio.vazio():
+            origem = RepositorioJSON(diretorio, formato=formato)
+            arquivos = list(origem.arquivos.values()) + list(origem.arquivos_json.values())
+            if any(os.path.exists(arquivo) for arquivo in arquivos):
+                origem.carregar(progresso)
+                repositorio.importar(origem)
+        repositorio.carregar(progresso)
+        return repositorio
+
+    if backend == 'remoto':
+        # Importado aqui: o cliente remoto é ele próprio um Repositorio
+        from .remoto import SERVIDOR_PADRAO, RepositorioRemoto
+        repositorio = RepositorioRemoto(os.environ.get('BIBLIOTECA_SERVIDOR', SERVIDOR_PADRAO))
+        repositorio.carregar(progresso)
+        return repositorio
+
+    raise ValueError(f"Backend desconhecido: {backend}")
@@ -0,0 +1,72 @@
+"""Sequências persistentes para geração de IDs"""
+
+import json
+import os
+import re
+
+from .arquivos import bloquear_arquivo, substituir_arquivo
+
+
+# Largura fixa: IDs do mesmo prefixo ordenam-se pela ordem de criação
+DIGITOS_ID = 8
+
+_PADRAO_ID = re.compile(r'^(.*?)(\d+)$')
+
+
+def formatar_id(prefixo, numero):
+    """Monta o ID de um número de sequência (ex.: EMP00000042)"""
+    return f"{prefixo}{numero:0{DIGITOS_ID}d}"
+
+
+def numero_do_id(id_registro, prefixo):
+    """Número de sequência de um ID com o prefixo dado, ou None"""
+    if not id_registro.startswith(prefixo):
+        return None
+    sufixo = id_registro[len(prefixo):]
+    return int(sufixo) if sufixo.isdigit() else None
+
+
+def chave_ordenacao_id(id_registro):
+    """Chave que ordena IDs antigos (EMP0001) e novos pela criação"""
+    encontrado = _PADRAO_ID.match(str(id_registro))
+    if not encontrado:
+        return (str(id_registro), -1)
+    return (encontrado.group(1), int(encontrado.group(2)))
+
+
+def maior_numero(ids, prefixo):
+    """Maior número de sequência usado entre ``ids`` (0 se nenhum)"""
+    numeros = (numero_do_id(id_registro, prefixo) for id_registro in ids)
+    return max((numero for numero in numeros if numero is not None), default=0)
+
+
+class SequenciasJSON:
+    """Sequências guardadas num arquivo JSON, protegidas por bloqueio
+
+    O bloqueio torna o incremento atómico entre processos que partilham
+    o mesmo diretório de dados.
+    """
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self.caminho_bloqueio = f"{caminho}.lock"
+
+    def proximo(self, prefixo, semente, quantidade=1):
+        """Incrementa e devolve o valor da sequência ``prefixo``
+
+        ``semente()`` só é chamada se a sequência ainda não existir. Com
+        ``quantidade`` maior que 1 reserva de uma vez os valores seguintes
+        e devolve o último deles.
+        """
+        with bloquear_arquivo(self.caminho_bloqueio):
+            valores = {}
+            if os.path.exists(self.caminho):
+                with open(self.caminho, 'r', encoding='utf-8') as f:
+                    valores = json.load(f)
+
+            if prefixo not in valores:
+                valores[prefixo] = semente()
+            valores[prefixo] += quantidade
+
+            substituir_arquivo(self.caminho, json.dumps(valores, indent=4))
+            return valores[prefixo]
@@ -0,0 +1,518 @@
+"""Servidor HTTP/JSON local sobre o repositório, para vários balcões
+
+Uso, a partir da pasta dos dados:
+
+    python -m biblioteca servir [--endereco 127.0.0.1] [--porta 8765]
+
+Um só processo abre os dados e atende todos os balcões: as telas com
+``BIBLIOTECA_BACKEND=remoto`` (ver ``biblioteca.remoto``) e qualquer
+outro cliente HTTP. Cada pedido corre numa thread; as leituras correm
+em paralelo e as escritas uma de cada vez, com a ``TravaLeituraEscrita``
+do servidor, por isso uma operação vê sempre os dados inteiros e duas
+operações nunca se cruzam. As escritas vão para o disco pelo
+``GravadorAssincrono`` do repositório, como na interface.
+
+Rotas (corpos e respostas em JSON):
+
+    GET  /estado                        versão e tamanho das coleções
+    GET  /livros?q=&genero=&inicio=&limite=
+    GET  /livros/ISBN
+    POST /livros                        {isbn, titulo, autor, genero, quantidade, somar}
+    GET  /usuarios?inicio=&limite=
+    GET  /usuarios/ID
+    POST /usuarios                      {id, nome, tipo}
+    GET  /emprestimos?usuario=&livro=&status=&inicio=&limite=
+    GET  /emprestimos/ID
+    POST /emprestimos                   {id_usuario, isbn, prazo}
+    POST /emprestimos/ID/devolucao
+    GET  /relatorios/NOME?dias=&limite=
+
+e as usadas pelo repositório remoto: ``GET /colecoes/NOME`` (coleção
+inteira), ``GET /alteracoes?desde=VERSAO`` (transações confirmadas
+depois de uma versão), ``POST /transacoes`` (grava alterações se os
+registros ainda forem os que o cliente leu) e ``POST /ids``.
+
+Uma regra da biblioteca violada responde 422 com ``{"erro": ...}``;
+uma transação sobre registros entretanto alterados responde 409.
+"""
+
+import json
+import os
+import re
+import signal
+import threading
+from collections import deque
+from contextlib import contextmanager
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import islice
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from . import operacoes, relatorios
+from .multas import RegrasMulta
+from .registros import como_registro, para_json
+from .repositorio import COLECOES, ErroPersistencia
+
+ENDERECO_PADRAO = '127.0.0.1'
+PORTA_PADRAO = 8765
+# Itens por página nas listagens, por omissão e no máximo
+LIMITE_PAGINA = 50
+LIMITE_PAGINA_MAXIMO = 1000
+# Transações guardadas para ``/alteracoes``; um cliente mais atrasado recarrega tudo
+LIMITE_HISTORICO = 10000
+
+_CODIFICAR = json.JSONEncoder(ensure_ascii=False, default=para_json).encode
+
+
+class TravaLeituraEscrita:
+    """Vários leitores ao mesmo tempo ou um só escritor
+
+    Um escritor à espera bloqueia novos leitores, para que uma sequência
+    de leituras não o atrase indefinidamente.
+    """
+
+    def __init__(self):
+        self._condicao = threading.Condition()
+        self._leitores = 0
+        self._escrevendo = False
+        self._escritores_esperando = 0
+
+    @contextmanager
+    def leitura(self):
+        self._entrar_leitura()
+        try:
+            yield
+        finally:
+            self._sair_leitura()
+
+    @contextmanager
+    def escrita(self):
+        self._entrar_escrita()
+        try:
+            yield
+        finally:
+            self._sair_escrita()
+
+    def _entrar_leitura(self):
+        with self._condicao:
+            self._condicao.wait_for(lambda: not (self._escrevendo or self._escritores_esperando))
+            self._leitores += 1
+
+    def _sair_leitura(self):
+        with self._condicao:
+            self._leitores -= 1
+            if not self._leitores:
+                self._condicao.notify_all()
+
+    def _entrar_escrita(self):
+        with self._condicao:
+            self._escritores_esperando += 1
+            try:
+                self._condicao.wait_for(lambda: not (self._escrevendo or self._leitores))
+            finally:
+                self._escritores_esperando -= 1
+            self._escrevendo = True
+
+    def _sair_escrita(self):
+        with self._condicao:
+            self._escrevendo = False
+            self._condicao.notify_all()
+
+
+class HistoricoAlteracoes:
+    """Transações confirmadas, numeradas, para os clientes se atualizarem
+
+    É um assinante do repositório: cada transação recebe a versão
+    seguinte. Só as últimas ``LIMITE_HISTORICO`` ficam guardadas. As
+    versões recomeçam a cada arranque do servidor, por isso vão sempre
+    com a ``instancia``, diferente em cada arranque.
+    """
+
+    def __init__(self, limite=LIMITE_HISTORICO):
+        self.instancia = os.urandom(8).hex()
+        self.versao = 0
+        self._transacoes = deque(maxlen=limite)
+
+    def __call__(self, alteracoes):
+        self.versao += 1
+        self._transacoes.append((self.versao, alteracoes))
+
+    def desde(self, versao):
+        """Alterações (coleção, chave, registro) posteriores a ``versao``, em ordem
+
+        None se parte delas já saiu do histórico.
+        """
+        if self._transacoes and versao < self._transacoes[0][0] - 1:
+            return None
+        alteracoes = []
+        for numero, transacao in reversed(self._transacoes):
+            if numero <= versao:
+                break
+            alteracoes.append(transacao)
+        return [alteracao for transacao in reversed(alteracoes) for alteracao in transacao]
+
+
+class _ErroHTTP(Exception):
+    def __init__(self, estado, mensagem, **dados):
+        super().__init__(mensagem)
+        self.estado = estado
+        self.dados = {'erro': mensagem, **dados}
+
+
+class ServidorBiblioteca(ThreadingHTTPServer):
+    """Servidor HTTP sobre um repositório já carregado"""
+
+    daemon_threads = True
+    request_queue_size = 64
+
+    def __init__(self, endereco, repositorio, regras=None, registrar_pedidos=False):
+        self.repositorio = repositorio
+        self.regras = regras or RegrasMulta()
+        self.trava = TravaLeituraEscrita()
+        self.historico = HistoricoAlteracoes()
+        self.registrar_pedidos = registrar_pedidos
+        self.pedidos = 0
+        self._trava_contagem = threading.Lock()
+        super().__init__(endereco, _Manipulador)
+        repositorio.assinantes.append(self.historico)
+
+    @property
+    def url(self):
+        endereco, porta = self.server_address[:2]
+        return f"http://{endereco}:{porta}"
+
+    def server_close(self):
+        super().server_close()
+        if self.historico in self.repositorio.assinantes:
+            self.repositorio.assinantes.remove(self.historico)
+
+    def contar_pedido(self):
+        with self._trava_contagem:
+            self.pedidos += 1
+
+
+def servir(repositorio, endereco=ENDERECO_PADRAO, porta=PORTA_PADRAO, regras=None,
+           ao_iniciar=None, registrar_pedidos=False):
+    """Atende pedidos até Ctrl+C (ou SIGTERM); devolve quantos foram atendidos
+
+    ``ao_iniciar(url)`` é chamado quando o servidor já aceita ligações
+    (com ``porta=0`` a porta é escolhida pelo sistema).
+    """
+    servidor = ServidorBiblioteca((endereco, porta), repositorio, regras, registrar_pedidos)
+    principal = threading.current_thread() is threading.main_thread()
+    if principal:
+        # Encerrar como no Ctrl+C, para quem chamou gravar os dados
+        anterior = signal.signal(signal.SIGTERM, _interromper)
+    try:
+        if ao_iniciar is not None:
+            ao_iniciar(servidor.url)
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+        if principal:
+            signal.signal(signal.SIGTERM, anterior)
+    return servidor.pedidos
+
+
+def _interromper(sinal, quadro):
+    raise KeyboardInterrupt
+
+
+class _Manipulador(BaseHTTPRequestHandler):
+    # HTTP/1.1: a ligação fica aberta entre pedidos do mesmo cliente
+    protocol_version = 'HTTP/1.1'
+    server_version = 'BibliotecaISCAT/1.0'
+    # Cabeçalhos e corpo saem em duas escritas: sem isto cada resposta
+    # esperaria o ACK atrasado do cliente (~40 ms)
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self._atender('GET')
+
+    def do_POST(self):
+        self._atender('POST')
+
+    def log_message(self, formato, *argumentos):
+        if self.server.registrar_pedidos:
+            super().log_message(formato, *argumentos)
+
+    def _atender(self, metodo):
+        self.server.contar_pedido()
+        partes = urlsplit(self.path)
+        self.parametros = {chave: valores[-1] for chave, valores in parse_qs(partes.query).items()}
+        try:
+            corpo = self._ler_corpo() if metodo == 'POST' else None
+            for rota_metodo, padrao, nome in _ROTAS:
+                encontrada = padrao.fullmatch(partes.path)
+                if encontrada is not None and rota_metodo == metodo:
+                    argumentos = [unquote(grupo) for grupo in encontrada.groups()]
+                    if corpo is not None:
+                        argumentos.append(corpo)
+                    estado, dados = getattr(self, nome)(*argumentos)
+                    break
+            else:
+                raise _ErroHTTP(HTTPStatus.NOT_FOUND, f"Rota desconhecida: {metodo} {partes.path}")
+        except _ErroHTTP as e:
+            estado, dados = e.estado, e.dados
+        except operacoes.ErroOperacao as e:
+            estado, dados = HTTPStatus.UNPROCESSABLE_ENTITY, {'erro': str(e)}
+        except ErroPersistencia as e:
+            estado, dados = HTTPStatus.SERVICE_UNAVAILABLE, {'erro': f"Não foi possível salvar! {e}"}
+        except Exception as e:
+            # Um erro inesperado num pedido não pode deixar o cliente sem resposta
+            estado, dados = HTTPStatus.INTERNAL_SERVER_ERROR, {'erro': f"Erro inesperado: {e}"}
+        self._responder(estado, dados)
+
+    def _ler_corpo(self):
+        tamanho = int(self.headers.get('Content-Length') or 0)
+        try:
+            corpo = json.loads(self.rfile.read(tamanho) or b'{}')
+        except ValueError as e:
+            raise _ErroHTTP(HTTPStatus.BAD_REQUEST, f"JSON inválido: {e}") from None
+        if not isinstance(corpo, dict):
+            raise _ErroHTTP(HTTPStatus.BAD_REQUEST, "O corpo deve ser um objeto JSON")
+        return corpo
+
+    def _responder(self, estado, dados):
+        corpo = _CODIFICAR(dados).encode('utf-8')
+        self.send_response(estado)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def _inteiro(self, nome, padrao=None, minimo=0, maximo=None):
+        valor = self.parametros.get(nome)
+        if valor is None:
+            return padrao
+        try:
+            valor = int(valor)
+        except ValueError:
+            raise _ErroHTTP(HTTPStatus.BAD_REQUEST, f"{nome} deve ser um número inteiro") from None
+        if valor < minimo:
+            raise _ErroHTTP(HTTPStatus.BAD_REQUEST, f"{nome} deve ser pelo menos {minimo}")
+        return valor if maximo is None else min(valor, maximo)
+
+    def _pagina(self, chaves):
+        """Fatia de ``chaves`` pedida por ``inicio`` e ``limite``"""
+        inicio = self._inteiro('inicio', 0)
+        limite = self._inteiro('limite', LIMITE_PAGINA, 1, LIMITE_PAGINA_MAXIMO)
+        return islice(chaves, inicio, inicio + limite)
+
+    # Consultas
+
+    def estado(self):
+        repositorio = self.server.repositorio
+        with self.server.trava.leitura():
+            dados = {nome: len(repositorio.colecao(nome)) for nome in COLECOES}
+            dados['versao'] = self.server.historico.versao
+        dados['instancia'] = self.server.historico.instancia
+        return HTTPStatus.OK, dados
+
+    def listar_livros(self):
+        repositorio = self.server.repositorio
+        consulta = self.parametros.get('q', '').strip()
+        genero = self.parametros.get('genero')
+        with self.server.trava.leitura():
+            livros = repositorio.livros
+            if consulta:
+                isbns = repositorio.indice_busca.buscar(consulta)
+            else:
+                isbns = livros
+            if genero is not None:
+                isbns = [isbn for isbn in isbns if livros[isbn].get('gênero', '') == genero]
+            total = len(isbns)
+            itens = [{'isbn': isbn, **livros[isbn].como_dict()} for isbn in self._pagina(isbns)]
+        return HTTPStatus.OK, {'total': total, 'itens': itens}
+
+    def livro(self, isbn):
+        repositorio = self.server.repositorio
+        with self.server.trava.leitura():
+            livro = repositorio.livros.get(isbn)
+            if livro is None:
+                raise _ErroHTTP(HTTPStatus.NOT_FOUND, "Livro não encontrado!")
+            emprestados = repositorio.indice_emprestimos.ativos_do_livro(isbn)
+        return HTTPStatus.OK, {'isbn': isbn, **livro.como_dict(), 'emprestados': emprestados}
+
+    def listar_usuarios(self):
+        usuarios = self.server.repositorio.usuarios
+        with self.server.trava.leitura():
+            itens = [{'id': chave, **usuarios[chave].como_dict()} for chave in self._pagina(usuarios)]
+            total = len(usuarios)
+        return HTTPStatus.OK, {'total': total, 'itens': itens}
+
+    def usuario(self, id_usuario):
+        repositorio = self.server.repositorio
+        with self.server.trava.leitura():
+            usuario = repositorio.usuarios.get(id_usuario)
+            if usuario is None:
+                raise _ErroHTTP(HTTPStatus.NOT_FOUND, "Usuário não encontrado!")
+            ativos = repositorio.indice_emprestimos.ativos_do_usuario(id_usuario)
+        return HTTPStatus.OK, {'id': id_usuario, **usuario.como_dict(), 'emprestimos_ativos': ativos}
+
+    def listar_emprestimos(self):
+        repositorio = self.server.repositorio
+        indice = repositorio.indice_emprestimos
+        with self.server.trava.leitura():
+            emprestimos = repositorio.emprestimos
+            ids = None
+            for nome, consultar in (('usuario', indice.emprestimos_do_usuario),
+                                    ('livro', indice.emprestimos_do_livro),
+                                    ('status', indice.com_status)):
+                valor = self.parametros.get(nome)
+                if valor is None:
+                    continue
+                encontrados = consultar(valor)
+                if ids is not None:
+                    encontrados = set(encontrados)
+                    encontrados = [emp_id for emp_id in ids if emp_id in encontrados]
+                ids = encontrados
+            if ids is None:
+                ids = emprestimos
+            total = len(ids)
+            itens = [{'id': emp_id, **emprestimos[emp_id].como_dict()} for emp_id in self._pagina(ids)]
+        return HTTPStatus.OK, {'total': total, 'itens': itens}
+
+    def emprestimo(self, emp_id):
+        with self.server.trava.leitura():
+            emprestimo = self.server.repositorio.emprestimos.get(emp_id)
+        if emprestimo is None:
+            raise _ErroHTTP(HTTPStatus.NOT_FOUND, "Empréstimo não encontrado!")
+        return HTTPStatus.OK, {'id': emp_id, **emprestimo.como_dict()}
+
+    def relatorio(self, nome):
+        if nome not in relatorios.NOMES:
+            raise _ErroHTTP(HTTPStatus.NOT_FOUND, f"Relatório desconhecido: {nome}")
+        dias = self._inteiro('dias')
+        limite = self._inteiro('limite', 10, 1)
+        with self.server.trava.leitura():
+            dados = relatorios.gerar(self.server.repositorio, nome, self.server.regras, dias, limite)
+        return HTTPStatus.OK, dados
+
+    # Operações
+
+    def cadastrar_livro(self, corpo):
+        with self.server.trava.escrita():
+            livro = operacoes.cadastrar_livro(
+                self.server.repositorio, corpo.get('isbn', ''), corpo.get('titulo', ''),
+                corpo.get('autor', ''), corpo.get('genero', ''), corpo.get('quantidade', 1),
+                somar=bool(corpo.get('somar')),
+            )
+        return HTTPStatus.CREATED, {'isbn': str(corpo.get('isbn', '')).strip(), **livro.como_dict()}
+
+    def cadastrar_usuario(self, corpo):
+        with self.server.trava.escrita():
+            usuario = operacoes.cadastrar_usuario(
+                self.server.repositorio, corpo.get('id', ''), corpo.get('nome', ''),
+                corpo.get('tipo', 'Aluno'),
+            )
+        return HTTPStatus.CREATED, {'id': str(corpo.get('id', '')).strip(), **usuario.como_dict()}
+
+    def emprestar(self, corpo):
+        with self.server.trava.escrita():
+            emp_id, emprestimo = operacoes.emprestar(
+                self.server.repositorio, str(corpo.get('id_usuario', '')), str(corpo.get('isbn', '')),
+                corpo.get('prazo', operacoes.PRAZO_PADRAO),
+            )
+        return HTTPStatus.CREATED, {'id': emp_id, **emprestimo.como_dict()}
+
+    def devolver(self, emp_id, corpo):
+        with self.server.trava.escrita():
+            multa = operacoes.devolver(self.server.repositorio, emp_id, self.server.regras)
+        return HTTPStatus.OK, {'id': emp_id, 'multa': multa}
+
+    # Repositório remoto
+
+    def colecao(self, nome):
+        if nome not in COLECOES:
+            raise _ErroHTTP(HTTPStatus.NOT_FOUND, f"Coleção desconhecida: {nome}")
+        with self.server.trava.leitura():
+            # Os registros nunca mudam no lugar: a cópia rasa basta
+            copia = dict(self.server.repositorio.colecao(nome))
+        return HTTPStatus.OK, copia
+
+    def alteracoes(self):
+        versao = self._inteiro('desde', 0)
+        with self.server.trava.leitura():
+            historico = self.server.historico
+            alteracoes = historico.desde(versao)
+            atual = historico.versao
+        if alteracoes is None:
+            raise _ErroHTTP(HTTPStatus.GONE, "Histórico insuficiente: recarregue os dados", versao=atual)
+        return HTTPStatus.OK, {'instancia': historico.instancia, 'versao': atual, 'alteracoes': alteracoes}
+
+    def transacao(self, corpo):
+        """Grava as alterações se cada registro ainda for o que o cliente leu"""
+        alteracoes = corpo.get('alteracoes')
+        if not isinstance(alteracoes, list):
+            raise _ErroHTTP(HTTPStatus.BAD_REQUEST, "alteracoes deve ser uma lista")
+        validas = []
+        try:
+            for colecao, chave, antigo, novo in alteracoes:
+                if colecao not in COLECOES:
+                    raise KeyError(colecao)
+                validas.append((colecao, str(chave), antigo, None if novo is None else como_registro(colecao, novo)))
+        except (TypeError, ValueError, KeyError) as e:
+            raise _ErroHTTP(HTTPStatus.BAD_REQUEST, f"Alteração inválida: {e!r}") from None
+        alteracoes = validas
+
+        repositorio = self.server.repositorio
+        with self.server.trava.escrita():
+            conflitos = [
+                [colecao, chave] for colecao, chave, antigo, _ in alteracoes
+                if not _mesmo_registro(repositorio.colecao(colecao).get(chave), antigo)
+            ]
+            if conflitos:
+                raise _ErroHTTP(
+                    HTTPStatus.CONFLICT, "Os dados foram alterados noutro balcão", conflitos=conflitos
+                )
+            with repositorio.transacao():
+                for colecao, chave, _, novo in alteracoes:
+                    if novo is None:
+                        repositorio.remover(colecao, chave)
+                    else:
+                        repositorio.gravar(colecao, chave, novo)
+            versao = self.server.historico.versao
+        return HTTPStatus.OK, {'versao': versao}
+
+    def reservar_ids(self, corpo):
+        prefixo = corpo.get('prefixo')
+        colecao = corpo.get('colecao', 'emprestimos')
+        quantidade = corpo.get('quantidade', 1)
+        if not isinstance(prefixo, str) or colecao not in COLECOES or type(quantidade) is not int or quantidade < 1:
+            raise _ErroHTTP(HTTPStatus.BAD_REQUEST, "Esperado {prefixo, quantidade >= 1, colecao}")
+        with self.server.trava.escrita():
+            ids = self.server.repositorio.reservar_ids(prefixo, quantidade, colecao)
+        return HTTPStatus.OK, {'ids': ids}
+
+
+def _mesmo_registro(atual, lido):
+    """Se o registro atual é o que o cliente leu (``lido``: dicionário ou None)"""
+    if atual is None or lido is None:
+        return atual is None and lido is None
+    return atual.como_dict() == lido
+
+
+_ROTAS = [
+    (metodo, re.compile(padrao), nome)
+    for metodo, padrao, nome in (
+        ('GET', r'/estado', 'estado'),
+        ('GET', r'/livros', 'listar_livros'),
+        ('GET', r'/livros/([^/]+)', 'livro'),
+        ('POST', r'/livros', 'cadastrar_livro'),
+        ('GET', r'/usuarios', 'listar_usuarios'),
+        ('GET', r'/usuarios/([^/]+)', 'usuario'),
+        ('POST', r'/usuarios', 'cadastrar_usuario'),
+        ('GET', r'/emprestimos', 'listar_emprestimos'),
+        ('GET', r'/emprestimos/([^/]+)', 'emprestimo'),
+        ('POST', r'/emprestimos', 'emprestar'),
+        ('POST', r'/emprestimos/([^/]+)/devolucao', 'devolver'),
+        ('GET', r'/relatorios/([^/]+)', 'relatorio'),
+        ('GET', r'/colecoes/([^/]+)', 'colecao'),
+        ('GET', r'/alteracoes', 'alteracoes'),
+        ('POST', r'/transacoes', 'transacao'),
+        ('POST', r'/ids', 'reservar_ids'),
+    )
+]
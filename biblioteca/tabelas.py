@@ -0,0 +1,217 @@
+"""Componentes Tkinter para tabelas grandes"""
+
+import tkinter as tk
+from bisect import bisect_left
+from tkinter import ttk
+
+
+def sincronizar_linhas(treeview, linhas, mostradas):
+    """Acerta as linhas de um Treeview com o mínimo de operações no widget
+
+    ``linhas`` é a sequência ordenada de pares ``(iid, valores)`` que deve
+    ficar visível; ``mostradas`` é o dicionário iid -> valores do que já
+    está no widget, na mesma ordem, mantido pelo chamador entre chamadas
+    (ler os valores de volta do Treeview converteria tipos). Linhas iguais
+    não são tocadas: inserir, editar, mover ou remover um único registro
+    custa uma ou duas operações.
+    """
+    novas = dict(linhas)
+    posicoes = {iid: posicao for posicao, iid in enumerate(novas)}
+
+    removidas = [iid for iid in mostradas if iid not in novas]
+    if removidas:
+        treeview.delete(*removidas)
+
+    # As linhas da maior subsequência já na ordem certa ficam onde estão;
+    # as restantes saem do widget e voltam na posição nova
+    existentes = [iid for iid in mostradas if iid in novas]
+    fora_de_ordem = set(existentes) - _em_ordem(existentes, posicoes)
+    if fora_de_ordem:
+        treeview.detach(*fora_de_ordem)
+
+    for posicao, (iid, valores) in enumerate(novas.items()):
+        if iid not in mostradas:
+            treeview.insert("", posicao, iid=iid, values=valores)
+            continue
+        if mostradas[iid] != valores:
+            treeview.item(iid, values=valores)
+        if iid in fora_de_ordem:
+            treeview.move(iid, "", posicao)
+
+    mostradas.clear()
+    mostradas.update(novas)
+
+
+def _em_ordem(iids, posicoes):
+    """Maior subsequência de ``iids`` com posições crescentes"""
+    finais = []
+    ultimos = []
+    anterior = {}
+    for iid in iids:
+        posicao = posicoes[iid]
+        k = bisect_left(finais, posicao)
+        anterior[iid] = ultimos[k - 1] if k else None
+        if k == len(finais):
+            finais.append(posicao)
+            ultimos.append(iid)
+        else:
+            finais[k] = posicao
+            ultimos[k] = iid
+
+    mantidas = set()
+    iid = ultimos[-1] if ultimos else None
+    while iid is not None:
+        mantidas.add(iid)
+        iid = anterior[iid]
+    return mantidas
+
+
+class ListaVirtual(ttk.Frame):
+    """Treeview que só cria as linhas visíveis de uma sequência de chaves
+
+    A tabela recebe a sequência completa de chaves (lista, ``range``...)
+    e uma função ``obter_linha(chave)`` que devolve os valores de uma
+    linha. Apenas as linhas visíveis mais uma pequena margem existem no
+    widget; ao rolar, as linhas são pedidas de novo à camada de dados. A
+    chave de cada linha é usada como ``iid`` do item.
+    """
+
+    # Linhas extra abaixo da área visível
+    MARGEM = 2
+    ALTURA_LINHA = 20
+    ALTURA_CABECALHO = 25
+
+    def __init__(self, parent, colunas, obter_linha, altura=15, horizontal=False):
+        super().__init__(parent)
+        self.obter_linha = obter_linha
+        self.chaves = []
+        self.inicio = 0
+        self.visiveis = altura
+        self._selecionada = None
+        self._notificada = None
+        self._iids = {}
+        self._valores = {}
+
+        self.treeview = ttk.Treeview(self, columns=colunas, show="headings", height=altura)
+        self.scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self._rolar)
+
+        self.treeview.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        self.scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
+
+        if horizontal:
+            hsb = ttk.Scrollbar(self, orient="horizontal", command=self.treeview.xview)
+            self.treeview.configure(xscrollcommand=hsb.set)
+            hsb.grid(row=1, column=0, sticky=(tk.W, tk.E))
+
+        self.columnconfigure(0, weight=1)
+        self.rowconfigure(0, weight=1)
+
+        # Etiqueta própria, à frente das do widget: as telas podem fazer
+        # treeview.bind("<<TreeviewSelect>>", ...) sem substituir estes eventos
+        etiqueta = f"ListaVirtual{id(self)}"
+        self.treeview.bindtags((etiqueta,) + self.treeview.bindtags())
+        eventos = {
+            "<<TreeviewSelect>>": self._ao_selecionar,
+            "<Configure>": self._ao_redimensionar,
+            "<MouseWheel>": self._roda_mouse,
+            "<Button-4>": lambda event: self._rolar_linhas(-3),
+            "<Button-5>": lambda event: self._rolar_linhas(3),
+            "<Up>": lambda event: self._mover_selecao(-1),
+            "<Down>": lambda event: self._mover_selecao(1),
+            "<Prior>": lambda event: self._mover_selecao(-self.visiveis),
+            "<Next>": lambda event: self._mover_selecao(self.visiveis),
+        }
+        for sequencia, funcao in eventos.items():
+            self.treeview.bind_class(etiqueta, sequencia, funcao)
+
+    def definir_chaves(self, chaves):
+        """Define as linhas da tabela, mantendo a posição de rolagem"""
+        self.chaves = chaves
+        self._mostrar()
+
+    def chave_selecionada(self):
+        """Chave da linha selecionada, mesmo que esteja fora da vista"""
+        return self._selecionada
+
+    def limpar_selecao(self):
+        """Remove a seleção atual"""
+        self._selecionada = None
+        self._notificada = None
+        self.treeview.selection_remove(*self.treeview.selection())
+
+    def __len__(self):
+        return len(self.chaves)
+
+    def _mostrar(self):
+        """Sincroniza as linhas da janela visível com as chaves atuais"""
+        total = len(self.chaves)
+        self.inicio = max(0, min(self.inicio, total - self.visiveis))
+        janela = self.chaves[self.inicio:self.inicio + self.visiveis + self.MARGEM]
+
+        self._iids = {str(chave): chave for chave in janela}
+        linhas = [(iid, tuple(self.obter_linha(chave))) for iid, chave in self._iids.items()]
+        sincronizar_linhas(self.treeview, linhas, self._valores)
+
+        if self._selecionada is not None and str(self._selecionada) in self._iids:
+            iid = str(self._selecionada)
+            if self.treeview.selection() != (iid,):
+                self.treeview.selection_set(iid)
+                self.treeview.focus(iid)
+
+        if total:
+            self.scrollbar.set(self.inicio / total, min(1.0, (self.inicio + self.visiveis) / total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    def _rolar(self, acao, quantidade, unidade=None):
+        """Comando da barra de rolagem ('moveto' ou 'scroll')"""
+        if acao == "moveto":
+            self.inicio = int(float(quantidade) * len(self.chaves))
+        elif unidade == "pages":
+            self.inicio += int(quantidade) * self.visiveis
+        else:
+            self.inicio += int(quantidade)
+        self._mostrar()
+
+    def _rolar_linhas(self, linhas):
+        self.inicio += linhas
+        self._mostrar()
+        return "break"
+
+    def _roda_mouse(self, event):
+        return self._rolar_linhas(-3 if event.delta > 0 else 3)
+
+    def _ao_redimensionar(self, event):
+        visiveis = max(1, (event.height - self.ALTURA_CABECALHO) // self.ALTURA_LINHA)
+        if visiveis != self.visiveis:
+            self.visiveis = visiveis
+            self._mostrar()
+
+    def _ao_selecionar(self, event):
+        selecionados = self.treeview.selection()
+        if not selecionados or selecionados[0] not in self._iids:
+            return None
+        chave = self._iids[selecionados[0]]
+        if chave == self._notificada:
+            # Seleção refeita ao redesenhar a janela: não avisar a tela
+            return "break"
+        self._selecionada = self._notificada = chave
+        return None
+
+    def _mover_selecao(self, deslocamento):
+        """Move a seleção pelo teclado, rolando quando passa da borda"""
+        if self._selecionada is None or str(self._selecionada) not in self._iids:
+            return None
+
+        janela = list(self._iids.values())
+        posicao = self.inicio + janela.index(self._selecionada)
+        nova = max(0, min(len(self.chaves) - 1, posicao + deslocamento))
+
+        if nova < self.inicio:
+            self.inicio = nova
+        elif nova >= self.inicio + self.visiveis:
+            self.inicio = nova - self.visiveis + 1
+
+        self._selecionada = self.chaves[nova]
+        self._mostrar()
+        return "break"
@@ -0,0 +1,154 @@
+"""Fila de vencimentos dos empréstimos ativos, para atrasos e avisos"""
+
+import heapq
+from itertools import count
+
+from .datas import ordinal_do_registro, ordinal_hoje
+from .registros import Emprestimo, StatusEmprestimo
+
+# Entradas inválidas toleradas no heap antes de o refazer
+_MINIMO_COMPACTACAO = 1024
+
+
+class FilaVencimentos:
+    """Empréstimos ativos num heap pela data de devolução prevista
+
+    Mantida pelo repositório a cada empréstimo, devolução ou renovação.
+    ``avancar(hoje)`` tira do heap os empréstimos vencidos até ``hoje``
+    e passa-os para ``vencidos``: cada empréstimo sai do heap uma única
+    vez, ao entrar em atraso, e fica à espera em ``avisos``. O topo do
+    heap é sempre o próximo vencimento.
+
+    Alterações não procuram a entrada antiga no heap: cada entrada leva
+    um número de sequência e só vale enquanto for o atual do empréstimo
+    (remoção preguiçosa). O heap é refeito quando metade das entradas
+    estiver inválida.
+
+    Os avisos já dados (empréstimo e data prevista) sobrevivem a
+    ``reconstruir``: depois de uma importação ou de uma recarga só são
+    avisados os atrasos novos.
+    """
+
+    def __init__(self):
+        # Data prevista com que cada empréstimo já saiu em ``avisos``
+        self._avisados = {}
+        self._limpar()
+
+    def reconstruir(self, repositorio):
+        """Recria o heap a partir de todos os empréstimos"""
+        self._limpar()
+        sequencia = self._sequencia
+        avisados = {}
+        for emp_id, emprestimo in repositorio.emprestimos.items():
+            prevista = _vencimento(emprestimo)
+            if prevista is not None:
+                numero = self._atuais[emp_id] = next(sequencia)
+                self._heap.append((prevista, numero, emp_id))
+                if self._avisados.get(emp_id) == prevista:
+                    avisados[emp_id] = prevista
+        heapq.heapify(self._heap)
+        # Devolvidos ou renovados entretanto podem voltar a ser avisados
+        self._avisados = avisados
+
+    def ao_alterar(self, colecao, chave, antigo, novo):
+        if colecao != 'emprestimos':
+            return
+        prevista = _vencimento(novo) if novo is not None else None
+        if chave in self.vencidos:
+            if prevista == self.vencidos[chave]:
+                return
+            del self.vencidos[chave]
+            del self._atuais[chave]
+        elif chave in self._atuais:
+            if prevista is not None and prevista == _vencimento(antigo):
+                return
+            del self._atuais[chave]
+            self._invalidas += 1
+        if prevista is not None:
+            numero = self._atuais[chave] = next(self._sequencia)
+            heapq.heappush(self._heap, (prevista, numero, chave))
+        if self._invalidas >= _MINIMO_COMPACTACAO and self._invalidas * 2 >= len(self._heap):
+            self._compactar()
+
+    def avancar(self, hoje=None):
+        """Passa para ``vencidos`` os empréstimos com data prevista anterior a ``hoje``"""
+        hoje = ordinal_hoje() if hoje is None else hoje
+        if hoje < self._hoje:
+            # Relógio atrasado: o que ainda não venceu volta para o heap
+            for emp_id, prevista in list(self.vencidos.items()):
+                if prevista >= hoje:
+                    del self.vencidos[emp_id]
+                    heapq.heappush(self._heap, (prevista, self._atuais[emp_id], emp_id))
+        self._hoje = hoje
+        heap = self._heap
+        while heap and heap[0][0] < hoje:
+            prevista, numero, emp_id = heapq.heappop(heap)
+            if self._atuais.get(emp_id) != numero:
+                self._invalidas -= 1
+                continue
+            self.vencidos[emp_id] = prevista
+            if self._avisados.get(emp_id) != prevista:
+                self._novos.append(emp_id)
+
+    def proximo(self, hoje=None):
+        """Par (ordinal, emp_id) do próximo empréstimo a vencer, ou None"""
+        self.avancar(hoje)
+        heap = self._heap
+        while heap and self._atuais.get(heap[0][2]) != heap[0][1]:
+            heapq.heappop(heap)
+            self._invalidas -= 1
+        if not heap:
+            return None
+        prevista, _, emp_id = heap[0]
+        return prevista, emp_id
+
+    def atrasados(self, hoje=None):
+        """Pares (ordinal previsto, emp_id) dos empréstimos em atraso, do mais antigo ao mais recente"""
+        self.avancar(hoje)
+        return sorted((prevista, emp_id) for emp_id, prevista in self.vencidos.items())
+
+    def avisos(self, hoje=None):
+        """Empréstimos que entraram em atraso desde a última chamada, como em ``atrasados``
+
+        Na primeira chamada vêm todos os que já estavam em atraso.
+        """
+        self.avancar(hoje)
+        novos = self._novos
+        self._novos = []
+        # Devolvidos ou renovados entretanto já não estão em ``vencidos``
+        avisos = sorted(
+            (self.vencidos[emp_id], emp_id) for emp_id in novos if emp_id in self.vencidos
+        )
+        for prevista, emp_id in avisos:
+            self._avisados[emp_id] = prevista
+        return avisos
+
+    def __len__(self):
+        """Quantidade de empréstimos ativos com data prevista"""
+        return len(self._atuais)
+
+    def _limpar(self):
+        self._heap = []
+        self._atuais = {}
+        self._sequencia = count()
+        self._invalidas = 0
+        self._hoje = 0
+        self._novos = []
+        self.vencidos = {}
+
+    def _compactar(self):
+        self._heap = [entrada for entrada in self._heap if self._atuais.get(entrada[2]) == entrada[1]]
+        heapq.heapify(self._heap)
+        self._invalidas = 0
+
+
+def _vencimento(emprestimo):
+    """Ordinal da data prevista de um empréstimo ativo, senão None"""
+    if type(emprestimo) is Emprestimo:
+        if getattr(emprestimo, 'status', None) is not StatusEmprestimo.ATIVO:
+            return None
+        prevista = getattr(emprestimo, 'data_devolucao_prevista', None)
+        return prevista if type(prevista) is int else None
+    if emprestimo.get('status') != 'ativo':
+        return None
+    return ordinal_do_registro(emprestimo, 'data_devolucao_prevista')
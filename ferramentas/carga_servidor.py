@@ -0,0 +1,142 @@
+"""Teste de carga do servidor HTTP: pedidos por segundo de busca e de empréstimo
+
+Uso, a partir da raiz do projeto:
+
+    python -m ferramentas.carga_servidor [livros] [clientes] [segundos]
+
+Gera um acervo sintético numa pasta temporária, arranca ``python -m
+biblioteca servir`` noutro processo e mede, com ``clientes`` threads
+(cada uma com a sua ligação) durante ``segundos`` por fase:
+
+- busca: ``GET /livros?q=...`` com prefixos de palavras do acervo;
+- empréstimo: ``POST /emprestimos`` e a devolução do mesmo empréstimo,
+  cada cliente com o seu usuário;
+- misto: nove buscas para cada empréstimo com devolução.
+
+Os clientes correm neste processo e o servidor no outro: numa máquina
+com um só núcleo os dois disputam o mesmo processador.
+"""
+
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import quote
+
+from biblioteca.remoto import ClienteHTTP
+from biblioteca.repositorio import RepositorioJSON
+
+PALAVRAS = ["história", "ciência", "romance", "direito", "poesia", "química", "angola",
+            "luanda", "economia", "física", "cálculo", "gestão", "filosofia", "música",
+            "medicina", "geografia", "literatura", "programação", "estatística", "engenharia"]
+
+
+def gerar_dados(pasta, livros, usuarios):
+    """Acervo com ``livros`` títulos (estoque folgado) e ``usuarios`` usuários"""
+    aleatorio = random.Random(42)
+    repositorio = RepositorioJSON(pasta)
+    repositorio.carregar()
+    with repositorio.em_massa():
+        repositorio.gravar_varios('livros', (
+            (str(9780000000000 + numero), {
+                'título': f"{aleatorio.choice(PALAVRAS).title()} e {aleatorio.choice(PALAVRAS)} {numero}",
+                'autor': f"Autor {numero % 997}",
+                'gênero': PALAVRAS[numero % len(PALAVRAS)].title(),
+                'quantidade': 1000,
+            })
+            for numero in range(livros)
+        ))
+        repositorio.gravar_varios('usuarios', (
+            (f"U{numero:04d}", {'nome': f"Usuário {numero}", 'tipo': 'Aluno',
+                                'data_cadastro': '2024-01-01', 'historico': []})
+            for numero in range(usuarios)
+        ))
+    repositorio.fechar()
+
+
+def buscar(cliente, aleatorio, numero_cliente, livros):
+    palavra = aleatorio.choice(PALAVRAS)
+    prefixo = quote(palavra[:aleatorio.randint(3, len(palavra))])
+    estado, _ = cliente.pedir('GET', f"/livros?q={prefixo}&limite=20")
+    return [estado]
+
+
+def emprestar(cliente, aleatorio, numero_cliente, livros):
+    isbn = str(9780000000000 + aleatorio.randrange(livros))
+    estado, resposta = cliente.pedir('POST', '/emprestimos', {
+        'id_usuario': f"U{numero_cliente:04d}", 'isbn': isbn,
+    })
+    if estado != 201:
+        return [estado]
+    devolucao, _ = cliente.pedir('POST', f"/emprestimos/{resposta['id']}/devolucao", {})
+    return [estado, devolucao]
+
+
+def misto(cliente, aleatorio, numero_cliente, livros):
+    if aleatorio.random() < 0.1:
+        return emprestar(cliente, aleatorio, numero_cliente, livros)
+    return buscar(cliente, aleatorio, numero_cliente, livros)
+
+
+def medir(cliente, operacao, livros, clientes, segundos):
+    """Pedidos, erros e latências (s) de ``clientes`` threads a repetir ``operacao``"""
+    latencias = [[] for _ in range(clientes)]
+    erros = [0] * clientes
+    fim = time.perf_counter() + segundos
+
+    def executar(numero):
+        aleatorio = random.Random(numero)
+        while time.perf_counter() < fim:
+            inicio = time.perf_counter()
+            estados = operacao(cliente, aleatorio, numero, livros)
+            duracao = (time.perf_counter() - inicio) / len(estados)
+            latencias[numero].extend([duracao] * len(estados))
+            erros[numero] += sum(1 for estado in estados if estado >= 400)
+        cliente.fechar()
+
+    threads = [threading.Thread(target=executar, args=(numero,)) for numero in range(clientes)]
+    inicio = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    decorrido = time.perf_counter() - inicio
+    todas = sorted(latencia for lista in latencias for latencia in lista)
+    return len(todas), sum(erros), decorrido, todas
+
+
+def main(argumentos):
+    livros = int(argumentos[0]) if len(argumentos) > 0 else 20000
+    clientes = int(argumentos[1]) if len(argumentos) > 1 else 8
+    segundos = float(argumentos[2]) if len(argumentos) > 2 else 10
+    with tempfile.TemporaryDirectory() as pasta:
+        gerar_dados(pasta, livros, clientes)
+        servidor = subprocess.Popen(
+            [sys.executable, '-m', 'biblioteca', '--diretorio', pasta, 'servir', '--porta', '0'],
+            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+        )
+        try:
+            # Primeira linha de stderr: "Servindo em URL ..."
+            url = servidor.stderr.readline().split()[2]
+            cliente = ClienteHTTP(url)
+
+            print(f"{livros} livros, {clientes} clientes, {segundos:g} s por fase, servidor em {url}")
+            print(f"{'fase':<12} {'pedidos':>9} {'erros':>7} {'pedidos/s':>10} {'p50 (ms)':>9} {'p95 (ms)':>9}")
+            for nome, operacao in (('busca', buscar), ('empréstimo', emprestar), ('misto', misto)):
+                pedidos, erros, decorrido, latencias = medir(cliente, operacao, livros, clientes, segundos)
+                p50 = latencias[len(latencias) // 2] * 1000 if latencias else 0.0
+                p95 = latencias[int(len(latencias) * 0.95)] * 1000 if latencias else 0.0
+                print(f"{nome:<12} {pedidos:>9} {erros:>7} {pedidos / decorrido:>10.0f} {p50:>9.1f} {p95:>9.1f}")
+        finally:
+            # SIGTERM: o servidor grava os dados antes de sair
+            servidor.terminate()
+            servidor.wait()
+        tamanho = os.path.getsize(os.path.join(pasta, "biblioteca_emprestimos.json"))
+        print(f"biblioteca_emprestimos.json gravado ao encerrar: {tamanho / 2**20:.1f} MB")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,110 @@
+"""Compara tamanho e tempo de leitura/gravação dos snapshots JSON e binário
+
+Uso, a partir da raiz do projeto:
+
+    python -m ferramentas.comparar_formatos [quantidade_de_emprestimos]
+
+Gera um acervo sintético (1 livro e 1 usuário para cada 10 empréstimos)
+num diretório temporário e grava/lê cada coleção nos dois formatos.
+"""
+
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+from biblioteca.binario import ler_binario, salvar_binario
+from biblioteca.leitura import ler_pares_json
+
+
+GENEROS = ["Informática", "Matemática", "Gestão", "Direito", "Ciências", "Literatura"]
+TIPOS = ["Aluno", "Professor", "Funcionário"]
+
+
+def gerar_acervo(total_emprestimos):
+    random.seed(42)
+    total_livros = max(1, total_emprestimos // 10)
+    livros = {
+        f"978{i:010d}": {
+            'título': f"Introdução à {random.choice(GENEROS)} volume {i}",
+            'autor': f"Autor {i % 997}",
+            'gênero': random.choice(GENEROS),
+            'quantidade': random.randint(0, 10),
+        }
+        for i in range(total_livros)
+    }
+    usuarios = {
+        f"{20240000 + i}": {
+            'nome': f"Usuário {i}",
+            'tipo': random.choice(TIPOS),
+            'data_cadastro': "2024-02-01",
+            'historico': [],
+        }
+        for i in range(total_livros)
+    }
+    isbns = list(livros)
+    ids = list(usuarios)
+    emprestimos = {}
+    for i in range(total_emprestimos):
+        dia = 1 + i % 28
+        devolvido = random.random() < 0.8
+        emprestimo = {
+            'id_usuario': random.choice(ids),
+            'isbn_livro': random.choice(isbns),
+            'data_emprestimo': f"2024-03-{dia:02d}",
+            'data_devolucao_prevista': f"2024-04-{dia:02d}",
+            'status': 'devolvido' if devolvido else 'ativo',
+            'multa': 0.0,
+        }
+        if devolvido:
+            emprestimo['data_devolucao_real'] = f"2024-04-{dia:02d}"
+        emprestimos[f"EMP{i:08d}"] = emprestimo
+    return {'livros': livros, 'usuarios': usuarios, 'emprestimos': emprestimos}
+
+
+def cronometrar(funcao):
+    inicio = time.perf_counter()
+    resultado = funcao()
+    return time.perf_counter() - inicio, resultado
+
+
+def main(argumentos):
+    total = int(argumentos[0]) if argumentos else 200000
+    acervo = gerar_acervo(total)
+
+    print(f"{'coleção':<12} {'formato':<14} {'bytes':>12} {'gravar (s)':>11} {'ler (s)':>9}")
+    with tempfile.TemporaryDirectory() as diretorio:
+        for nome, dados in acervo.items():
+            caminho_json = os.path.join(diretorio, f"{nome}.json")
+            caminho_bin = os.path.join(diretorio, f"{nome}.bin")
+
+            def gravar_json():
+                with open(caminho_json, 'w', encoding='utf-8') as f:
+                    json.dump(dados, f, indent=4, ensure_ascii=False)
+
+            def ler_json():
+                with open(caminho_json, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+
+            medidas = [
+                ("json", gravar_json, ler_json, caminho_json),
+                ("json (fluxo)", None, lambda: dict(ler_pares_json(caminho_json)), caminho_json),
+                ("binario", lambda: salvar_binario(caminho_bin, dados),
+                 lambda: ler_binario(caminho_bin), caminho_bin),
+            ]
+            for formato, gravar, ler, caminho in medidas:
+                tempo_gravar = cronometrar(gravar)[0] if gravar else None
+                tempo_ler, lidos = cronometrar(ler)
+                if lidos != dados:
+                    print(f"{nome}: {formato} não reproduz os dados!")
+                    return 1
+                coluna_gravar = f"{tempo_gravar:>11.3f}" if tempo_gravar is not None else f"{'-':>11}"
+                print(f"{nome:<12} {formato:<14} {os.path.getsize(caminho):>12} "
+                      f"{coluna_gravar} {tempo_ler:>9.3f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
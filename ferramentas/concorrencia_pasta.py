@@ -0,0 +1,183 @@
+"""Teste de esforço de vários processos a emprestar sobre a mesma pasta de dados
+
+Uso, a partir da raiz do projeto:
+
+    python -m ferramentas.concorrencia_pasta [processos] [operacoes] [livros]
+
+Gera numa pasta temporária um acervo pequeno (``livros`` títulos com
+duas unidades cada, para haver disputa) e arranca ``processos``
+processos que, cada um com o seu ``RepositorioJSON``, fazem
+``operacoes`` empréstimos e devoluções ao acaso sobre os mesmos livros
+e usuários. Corre duas vezes: sem o modo partilhado, como antes, e com
+ele. No fim relê a pasta e confere que nenhum empréstimo se perdeu,
+que o estoque de cada livro bate com os empréstimos ativos e que o
+histórico de cada usuário tem todos os empréstimos dele. Termina com
+código 1 se a corrida no modo partilhado encontrar algum problema (a
+outra serve só de comparação e costuma perder empréstimos).
+
+O diário é compactado a cada ``LIMITE_DIARIO`` transações para que os
+processos também tenham de reler coleções depois da compactação de
+outro.
+"""
+
+import multiprocessing
+import random
+import sys
+import tempfile
+import time
+import traceback
+
+from biblioteca import operacoes
+from biblioteca.operacoes import ErroOperacao
+from biblioteca.repositorio import ErroConflito, ErroPersistencia, RepositorioJSON
+
+UNIDADES = 2
+LIMITE_DIARIO = 50
+
+
+def gerar_dados(pasta, livros, usuarios):
+    repositorio = RepositorioJSON(pasta, partilhado=True)
+    repositorio.carregar()
+    with repositorio.em_massa():
+        repositorio.gravar_varios('livros', (
+            (str(9780000000000 + numero), {'título': f"Livro {numero}", 'quantidade': UNIDADES})
+            for numero in range(livros)
+        ))
+        repositorio.gravar_varios('usuarios', (
+            (f"U{numero:04d}", {'nome': f"Usuário {numero}", 'tipo': 'Aluno',
+                                'data_cadastro': '2024-01-01', 'historico': []})
+            for numero in range(usuarios)
+        ))
+    repositorio.fechar()
+
+
+def trabalhar(pasta, partilhado, numero, operacoes_por_processo, livros, usuarios, partida, resultados):
+    """Um processo: empréstimos e devoluções ao acaso; o resumo vai para ``resultados``"""
+    resumo = {'emprestados': [], 'devolvidos': [], 'recusados': 0, 'conflitos': 0, 'erros': []}
+    try:
+        aleatorio = random.Random(numero)
+        repositorio = RepositorioJSON(pasta, limite_diario=LIMITE_DIARIO, partilhado=partilhado)
+        repositorio.carregar()
+        partida.wait()
+        ativos = []
+        for _ in range(operacoes_por_processo):
+            try:
+                if ativos and aleatorio.random() < 0.4:
+                    emp_id = ativos.pop(aleatorio.randrange(len(ativos)))
+                    operacoes.devolver(repositorio, emp_id)
+                    resumo['devolvidos'].append(emp_id)
+                else:
+                    id_usuario = f"U{aleatorio.randrange(usuarios):04d}"
+                    isbn = str(9780000000000 + aleatorio.randrange(livros))
+                    emp_id, _ = operacoes.emprestar(repositorio, id_usuario, isbn)
+                    ativos.append(emp_id)
+                    resumo['emprestados'].append(emp_id)
+            except (ErroOperacao, ErroConflito):
+                # Regra da biblioteca, ou ainda em conflito depois de TENTATIVAS_CONFLITO tentativas
+                resumo['recusados'] += 1
+        # Transações desfeitas e repetidas por causa de outros processos
+        resumo['conflitos'] = repositorio.conflitos
+        repositorio.fechar()
+    except Exception:
+        resumo['erros'].append(traceback.format_exc(limit=3))
+    resultados.put(resumo)
+
+
+def conferir(pasta, resumos, livros):
+    """Problemas encontrados nos dados gravados (lista vazia se nenhum)"""
+    repositorio = RepositorioJSON(pasta, partilhado=True)
+    repositorio.carregar()
+    problemas = []
+    emprestados = {emp_id for resumo in resumos for emp_id in resumo['emprestados']}
+    devolvidos = {emp_id for resumo in resumos for emp_id in resumo['devolvidos']}
+
+    perdidos = emprestados - repositorio.emprestimos.keys()
+    if perdidos:
+        problemas.append(f"{len(perdidos)} empréstimos confirmados não estão gravados")
+    nao_devolvidos = {
+        emp_id for emp_id in devolvidos & repositorio.emprestimos.keys()
+        if repositorio.emprestimos[emp_id].get('status') != 'devolvido'
+    }
+    if nao_devolvidos:
+        problemas.append(f"{len(nao_devolvidos)} devoluções confirmadas não estão gravadas")
+
+    ativos_por_livro = {}
+    historicos = {}
+    for emp_id, emprestimo in repositorio.emprestimos.items():
+        historicos.setdefault(emprestimo['id_usuario'], set()).add(emp_id)
+        if emprestimo.get('status') == 'ativo':
+            isbn = emprestimo['isbn_livro']
+            ativos_por_livro[isbn] = ativos_por_livro.get(isbn, 0) + 1
+    estoque_errado = sum(
+        1 for isbn, livro in repositorio.livros.items()
+        if livro['quantidade'] + ativos_por_livro.get(isbn, 0) != UNIDADES
+    )
+    if estoque_errado:
+        problemas.append(f"{estoque_errado} de {livros} livros com estoque diferente dos empréstimos ativos")
+    historico_errado = sum(
+        1 for id_usuario, usuario in repositorio.usuarios.items()
+        if set(usuario['historico']) != historicos.get(id_usuario, set())
+    )
+    if historico_errado:
+        problemas.append(f"{historico_errado} usuários com histórico diferente dos seus empréstimos")
+    return problemas
+
+
+def executar(partilhado, processos, operacoes_por_processo, livros):
+    """Uma corrida completa; devolve os problemas encontrados nos dados"""
+    usuarios = processos * 3
+    with tempfile.TemporaryDirectory() as pasta:
+        gerar_dados(pasta, livros, usuarios)
+        contexto = multiprocessing.get_context('spawn')
+        partida = contexto.Event()
+        resultados = contexto.Queue()
+        trabalhadores = [
+            contexto.Process(target=trabalhar, args=(
+                pasta, partilhado, numero, operacoes_por_processo, livros, usuarios, partida, resultados,
+            ))
+            for numero in range(processos)
+        ]
+        for trabalhador in trabalhadores:
+            trabalhador.start()
+        # Dar tempo às cargas: todos começam a gravar ao mesmo tempo
+        time.sleep(1.0)
+        inicio = time.perf_counter()
+        partida.set()
+        resumos = [resultados.get() for _ in trabalhadores]
+        decorrido = time.perf_counter() - inicio
+        for trabalhador in trabalhadores:
+            trabalhador.join()
+
+        problemas = []
+        erros = [erro for resumo in resumos for erro in resumo['erros']]
+        if erros:
+            problemas.append(f"{len(erros)} processos pararam com erro: {erros[0].strip().splitlines()[-1]}")
+        try:
+            problemas.extend(conferir(pasta, resumos, livros))
+        except ErroPersistencia as e:
+            problemas.append(f"dados ilegíveis: {e}")
+        transacoes = sum(len(resumo['emprestados']) + len(resumo['devolvidos']) for resumo in resumos)
+        recusados = sum(resumo['recusados'] for resumo in resumos)
+        conflitos = sum(resumo['conflitos'] for resumo in resumos)
+        modo = "partilhado" if partilhado else "sem bloqueio"
+        print(f"{modo:<13} {transacoes:>11} {transacoes / decorrido:>13.0f} {recusados:>10} "
+              f"{conflitos:>10}  {'OK' if not problemas else 'FALHOU'}")
+        for problema in problemas:
+            print(f"    {problema}")
+        return problemas
+
+
+def main(argumentos):
+    processos = int(argumentos[0]) if len(argumentos) > 0 else 8
+    operacoes_por_processo = int(argumentos[1]) if len(argumentos) > 1 else 200
+    livros = int(argumentos[2]) if len(argumentos) > 2 else 20
+    print(f"{processos} processos, {operacoes_por_processo} operações cada, "
+          f"{livros} livros com {UNIDADES} unidades")
+    print(f"{'modo':<13} {'transações':>11} {'transações/s':>13} {'recusadas':>10} {'conflitos':>10}")
+    executar(False, processos, operacoes_por_processo, livros)
+    if executar(True, processos, operacoes_por_processo, livros):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
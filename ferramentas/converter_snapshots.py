@@ -0,0 +1,57 @@
+"""Converte os snapshots da biblioteca entre JSON e o formato binário
+
+Uso, a partir da raiz do projeto:
+
+    python -m ferramentas.converter_snapshots para-binario [diretorio]
+    python -m ferramentas.converter_snapshots para-json [diretorio]
+
+Cada coleção convertida é lida de volta e comparada com a original; o
+arquivo de origem não é apagado. Para o repositório passar a usar os
+arquivos ``.bin``, definir ``BIBLIOTECA_FORMATO=binario``.
+"""
+
+import json
+import os
+import sys
+
+from biblioteca import COLECOES
+from biblioteca.binario import (
+    converter_binario_para_json,
+    converter_json_para_binario,
+    ler_binario,
+)
+
+
+def main(argumentos):
+    if not argumentos or argumentos[0] not in ('para-binario', 'para-json'):
+        print(__doc__)
+        return 2
+    diretorio = argumentos[1] if len(argumentos) > 1 else "."
+
+    for nome in COLECOES:
+        arquivo_json = os.path.join(diretorio, f"biblioteca_{nome}.json")
+        arquivo_bin = os.path.join(diretorio, f"biblioteca_{nome}.bin")
+        origem, destino = arquivo_json, arquivo_bin
+        if argumentos[0] == 'para-json':
+            origem, destino = arquivo_bin, arquivo_json
+
+        if not os.path.exists(origem):
+            print(f"{origem}: não existe, ignorado")
+            continue
+
+        if argumentos[0] == 'para-binario':
+            converter_json_para_binario(origem, destino)
+        else:
+            converter_binario_para_json(origem, destino)
+
+        with open(arquivo_json, 'r', encoding='utf-8') as f:
+            iguais = json.load(f) == ler_binario(arquivo_bin)
+        if not iguais:
+            print(f"{destino}: conteúdo diferente da origem!")
+            return 1
+        print(f"{origem} -> {destino} ({os.path.getsize(origem)} -> {os.path.getsize(destino)} bytes)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,60 @@
+"""Mede a exportação do catálogo em cada formato: tempo, tamanho e memória
+
+Uso, a partir da raiz do projeto:
+
+    python -m ferramentas.medir_exportacao [quantidade_de_livros]
+
+Gera um catálogo sintético num repositório JSON temporário e exporta-o
+em CSV, JSON lines, colunas e CSV com gzip. A memória é o pico medido
+pelo ``tracemalloc`` numa segunda exportação, porque o rastreio atrasa
+muito a escrita; deve ficar constante qualquer que seja o tamanho do
+catálogo.
+"""
+
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from biblioteca.exportacao import exportar, ler_colunas
+from biblioteca.repositorio import RepositorioJSON
+
+GENEROS = ["Romance", "Ciência", "História", "Informática", "Direito", "Poesia"]
+SAIDAS = ("livros.csv", "livros.jsonl", "livros.bibcol", "livros.csv.gz")
+
+
+def main(argumentos):
+    total = int(argumentos[0]) if argumentos else 500000
+    with tempfile.TemporaryDirectory() as pasta:
+        repositorio = RepositorioJSON(pasta)
+        repositorio.carregar()
+        with repositorio.em_massa():
+            repositorio.gravar_varios('livros', (
+                (str(9780000000000 + numero), {
+                    'título': f"Livro {numero} sobre o tema {numero % 977}",
+                    'autor': f"Autor {numero % 5000}",
+                    'gênero': GENEROS[numero % len(GENEROS)],
+                    'quantidade': numero % 4 + 1,
+                })
+                for numero in range(total)
+            ))
+
+        print(f"{total} livros")
+        print(f"{'arquivo':<16} {'segundos':>10} {'MB':>10} {'pico (MB)':>10}")
+        for nome in SAIDAS:
+            caminho = os.path.join(pasta, nome)
+            resumo = exportar(repositorio, 'livros', caminho)
+            tracemalloc.start()
+            exportar(repositorio, 'livros', caminho)
+            _, pico = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"{nome:<16} {resumo['segundos']:>10.2f} {resumo['bytes'] / 2**20:>10.1f} {pico / 2**20:>10.1f}")
+
+        inicio = time.perf_counter()
+        lidas = sum(1 for _ in ler_colunas(os.path.join(pasta, "livros.bibcol")))
+        print(f"leitura de livros.bibcol: {lidas} linhas em {time.perf_counter() - inicio:.2f} s")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,93 @@
+"""Mede a importação em massa de livros contra o cadastro um a um
+
+Uso, a partir da raiz do projeto:
+
+    python -m ferramentas.medir_importacao [quantidade_de_linhas]
+
+Gera um CSV de livros numa pasta temporária, com ISBNs repetidos (que
+somam ao estoque) e alguns inválidos, e importa-o para um repositório
+JSON vazio. O cadastro um a um (``operacoes.cadastrar_livro``, como na
+tela) é medido numa amostra e extrapolado para o total.
+"""
+
+import csv
+import os
+import random
+import sys
+import tempfile
+import time
+
+from biblioteca import operacoes
+from biblioteca.importacao import importar
+from biblioteca.repositorio import RepositorioJSON
+
+GENEROS = ["Romance", "Ciência", "História", "Informática", "Direito", "Poesia"]
+
+
+def gerar_csv(caminho, total, semente=42):
+    """CSV de livros: ~40% de ISBNs repetidos e 1 em cada 5000 inválido"""
+    aleatorio = random.Random(semente)
+    distintos = max(1, total * 6 // 10)
+    with open(caminho, 'w', encoding='utf-8', newline='') as f:
+        escritor = csv.writer(f)
+        escritor.writerow(["ISBN", "Título", "Autor", "Gênero", "Quantidade"])
+        for numero in range(total):
+            isbn = str(9780000000000 + aleatorio.randrange(distintos))
+            if numero % 5000 == 4999:
+                isbn = "ISBN-" + isbn
+            escritor.writerow([
+                isbn,
+                f"Livro {numero} sobre o tema {numero % 977}",
+                f"Autor {numero % 5000}",
+                GENEROS[numero % len(GENEROS)],
+                numero % 4 + 1,
+            ])
+
+
+def um_a_um(caminho, amostra):
+    """Segundos por linha cadastrando as primeiras ``amostra`` linhas pela operação da tela"""
+    with tempfile.TemporaryDirectory() as diretorio:
+        repositorio = RepositorioJSON(diretorio)
+        repositorio.carregar()
+        with open(caminho, 'r', encoding='utf-8', newline='') as f:
+            leitor = csv.reader(f)
+            next(leitor)
+            linhas = [linha for _, linha in zip(range(amostra), leitor)]
+        inicio = time.perf_counter()
+        for isbn, titulo, autor, genero, quantidade in linhas:
+            try:
+                operacoes.cadastrar_livro(repositorio, isbn, titulo, autor, genero, quantidade, somar=True)
+            except operacoes.ErroOperacao:
+                pass
+        return (time.perf_counter() - inicio) / len(linhas)
+
+
+def main(argumentos):
+    total = int(argumentos[0]) if argumentos else 1000000
+    with tempfile.TemporaryDirectory() as pasta:
+        arquivo = os.path.join(pasta, "livros.csv")
+        gerar_csv(arquivo, total)
+
+        diretorio = os.path.join(pasta, "dados")
+        os.mkdir(diretorio)
+        repositorio = RepositorioJSON(diretorio)
+        repositorio.carregar()
+        relatorio = importar(repositorio, 'livros', arquivo)
+        inicio = time.perf_counter()
+        repositorio.salvar_tudo()
+        gravacao = time.perf_counter() - inicio
+
+        por_linha = um_a_um(arquivo, min(total, 5000))
+
+    print(f"{total} linhas, {relatorio.lotes} lotes")
+    print(f"{'novos':<22} {relatorio.novos:>12}")
+    print(f"{'somados ao estoque':<22} {relatorio.somados:>12}")
+    print(f"{'rejeitadas':<22} {relatorio.rejeitadas:>12}")
+    print(f"{'importação (s)':<22} {relatorio.segundos:>12.2f}")
+    print(f"{'linhas por segundo':<22} {relatorio.linhas_por_segundo:>12.0f}")
+    print(f"{'snapshot final (s)':<22} {gravacao:>12.2f}")
+    print(f"{'um a um, estimado (s)':<22} {por_linha * total:>12.2f}")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,51 @@
+"""Mede a memória ocupada pelas coleções como dicionários e como registros
+
+Uso, a partir da raiz do projeto:
+
+    python -m ferramentas.medir_memoria [quantidade_de_emprestimos]
+
+As coleções são geradas como em ``comparar_formatos`` e decodificadas
+de JSON, como na carga real (cada valor lido é uma string nova).
+"""
+
+import gc
+import json
+import sys
+import tracemalloc
+
+from biblioteca.registros import como_registro
+from ferramentas.comparar_formatos import gerar_acervo
+
+
+def medir(funcao):
+    gc.collect()
+    tracemalloc.start()
+    resultado = funcao()
+    gc.collect()
+    memoria = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return resultado, memoria
+
+
+def main(argumentos):
+    total = int(argumentos[0]) if argumentos else 200000
+    textos = {nome: json.dumps(dados) for nome, dados in gerar_acervo(total).items()}
+
+    print(f"{'coleção':<12} {'registros':>10} {'dicionários (MB)':>17} {'registros (MB)':>15} {'redução':>8}")
+    for nome, texto in textos.items():
+        dicionarios, memoria_dict = medir(lambda: json.loads(texto))
+        del dicionarios
+        registros, memoria_registros = medir(lambda: {
+            chave: como_registro(nome, registro)
+            for chave, registro in json.loads(texto).items()
+        })
+        if {chave: dict(registro) for chave, registro in registros.items()} != json.loads(texto):
+            print(f"{nome}: os registros não reproduzem os dados!")
+            return 1
+        print(f"{nome:<12} {len(registros):>10} {memoria_dict / 2**20:>17.1f} "
+              f"{memoria_registros / 2**20:>15.1f} {1 - memoria_registros / memoria_dict:>8.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,105 @@
+"""Compara o tempo dos relatórios sobre os registros e sobre os índices
+
+Uso, a partir da raiz do projeto:
+
+    python -m ferramentas.medir_relatorios [quantidade_de_emprestimos]
+
+Os empréstimos são gerados como em ``comparar_formatos`` e convertidos
+nos registros do repositório; as colunas e o índice por data são
+montados pelos respetivos ``reconstruir``, como na carga.
+"""
+
+import sys
+import time
+from collections import Counter
+from datetime import date, datetime
+
+from biblioteca.colunas import ColunasEmprestimos, numpy
+from biblioteca.datas import EMPRESTIMO, IndiceDatas
+from biblioteca.multas import RegrasMulta, calcular_multas
+from biblioteca.registros import como_registro, ordinal_data
+from ferramentas.comparar_formatos import gerar_acervo
+
+
+class _Acervo:
+    def __init__(self, emprestimos):
+        self.emprestimos = emprestimos
+
+
+def _eventos(emprestimos):
+    """Eventos de empréstimo e devolução montados a partir dos registros"""
+    for emp_id, emprestimo in emprestimos.items():
+        yield emprestimo.get('data_emprestimo'), emp_id, 'EMPRÉSTIMO'
+        if emprestimo.get('status') == 'devolvido' and emprestimo.get('data_devolucao_real'):
+            yield emprestimo.get('data_devolucao_real'), emp_id, 'DEVOLUÇÃO'
+
+
+def _multas(emprestimos, regras):
+    """Total das multas calculado empréstimo a empréstimo, com a data de hoje a cada um"""
+    total = 0.00
+    for emprestimo in emprestimos.values():
+        if emprestimo.get('status') == 'ativo':
+            prevista = datetime.strptime(emprestimo.get('data_devolucao_prevista', ''), "%Y-%m-%d")
+            total += regras.multa((datetime.now() - prevista).days)
+    return total
+
+
+def cronometrar(funcao, repeticoes=3):
+    melhor = None
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao()
+        duracao = time.perf_counter() - inicio
+        melhor = duracao if melhor is None else min(melhor, duracao)
+    return melhor, resultado
+
+
+def main(argumentos):
+    total = int(argumentos[0]) if argumentos else 1000000
+    emprestimos = {
+        chave: como_registro('emprestimos', registro)
+        for chave, registro in gerar_acervo(total)['emprestimos'].items()
+    }
+    colunas = ColunasEmprestimos()
+    tempo_colunas, _ = cronometrar(lambda: colunas.reconstruir(_Acervo(emprestimos)), 1)
+    indice = IndiceDatas()
+    tempo_indice, _ = cronometrar(lambda: indice.reconstruir(_Acervo(emprestimos)), 1)
+    desde = date(2024, 3, 20)
+
+    relatorios = [
+        ("mais emprestados",
+         lambda: Counter(e.get('isbn_livro') for e in emprestimos.values()).most_common(10),
+         lambda: colunas.mais_emprestados(10)),
+        ("usuários ativos",
+         lambda: Counter(e.get('id_usuario') for e in emprestimos.values() if e.get('status') == 'ativo'),
+         lambda: colunas.ativos_por_usuario()),
+        ("total ativos",
+         lambda: sum(1 for e in emprestimos.values() if e.get('status') == 'ativo'),
+         lambda: colunas.contar_status()['ativo']),
+        ("empréstimos desde",
+         lambda: [k for k, e in emprestimos.items() if e.get('data_emprestimo', '') >= desde.isoformat()],
+         lambda: colunas.linhas_desde(ordinal_data(desde.isoformat()))),
+        ("desde (strptime)",
+         lambda: [k for k, e in emprestimos.items()
+                  if datetime.strptime(e.get('data_emprestimo', ''), "%Y-%m-%d").date() >= desde],
+         lambda: indice.eventos.entre(ordinal_data(desde.isoformat()), tipo=EMPRESTIMO)),
+        ("histórico completo",
+         lambda: sorted(_eventos(emprestimos), key=lambda evento: evento[0], reverse=True),
+         lambda: indice.eventos.recentes()),
+        ("multas pendentes",
+         lambda: _multas(emprestimos, RegrasMulta()),
+         lambda: calcular_multas(colunas).total),
+    ]
+
+    print(f"{total} empréstimos, colunas montadas em {tempo_colunas:.2f} s "
+          f"({'com' if numpy is not None else 'sem'} NumPy), índice por data em {tempo_indice:.2f} s")
+    print(f"{'relatório':<20} {'registros (ms)':>15} {'índices (ms)':>13}")
+    for nome, por_registros, por_colunas in relatorios:
+        tempo_registros, _ = cronometrar(por_registros)
+        tempo_indices, _ = cronometrar(por_colunas)
+        print(f"{nome:<20} {tempo_registros * 1000:>15.1f} {tempo_indices * 1000:>13.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,64 @@
+"""Verifica a carga de um diário cuja última transação ficou a meio
+
+Uso, a partir da raiz do projeto:
+
+    python -m ferramentas.verificar_diario
+
+Simula uma gravação interrompida num repositório JSON temporário:
+duas transações completas no diário e uma terceira cortada antes do
+fim da linha, a meio de um carácter UTF-8. Confere que a carga
+reaplica só as duas completas, que o resto é cortado do arquivo e que
+a transação seguinte é gravada e relida normalmente. Termina com
+código 1 se alguma verificação falhar.
+"""
+
+import os
+import sys
+import tempfile
+
+from biblioteca import operacoes
+from biblioteca.repositorio import RepositorioJSON
+from ferramentas.verificar_vencimentos import verificar
+
+# Termina no primeiro byte do "ã" e sem o fim de linha
+LINHA_CORTADA = '[["livros","9780000000003",{"título":"Ação'.encode('utf-8')[:-2]
+
+
+def main(argumentos):
+    resultados = []
+    with tempfile.TemporaryDirectory() as pasta:
+        repositorio = RepositorioJSON(pasta)
+        repositorio.carregar()
+        operacoes.cadastrar_livro(repositorio, '9780000000001', "Primeiro")
+        operacoes.cadastrar_livro(repositorio, '9780000000002', "Segundo")
+        caminho = repositorio.diario.caminho
+        completo = os.path.getsize(caminho)
+        # O processo "morre" aqui, sem fechar: o diário ainda não foi compactado
+        with open(caminho, 'ab') as f:
+            f.write(LINHA_CORTADA)
+
+        repositorio = RepositorioJSON(pasta)
+        repositorio.carregar()
+        resultados.append(verificar(
+            "reaplica só as transações completas",
+            sorted(repositorio.livros), ['9780000000001', '9780000000002'],
+        ))
+        resultados.append(verificar("conta as transações completas", repositorio.diario.registros, 2))
+        resultados.append(verificar("corta a linha incompleta", os.path.getsize(caminho), completo))
+
+        operacoes.cadastrar_livro(repositorio, '9780000000004', "Quarto")
+        repositorio = RepositorioJSON(pasta)
+        repositorio.carregar()
+        resultados.append(verificar(
+            "transação seguinte é relida",
+            sorted(repositorio.livros), ['9780000000001', '9780000000002', '9780000000004'],
+        ))
+        resultados.append(verificar("diário sem linhas perdidas", repositorio.diario.registros, 3))
+        repositorio.fechar()
+
+    if not all(resultados):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,155 @@
+"""Verifica conflitos e compactações de outro processo no modo partilhado
+
+Uso, a partir da raiz do projeto:
+
+    python -m ferramentas.verificar_partilhado
+
+Dois ``RepositorioJSON(partilhado=True)`` sobre a mesma pasta temporária
+fazem o papel de dois processos. Um empréstimo do segundo é intercalado
+de forma determinística com um do primeiro sobre o mesmo livro (o
+primeiro grava depois de o segundo ler o livro e antes de ele gravar):
+confere que a transação é desfeita e repetida, que a repetição recusa
+o empréstimo quando já não há exemplares e que o conflito também é
+detetado quando a gravação do primeiro compacta o diário. Por fim
+confere que, depois de outro processo compactar, ``sincronizar`` relê
+as coleções e deixa a memória e os índices iguais aos do disco.
+Termina com código 1 se alguma verificação falhar. O teste de esforço
+com vários processos de verdade é ``ferramentas.concorrencia_pasta``.
+"""
+
+import sys
+import tempfile
+
+from biblioteca import COLECOES, operacoes
+from biblioteca.operacoes import ErroOperacao
+from biblioteca.repositorio import RepositorioJSON
+from ferramentas.verificar_vencimentos import verificar
+
+ISBN = '9780000000001'
+
+
+class Intromissao:
+    """Observador que, na primeira alteração de um livro, executa ``acao`` uma vez
+
+    Corre dentro da transação do repositório observado, depois de ela
+    ler o livro e antes de gravar: é ali que entra o outro processo.
+    """
+
+    def __init__(self, acao):
+        self.acao = acao
+
+    def reconstruir(self, repositorio):
+        pass
+
+    def ao_alterar(self, colecao, chave, antigo, novo):
+        if colecao == 'livros' and self.acao is not None:
+            acao, self.acao = self.acao, None
+            acao()
+
+
+def abrir(pasta, **opcoes):
+    repositorio = RepositorioJSON(pasta, partilhado=True, **opcoes)
+    repositorio.carregar()
+    return repositorio
+
+
+def preparar(pasta, quantidade):
+    repositorio = abrir(pasta)
+    operacoes.cadastrar_livro(repositorio, ISBN, "Livro", quantidade=quantidade)
+    operacoes.cadastrar_usuario(repositorio, 'U1', "Ana")
+    operacoes.cadastrar_usuario(repositorio, 'U2', "Bruno")
+    repositorio.fechar()
+
+
+def conteudo(repositorio):
+    return {
+        nome: {chave: registro.como_dict() for chave, registro in repositorio.colecao(nome).items()}
+        for nome in COLECOES
+    }
+
+
+def ativos(repositorio):
+    return sorted(
+        emprestimo['id_usuario'] for emprestimo in repositorio.emprestimos.values()
+        if emprestimo['status'] == 'ativo'
+    )
+
+
+def emprestar_intercalado(pasta, quantidade, limite_primeiro=1000):
+    """O segundo processo empresta a U2 e o primeiro empresta a U1 a meio; devolve (primeiro, segundo, erro)"""
+    preparar(pasta, quantidade)
+    primeiro = abrir(pasta, limite_diario=limite_primeiro)
+    segundo = abrir(pasta)
+    segundo.registrar_observador(Intromissao(lambda: operacoes.emprestar(primeiro, 'U1', ISBN)))
+    try:
+        operacoes.emprestar(segundo, 'U2', ISBN)
+    except ErroOperacao as e:
+        return primeiro, segundo, str(e)
+    return primeiro, segundo, None
+
+
+def main(argumentos):
+    resultados = []
+
+    with tempfile.TemporaryDirectory() as pasta:
+        primeiro, segundo, erro = emprestar_intercalado(pasta, quantidade=2)
+        disco = abrir(pasta)
+        resultados.append(verificar("conflito: a nova tentativa empresta", erro, None))
+        resultados.append(verificar("conflito: transação repetida uma vez", segundo.conflitos, 1))
+        resultados.append(verificar("conflito: os dois empréstimos gravados", ativos(disco), ['U1', 'U2']))
+        resultados.append(verificar("conflito: estoque gravado", disco.livros[ISBN]['quantidade'], 0))
+        resultados.append(verificar("conflito: memória igual ao disco", conteudo(segundo), conteudo(disco)))
+
+    with tempfile.TemporaryDirectory() as pasta:
+        primeiro, segundo, erro = emprestar_intercalado(pasta, quantidade=1)
+        disco = abrir(pasta)
+        resultados.append(verificar("sem exemplares: a nova tentativa recusa", erro, "Livro não disponível!"))
+        resultados.append(verificar("sem exemplares: só o primeiro empréstimo", ativos(disco), ['U1']))
+        resultados.append(verificar("sem exemplares: estoque gravado", disco.livros[ISBN]['quantidade'], 0))
+        resultados.append(verificar("sem exemplares: memória igual ao disco", conteudo(segundo), conteudo(disco)))
+
+    with tempfile.TemporaryDirectory() as pasta:
+        # Cada gravação do primeiro compacta o diário
+        primeiro, segundo, erro = emprestar_intercalado(pasta, quantidade=2, limite_primeiro=1)
+        disco = abrir(pasta)
+        resultados.append(verificar("compactado a meio: o primeiro compactou", primeiro.geracao > 0, True))
+        resultados.append(verificar("compactado a meio: a nova tentativa empresta", erro, None))
+        resultados.append(verificar("compactado a meio: transação repetida uma vez", segundo.conflitos, 1))
+        resultados.append(verificar("compactado a meio: os dois empréstimos gravados", ativos(disco), ['U1', 'U2']))
+        resultados.append(verificar("compactado a meio: estoque gravado", disco.livros[ISBN]['quantidade'], 0))
+
+    with tempfile.TemporaryDirectory() as pasta:
+        preparar(pasta, quantidade=3)
+        primeiro = abrir(pasta, limite_diario=2)
+        segundo = abrir(pasta)
+        geracao = segundo.geracao
+        emp_id, _ = operacoes.emprestar(primeiro, 'U1', ISBN)
+        operacoes.emprestar(primeiro, 'U2', ISBN)
+        operacoes.devolver(primeiro, emp_id)
+        disco = abrir(pasta)
+        resultados.append(verificar("releitura: o primeiro compactou", primeiro.geracao > geracao, True))
+        resultados.append(verificar("releitura: registros alterados", segundo.sincronizar(), 5))
+        resultados.append(verificar("releitura: geração do disco", segundo.geracao, disco.geracao))
+        resultados.append(verificar("releitura: memória igual ao disco", conteudo(segundo), conteudo(disco)))
+        resultados.append(verificar(
+            "releitura: índices reconstruídos",
+            (segundo.estatisticas.emprestimos_ativos, segundo.estatisticas.unidades,
+             segundo.indice_emprestimos.ativos_do_usuario('U2')),
+            (disco.estatisticas.emprestimos_ativos, disco.estatisticas.unidades,
+             disco.indice_emprestimos.ativos_do_usuario('U2')),
+        ))
+        emp_id = next(
+            emp_id for emp_id, emprestimo in segundo.emprestimos.items()
+            if emprestimo['status'] == 'ativo'
+        )
+        operacoes.devolver(segundo, emp_id)
+        disco = abrir(pasta)
+        resultados.append(verificar("releitura: gravação seguinte sem conflito", segundo.conflitos, 0))
+        resultados.append(verificar("releitura: estoque gravado", disco.livros[ISBN]['quantidade'], 3))
+
+    if not all(resultados):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
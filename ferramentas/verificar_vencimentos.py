@@ -0,0 +1,71 @@
+"""Verifica os avisos de atraso da fila de vencimentos depois de reconstruções
+
+Uso, a partir da raiz do projeto:
+
+    python -m ferramentas.verificar_vencimentos
+
+Num repositório JSON temporário, com um empréstimo já em atraso,
+confere que ``avisos`` o anuncia uma só vez, mesmo depois de uma
+importação (que reconstrói os índices) ou de uma recarga completa, e
+que um empréstimo renovado volta a ser avisado quando vencer de novo.
+Termina com código 1 se alguma verificação falhar.
+"""
+
+import os
+import sys
+import tempfile
+
+from biblioteca import importacao, operacoes
+from biblioteca.datas import ordinal_hoje
+from biblioteca.registros import texto_data
+from biblioteca.repositorio import RepositorioJSON
+
+
+def verificar(descricao, obtido, esperado):
+    """Mostra o resultado de uma verificação; True se passou"""
+    passou = obtido == esperado
+    print(f"{'OK    ' if passou else 'FALHOU'} {descricao}")
+    if not passou:
+        print(f"       esperado {esperado!r}, obtido {obtido!r}")
+    return passou
+
+
+def main(argumentos):
+    hoje = ordinal_hoje()
+    resultados = []
+    with tempfile.TemporaryDirectory() as pasta:
+        repositorio = RepositorioJSON(pasta)
+        repositorio.carregar()
+        operacoes.cadastrar_livro(repositorio, '9780000000001', "Livro", quantidade=2)
+        operacoes.cadastrar_usuario(repositorio, 'U1', "Ana")
+        # Emprestado há 10 dias com 7 de prazo: já em atraso
+        emp_id, _ = operacoes.emprestar(repositorio, 'U1', '9780000000001', hoje=hoje - 10)
+        vencimentos = repositorio.vencimentos
+
+        resultados.append(verificar(
+            "primeira chamada avisa o atraso", [emp_id for _, emp_id in vencimentos.avisos()], [emp_id]
+        ))
+        resultados.append(verificar("segunda chamada não repete", vencimentos.avisos(), []))
+
+        arquivo = os.path.join(pasta, "livros.csv")
+        with open(arquivo, 'w', encoding='utf-8') as f:
+            f.write("isbn,título,quantidade\n9780000000002,Outro,1\n")
+        importacao.importar(repositorio, 'livros', arquivo)
+        resultados.append(verificar("importação não repete o aviso", vencimentos.avisos(), []))
+
+        repositorio.carregar()
+        resultados.append(verificar("recarga não repete o aviso", vencimentos.avisos(), []))
+
+        # Renovado para vencer ontem: é um atraso novo
+        repositorio.atualizar('emprestimos', emp_id, data_devolucao_prevista=texto_data(hoje - 1))
+        resultados.append(verificar(
+            "renovação vencida volta a ser avisada", [emp_id for _, emp_id in vencimentos.avisos()], [emp_id]
+        ))
+        repositorio.fechar()
+
+    if not all(resultados):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])